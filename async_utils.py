@@ -0,0 +1,143 @@
+import os
+import asyncio
+import threading
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from metrics import COALESCED_TOTAL, span
+
+# Bounded pool for CPU-bound work (SentenceTransformer encoding). Torch
+# releases the GIL while encoding, so threads overlap without a process pool.
+EMBED_WORKERS = int(os.getenv('EMBED_WORKERS', str(min(4, os.cpu_count() or 1))))
+# Pool for blocking network calls (Pinecone queries, Gemini generations)
+IO_WORKERS = int(os.getenv('IO_WORKERS', '32'))
+
+# Per-call timeouts in seconds
+EMBED_TIMEOUT = float(os.getenv('EMBED_TIMEOUT', '10'))
+SEARCH_TIMEOUT = float(os.getenv('SEARCH_TIMEOUT', '10'))
+GEMINI_TIMEOUT = float(os.getenv('GEMINI_TIMEOUT', '60'))
+
+_cpu_executor = None
+_io_executor = None
+
+
+def get_cpu_executor():
+    global _cpu_executor
+    if _cpu_executor is None:
+        _cpu_executor = ThreadPoolExecutor(max_workers=EMBED_WORKERS, thread_name_prefix='embed')
+    return _cpu_executor
+
+
+def get_io_executor():
+    global _io_executor
+    if _io_executor is None:
+        _io_executor = ThreadPoolExecutor(max_workers=IO_WORKERS, thread_name_prefix='io')
+    return _io_executor
+
+
+async def _run(executor, fn, args, kwargs, timeout):
+    loop = asyncio.get_running_loop()
+    future = loop.run_in_executor(executor, functools.partial(fn, *args, **kwargs))
+    if timeout is None:
+        return await future
+    return await asyncio.wait_for(future, timeout)
+
+
+async def run_cpu(fn, *args, timeout=EMBED_TIMEOUT, **kwargs):
+    """Run a CPU-bound call on the bounded embedding pool."""
+    return await _run(get_cpu_executor(), fn, args, kwargs, timeout)
+
+
+async def run_io(fn, *args, timeout=None, **kwargs):
+    """Run a blocking network call on the I/O pool, raising asyncio.TimeoutError after `timeout` seconds."""
+    return await _run(get_io_executor(), fn, args, kwargs, timeout)
+
+
+def shutdown_executors(wait=False):
+    global _cpu_executor, _io_executor
+    for executor in (_cpu_executor, _io_executor):
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=True)
+    _cpu_executor = None
+    _io_executor = None
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent identical calls onto one in-flight task.
+
+    The first caller for a key starts coro_fn() as a task; callers arriving
+    before it finishes await the same result or exception instead of
+    repeating the work. Nothing is kept once the task completes, so a later
+    call always does fresh work. Callers await the task through a shield, so
+    one client going away doesn't cancel it for the others.
+    """
+
+    def __init__(self, stage, enabled=True):
+        self.stage = stage
+        self.enabled = enabled
+        self.started = 0
+        self.coalesced = 0
+        self._tasks = {}
+
+    def _done(self, key, task):
+        if self._tasks.get(key) is task:
+            del self._tasks[key]
+        if not task.cancelled():
+            task.exception()  # retrieved here so an unawaited failure isn't logged as lost
+
+    async def do(self, key, coro_fn):
+        if not self.enabled:
+            return await coro_fn()
+        task = self._tasks.get(key)
+        if task is None:
+            self.started += 1
+            task = self._tasks[key] = asyncio.ensure_future(coro_fn())
+            task.add_done_callback(functools.partial(self._done, key))
+            return await asyncio.shield(task)
+        self.coalesced += 1
+        COALESCED_TOTAL.inc(stage=self.stage)
+        with span(f'coalesced_{self.stage}'):
+            return await asyncio.shield(task)
+
+    def stats(self):
+        return {'in_flight': len(self._tasks), 'started': self.started, 'coalesced': self.coalesced}
+
+
+_DONE = object()
+
+
+async def iterate_in_thread(gen_fn, *args, timeout=None, **kwargs):
+    """
+    Drive a blocking generator on the I/O pool and yield its items on the event loop.
+
+    `timeout` bounds the wait for each item (first token and every gap after it).
+    """
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+    cancelled = threading.Event()
+
+    def produce():
+        try:
+            for item in gen_fn(*args, **kwargs):
+                if cancelled.is_set():
+                    break
+                loop.call_soon_threadsafe(queue.put_nowait, (item, None))
+        except BaseException as e:
+            loop.call_soon_threadsafe(queue.put_nowait, (_DONE, e))
+            return
+        loop.call_soon_threadsafe(queue.put_nowait, (_DONE, None))
+
+    loop.run_in_executor(get_io_executor(), produce)
+    try:
+        while True:
+            if timeout is None:
+                item, error = await queue.get()
+            else:
+                item, error = await asyncio.wait_for(queue.get(), timeout)
+            if item is _DONE:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        cancelled.set()
@@ -0,0 +1,52 @@
+import sys
+import time
+import asyncio
+import bench_concurrency
+from bench_concurrency import install_stubs
+
+# /chat/batch against the stubbed backends of bench_concurrency: N queries sent
+# one /chat call at a time (how partners integrate today) vs as batches of
+# increasing size. Reports queries/sec for each.
+# Usage: python bench_batch.py [queries]
+
+BATCH_SIZES = [1, 4, 16, 64]
+GEMINI_SECONDS = 0.2
+
+
+def queries(n, tag):
+    # Distinct queries so no cache or in-flight coalescing hides the work
+    return [f'SAP Sasa-40 Training Workshop {tag} {i}' for i in range(n)]
+
+
+async def sequential(chatbot_server, n):
+    start = time.perf_counter()
+    for query in queries(n, 'sequential'):
+        await chatbot_server.chat(chatbot_server.ChatRequest(query=query))
+    return time.perf_counter() - start
+
+
+async def batched(chatbot_server, n, batch_size):
+    items = [chatbot_server.ChatRequest(query=q) for q in queries(n, f'batch{batch_size}')]
+    start = time.perf_counter()
+    for i in range(0, n, batch_size):
+        response = await chatbot_server.chat_batch(chatbot_server.ChatBatchRequest(items=items[i:i + batch_size]))
+        errors = [r for r in response['results'] if 'error' in r]
+        assert not errors, errors
+        assert [r['index'] for r in response['results']] == list(range(len(items[i:i + batch_size])))
+    return time.perf_counter() - start
+
+
+async def main(n):
+    bench_concurrency.GEMINI_SECONDS = GEMINI_SECONDS
+    chatbot_server = install_stubs()
+    elapsed = await sequential(chatbot_server, n)
+    baseline = n / elapsed
+    print(f"{'mode':>16} {'queries/s':>10} {'speedup':>8}")
+    print(f"{'sequential /chat':>16} {baseline:>10.2f} {1.0:>7.1f}x")
+    for batch_size in BATCH_SIZES:
+        elapsed = await batched(chatbot_server, n, batch_size)
+        print(f"{'batch of ' + str(batch_size):>16} {n / elapsed:>10.2f} {n / elapsed / baseline:>7.1f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 64))
@@ -0,0 +1,104 @@
+import sys
+import time
+import asyncio
+import numpy as np
+from vector_store import VectorStore
+
+# Load test for /chat against stubbed backends: shows requests overlapping
+# instead of serialising on the event loop as concurrency grows.
+# Usage: python bench_concurrency.py [requests per level]
+
+EMBED_SECONDS = 0.01
+EMBED_SECONDS_PER_TEXT = 0.001  # extra cost of each further text in a batched encode
+SEARCH_SECONDS = 0.05
+GEMINI_SECONDS = 0.5
+CONCURRENCY_LEVELS = [1, 2, 4, 8, 16, 32]
+
+
+class StubEmbedder:
+    def encode(self, text, **kwargs):
+        if isinstance(text, str):
+            time.sleep(EMBED_SECONDS)
+            return np.random.random(384).astype(np.float32)
+        time.sleep(EMBED_SECONDS + EMBED_SECONDS_PER_TEXT * max(0, len(text) - 1))
+        return np.random.random((len(text), 384)).astype(np.float32)
+
+
+class StubVectorStore(VectorStore):
+    def query(self, vector, top_k=5, include_metadata=True, filter=None):
+        time.sleep(SEARCH_SECONDS)
+        return {'matches': [{
+            'id': 'circular_24896',
+            'score': 0.9,
+            'metadata': {
+                'text': 'Subject: SAP Sasa-40 Training Workshop',
+                'title': 'Subject: SAP Sasa-40 Training Workshop',
+                'file': 'https://example.invalid/sap.pdf',
+                'nid': '24896',
+                'content_type': 'circular',
+            },
+        }]}
+
+
+def _stub_generate_gemini_response(prompt):
+    time.sleep(GEMINI_SECONDS)
+    return 'Stub answer https://example.invalid/sap.pdf'
+
+
+def _stub_stream_gemini_response(prompt):
+    time.sleep(GEMINI_SECONDS)
+    for word in _stub_generate_gemini_response(prompt).split(' '):
+        yield word + ' '
+
+
+def install_stubs():
+    """Inject a sleeping embedder, vector store and Gemini into the real server modules."""
+    import fetch_and_store
+    import chatbot_server
+    fetch_and_store.set_model(StubEmbedder())
+    fetch_and_store.set_vector_store(StubVectorStore())
+    chatbot_server.generate_gemini_response = _stub_generate_gemini_response
+    chatbot_server.stream_gemini_response = _stub_stream_gemini_response
+    return chatbot_server
+
+
+async def run_level(chat, ChatRequest, concurrency, total):
+    queue = list(range(total))
+    latencies = []
+
+    async def worker():
+        while queue:
+            # Distinct queries so the embedding and response caches never hit
+            n = queue.pop()
+            start = time.perf_counter()
+            await chat(ChatRequest(query=f'SAP Sasa-40 Training Workshop {concurrency} {n}'))
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        'concurrency': concurrency,
+        'requests': total,
+        'seconds': round(elapsed, 3),
+        'req_per_sec': round(total / elapsed, 2),
+        'p50_ms': round(latencies[len(latencies) // 2] * 1000, 1),
+    }
+
+
+async def main(total):
+    import contextlib
+    import io
+    chatbot_server = install_stubs()
+    baseline = None
+    print(f"{'concurrency':>11} {'req/s':>8} {'p50 ms':>8} {'speedup':>8}")
+    for concurrency in CONCURRENCY_LEVELS:
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = await run_level(chatbot_server.chat, chatbot_server.ChatRequest, concurrency, max(total, concurrency))
+        baseline = baseline or result['req_per_sec']
+        print(f"{result['concurrency']:>11} {result['req_per_sec']:>8} {result['p50_ms']:>8} {result['req_per_sec'] / baseline:>7.1f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 32))
@@ -0,0 +1,72 @@
+import os
+import sys
+import json
+import tempfile
+import subprocess
+from catalog import CATALOG_CONTENT_TYPES, DOC_STORE_FILE
+from doc_store import import_from_json
+
+# Load time and resident memory of the JSON snapshots vs the SQLite document store,
+# each measured in a fresh interpreter so the numbers don't share a heap.
+# Usage: python bench_doc_store.py [runs]
+
+DATA_DIR = 'data'
+
+LOAD = """
+import sys, time, json, resource, random
+from catalog import load_json_records
+from doc_store import DocumentStore
+mode, data_dir, types = sys.argv[1], sys.argv[2], sys.argv[3].split(',')
+
+def rss_kb():
+    # Current resident set on Linux; peak RSS elsewhere
+    try:
+        with open('/proc/self/status') as f:
+            return next(int(line.split()[1]) for line in f if line.startswith('VmRSS:'))
+    except (OSError, StopIteration):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+rss = rss_kb()
+t = time.perf_counter()
+if mode == 'json':
+    records = {ct: load_json_records(data_dir, ct) for ct in types}
+elif mode == 'sqlite':
+    store = DocumentStore(data_dir + '/documents.sqlite3')
+    records = {ct: store.records(ct) for ct in types}
+else:
+    store = DocumentStore(data_dir + '/documents.sqlite3')
+    nids = [r[0] for r in store._conn.execute("SELECT nid FROM documents WHERE content_type = 'circular'")]
+    random.seed(0)
+    records = {'circular': [store.get('circular', nid) for nid in random.sample(nids, min(100, len(nids)))]}
+elapsed = time.perf_counter() - t
+print(json.dumps({'seconds': elapsed, 'records': sum(map(len, records.values())),
+                  'rss_kb': rss_kb() - rss}))
+"""
+
+
+def run(mode, data_dir):
+    out = subprocess.run([sys.executable, '-c', LOAD, mode, data_dir, ','.join(CATALOG_CONTENT_TYPES)],
+                         capture_output=True, text=True)
+    if out.returncode != 0:
+        raise RuntimeError(out.stderr.strip().splitlines()[-1])
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def size_of(paths):
+    return sum(os.path.getsize(p) for p in paths if os.path.exists(p))
+
+
+if __name__ == "__main__":
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    with tempfile.TemporaryDirectory() as tmp:
+        store = import_from_json(DATA_DIR, path=os.path.join(tmp, DOC_STORE_FILE))
+        store.close()
+        json_bytes = size_of(os.path.join(DATA_DIR, f"{ct}.json") for ct in CATALOG_CONTENT_TYPES)
+        print(f"on disk: JSON {json_bytes / 1024:.0f} KB, SQLite {size_of([os.path.join(tmp, DOC_STORE_FILE)]) / 1024:.0f} KB")
+        for mode, data_dir, label in (('json', DATA_DIR, 'JSON load all'),
+                                      ('sqlite', tmp, 'SQLite load all'),
+                                      ('get', tmp, 'SQLite 100 gets by nid')):
+            results = sorted((run(mode, data_dir) for _ in range(runs)), key=lambda r: r['seconds'])
+            median = results[len(results) // 2]
+            print(f"{label:<24} median {median['seconds'] * 1000:7.1f} ms  "
+                  f"rss +{median['rss_kb'] / 1024:5.1f} MB  ({median['records']} records, {runs} runs)")
@@ -0,0 +1,71 @@
+import sys
+import json
+import subprocess
+from embedders import ONNX_FILES
+
+# Latency, throughput and memory of each embedding backend, each measured in a
+# fresh interpreter so model weights and runtimes don't share a heap.
+# Usage: python bench_embedders.py [backends, e.g. torch onnx onnx-int8]
+# Set EMBED_THREADS to pin the thread count; run `python embedders.py export` first for ONNX,
+# and `python embedders.py parity` for agreement with the torch model.
+
+MEASURE = """
+import sys, time, json, resource
+backend = sys.argv[1]
+
+def rss_kb():
+    # Current resident set on Linux; peak RSS elsewhere
+    try:
+        with open('/proc/self/status') as f:
+            return next(int(line.split()[1]) for line in f if line.startswith('VmRSS:'))
+    except (OSError, StopIteration):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+base = rss_kb()
+from embedders import load_embedder, corpus_texts
+from fetch_and_store import EMBEDDING_MODEL_NAME, EMBEDDING_DIM
+texts = corpus_texts()
+t = time.perf_counter()
+model = load_embedder(EMBEDDING_MODEL_NAME, backend, dim=EMBEDDING_DIM)
+load_seconds = time.perf_counter() - t
+loaded = rss_kb()
+
+queries = [text.split('\\n', 1)[0] for text in texts[:200]]
+latencies = []
+for query in queries:
+    t = time.perf_counter()
+    model.encode(query)
+    latencies.append(time.perf_counter() - t)
+latencies.sort()
+
+t = time.perf_counter()
+model.encode(texts, batch_size=64, convert_to_numpy=True, show_progress_bar=False)
+batch_seconds = time.perf_counter() - t
+print(json.dumps({
+    'load_seconds': load_seconds,
+    'rss_loaded_mb': (loaded - base) / 1024,
+    'rss_peak_mb': (rss_kb() - base) / 1024,
+    'query_p50_ms': latencies[len(latencies) // 2] * 1000,
+    'query_p95_ms': latencies[int(len(latencies) * 0.95)] * 1000,
+    'texts_per_sec': len(texts) / batch_seconds,
+}))
+"""
+
+
+def run(backend):
+    out = subprocess.run([sys.executable, '-c', MEASURE, backend], capture_output=True, text=True)
+    if out.returncode != 0:
+        return {'error': (out.stderr.strip().splitlines() or ['failed'])[-1]}
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+if __name__ == "__main__":
+    backends = sys.argv[1:] or ['torch'] + list(ONNX_FILES)
+    print(f"{'backend':<10} {'load s':>7} {'rss MB':>7} {'peak MB':>8} {'p50 ms':>7} {'p95 ms':>7} {'texts/s':>8}")
+    for backend in backends:
+        r = run(backend)
+        if 'error' in r:
+            print(f"{backend:<10} skipped: {r['error']}")
+            continue
+        print(f"{backend:<10} {r['load_seconds']:>7.2f} {r['rss_loaded_mb']:>7.1f} {r['rss_peak_mb']:>8.1f} "
+              f"{r['query_p50_ms']:>7.2f} {r['query_p95_ms']:>7.2f} {r['texts_per_sec']:>8.1f}")
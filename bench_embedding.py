@@ -0,0 +1,44 @@
+import os
+import sys
+import json
+from sentence_transformers import SentenceTransformer
+from embedding_utils import embed_stream, configure_threads, ThroughputReport
+
+# Embedding throughput for the local corpus across batch sizes.
+# Usage: python bench_embedding.py [batch sizes, e.g. 1 16 32 64 128]
+# Set EMBED_THREADS to compare torch thread counts.
+
+DATA_DIR = 'data'
+MODEL_NAME = 'all-MiniLM-L6-v2'
+CONTENT_TYPES = ['circular', 'rti_act', 'mmc_act']
+
+
+def load_texts():
+    texts = []
+    for content_type in CONTENT_TYPES:
+        filepath = os.path.join(DATA_DIR, f"{content_type}.json")
+        if not os.path.exists(filepath):
+            continue
+        with open(filepath, 'r', encoding='utf-8') as f:
+            for item in json.load(f):
+                texts.append((item.get('title') or '') + '\n' + (item.get('body') or ''))
+    return texts
+
+
+if __name__ == "__main__":
+    batch_sizes = [int(arg) for arg in sys.argv[1:]] or [1, 16, 32, 64, 128]
+    threads = configure_threads()
+    model = SentenceTransformer(MODEL_NAME)
+    texts = load_texts()
+    print(f"Corpus: {len(texts)} texts, torch threads: {threads or 'default'}")
+    model.encode(texts[:8])  # warm-up
+    results = []
+    for batch_size in batch_sizes:
+        for sort_by_length in (False, True):
+            report = ThroughputReport(f"batch={batch_size} sorted={sort_by_length}")
+            for _ in embed_stream(model, texts, batch_size=batch_size, sort_by_length=sort_by_length, report=report):
+                pass
+            report.print_summary()
+            results.append(report.summary())
+    best = max(results, key=lambda r: r['items_per_sec'])
+    print(f"Best: {best['label']} at {best['items_per_sec']} items/sec")
@@ -0,0 +1,362 @@
+import os
+import sys
+import json
+import time
+import zlib
+import asyncio
+import argparse
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from vector_store import VectorStore, LocalVectorStore
+from keyword_index import tokenize
+
+# Replays a labelled query file through search_context and /chat and reports
+# retrieval quality (recall@k, MRR, top-1 accuracy) plus latency percentiles
+# and throughput per concurrency level, so a change gets a before/after number.
+# Offline by default: a hashing embedder, an in-memory LocalVectorStore built
+# from data/ and a stub Gemini, each swappable for the real backend.
+# Usage: python bench_replay.py [--concurrency 1,4,16] [--output run.json] [--compare baseline.json]
+#        python bench_replay.py --embedder model --vector configured --gemini live
+
+QUERIES_PATH = 'bench_queries.jsonl'
+DATA_DIR = 'data'
+DIM = 384
+K_VALUES = [1, 3, 5, 10]
+CONCURRENCY_LEVELS = [1, 4, 16]
+
+
+def load_queries(path=QUERIES_PATH):
+    """Labelled queries: {"query", "lang", "expected": ["<content_type>:<nid>", ...]} per line."""
+    with open(path, 'r', encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+class HashEmbedder:
+    """
+    Deterministic bag-of-words embedder for offline runs: BM25 tokens plus
+    their character trigrams, hashed into DIM signed buckets. Scores say more
+    about ranking and fusion than about semantic quality, but are repeatable.
+    """
+
+    def __init__(self, dim=DIM, latency=0.0):
+        self.dim = dim
+        self.latency = latency
+
+    def _vector(self, text):
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for token in tokenize(text):
+            features = [(token, 1.0)]
+            padded = f"#{token}#"
+            features += [(padded[i:i + 3], 0.5) for i in range(len(padded) - 2)]
+            for feature, weight in features:
+                h = zlib.crc32(feature.encode('utf-8'))
+                vector[h % self.dim] += weight if h & 0x80000000 else -weight
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def encode(self, texts, **kwargs):
+        if self.latency:
+            time.sleep(self.latency)
+        if isinstance(texts, str):
+            return self._vector(texts)
+        return np.stack([self._vector(t) for t in texts]) if texts else np.zeros((0, self.dim), dtype=np.float32)
+
+
+class DelayedVectorStore(VectorStore):
+    """Adds a fixed network-like delay to every query of another store."""
+
+    def __init__(self, inner, latency):
+        self.inner = inner
+        self.latency = latency
+
+    def query(self, vector, top_k=5, include_metadata=True, filter=None):
+        time.sleep(self.latency)
+        return self.inner.query(vector, top_k=top_k, include_metadata=include_metadata, filter=filter)
+
+    def count(self):
+        return self.inner.count()
+
+
+def build_local_store(embedder):
+    """Embed every catalog record with `embedder` into an in-memory LocalVectorStore."""
+    from catalog import load_records, CATALOG_CONTENT_TYPES
+    from fetch_and_store import vector_record
+    from embedding_utils import embed_to_vectors
+    # Never flushed, so nothing is written under the temporary path
+    store = LocalVectorStore(path=os.path.join(tempfile.mkdtemp(), 'index'), dim=DIM, ann='')
+    records = [vector_record(ct, item) for ct in CATALOG_CONTENT_TYPES
+               for item in load_records(DATA_DIR, ct) if isinstance(item, dict)]
+    for batch in embed_to_vectors(embedder, records):
+        store.upsert(batch)
+    return store
+
+
+def stub_gemini(latency):
+    def generate(prompt):
+        time.sleep(latency)
+        return 'Stub answer for: ' + prompt.split('\n', 1)[0][:200]
+
+    def stream(prompt):
+        answer = generate(prompt)
+        for word in answer.split(' '):
+            yield word + ' '
+
+    return generate, stream
+
+
+def install_backends(args):
+    """Inject the selected embedder, vector store and Gemini into the server modules."""
+    import fetch_and_store
+    import chatbot_server
+    if args.embedder == 'hash':
+        embedder = HashEmbedder(latency=args.embed_latency)
+        fetch_and_store.set_model(embedder)
+    if args.vector == 'local':
+        started = time.perf_counter()
+        store = build_local_store(fetch_and_store.get_model())
+        print(f"Built local vector store: {store.count()} vectors in {time.perf_counter() - started:.1f}s")
+    else:
+        store = fetch_and_store.get_vector_store()
+    if args.search_latency:
+        store = DelayedVectorStore(store, args.search_latency)
+    if args.vector == 'local' or args.search_latency:
+        fetch_and_store.set_vector_store(store)
+    if args.gemini == 'stub':
+        chatbot_server.generate_gemini_response, chatbot_server.stream_gemini_response = stub_gemini(args.gemini_latency)
+    return chatbot_server
+
+
+def reset_caches(chatbot_server, warm):
+    """Fresh query embedding and answer caches; cold runs (the default) never hit them."""
+    from cache_utils import QueryEmbeddingCache, ResponseCache
+    size = {} if warm else {'maxsize': 0}
+    chatbot_server.embedding_cache = QueryEmbeddingCache(chatbot_server.get_embedding,
+                                                         namespace=chatbot_server.EMBEDDING_NAMESPACE, path='', **size)
+    chatbot_server.response_cache = ResponseCache(**size)
+
+
+# Replay
+
+def search_ranking(chatbot_server, query, top_k):
+    """Document ids ranked by search_context, with the filters and fallback retrieve() applies."""
+    from query_filters import SearchFilters, parse_filter_hints
+    from catalog import get_catalog
+    normalized = chatbot_server.normalize_query(query)
+    filters = SearchFilters()
+    if chatbot_server.QUERY_FILTERS:
+        filters = parse_filter_hints(query, get_catalog().departments())
+    results = chatbot_server.search_context(normalized, top_k=top_k, filters=filters)
+    if not results and not filters.is_empty():
+        for looser in filters.relaxed():
+            results = chatbot_server.search_context(normalized, top_k=top_k, filters=looser)
+            if results:
+                break
+    ranking = []
+    for ctx in results:
+        key = chatbot_server.context_doc_id(ctx)
+        if key not in ranking:
+            ranking.append(key)
+    return ranking
+
+
+async def chat_top_document(chatbot_server, query):
+    response = await chatbot_server.chat(chatbot_server.ChatRequest(query=query))
+    top = response.get('circular_metadata')
+    return [chatbot_server.context_doc_id(top)] if top else []
+
+
+def percentile_ms(latencies, pct):
+    ordered = sorted(latencies)
+    return round(ordered[min(len(ordered) - 1, int(len(ordered) * pct))] * 1000, 2) if ordered else None
+
+
+def latency_summary(concurrency, latencies, elapsed):
+    return {
+        'concurrency': concurrency,
+        'requests': len(latencies),
+        'seconds': round(elapsed, 3),
+        'req_per_sec': round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        'p50_ms': percentile_ms(latencies, 0.50),
+        'p95_ms': percentile_ms(latencies, 0.95),
+        'p99_ms': percentile_ms(latencies, 0.99),
+    }
+
+
+def by_language(queries, results, score):
+    pairs = list(zip(queries, results))
+    report = {'all': score(pairs)}
+    for lang in sorted({q.get('lang', '') for q in queries}):
+        report[lang] = score([(q, r) for q, r in pairs if q.get('lang', '') == lang])
+    return report
+
+
+def quality(queries, rankings, k_values):
+    """recall@k and MRR over `rankings` (one ranked doc id list per query), overall and per language."""
+    def score(items):
+        result = {'queries': len(items)}
+        for k in k_values:
+            result[f'recall@{k}'] = round(float(np.mean(
+                [len(set(r[:k]) & set(q['expected'])) / len(q['expected']) for q, r in items])), 4)
+        ranks = [next((i + 1 for i, key in enumerate(r) if key in q['expected']), None) for q, r in items]
+        result['mrr'] = round(float(np.mean([1.0 / rank if rank else 0.0 for rank in ranks])), 4)
+        return result
+
+    return by_language(queries, rankings, score)
+
+
+def top_document_accuracy(queries, tops):
+    """Share of /chat answers built on one of the expected documents."""
+    def score(items):
+        hits = [bool(set(top) & set(q['expected'])) for q, top in items]
+        return {'queries': len(items), 'accuracy': round(float(np.mean(hits)), 4)}
+
+    return by_language(queries, tops, score)
+
+
+def replay_search(chatbot_server, queries, concurrency, repeat, top_k):
+    """Run every query `repeat` times from `concurrency` threads; returns (rankings, latency summary)."""
+    jobs = [q['query'] for _ in range(repeat) for q in queries]
+    latencies = []
+
+    def timed(query):
+        start = time.perf_counter()
+        ranking = search_ranking(chatbot_server, query, top_k)
+        latencies.append(time.perf_counter() - start)
+        return ranking
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        rankings = list(pool.map(timed, jobs))
+    elapsed = time.perf_counter() - start
+    return rankings[:len(queries)], latency_summary(concurrency, latencies, elapsed)
+
+
+async def replay_chat(chatbot_server, queries, concurrency, repeat):
+    """Replay /chat from `concurrency` concurrent clients; returns (top documents, latency summary)."""
+    jobs = list(enumerate(q['query'] for _ in range(repeat) for q in queries))
+    results = [None] * len(jobs)
+    latencies = []
+
+    async def client():
+        while jobs:
+            i, query = jobs.pop(0)
+            start = time.perf_counter()
+            results[i] = await chat_top_document(chatbot_server, query)
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    return results[:len(queries)], latency_summary(concurrency, latencies, elapsed)
+
+
+async def run(args):
+    import logging
+    logging.getLogger('chatbot_server').setLevel(logging.WARNING)
+    queries = load_queries(args.queries)
+    chatbot_server = install_backends(args)
+    top_k = max(args.k)
+    report = {
+        'config': {key: value for key, value in vars(args).items() if key not in ('output', 'compare')},
+        'queries': len(queries),
+        'started': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'search': {'levels': []},
+        'chat': {'levels': []},
+    }
+    for concurrency in args.concurrency:
+        reset_caches(chatbot_server, args.warm)
+        rankings, summary = replay_search(chatbot_server, queries, concurrency, args.repeat, top_k)
+        report['search']['levels'].append(summary)
+        report['search'].setdefault('quality', quality(queries, rankings, args.k))
+    if not args.search_only:
+        for concurrency in args.concurrency:
+            reset_caches(chatbot_server, args.warm)
+            tops, summary = await replay_chat(chatbot_server, queries, concurrency, args.repeat)
+            report['chat']['levels'].append(summary)
+            report['chat'].setdefault('quality', top_document_accuracy(queries, tops))
+    return report
+
+
+# Reporting
+
+def print_report(report):
+    search_quality = report['search']['quality']
+    k_columns = [key for key in search_quality['all'] if key.startswith('recall@')]
+    print(f"\nsearch_context quality ({report['queries']} queries)")
+    print(f"{'lang':>6} {'queries':>7} " + ' '.join(f"{c:>9}" for c in k_columns) + f" {'mrr':>7}")
+    for lang, q in search_quality.items():
+        print(f"{lang:>6} {q['queries']:>7} " + ' '.join(f"{q[c]:>9.3f}" for c in k_columns) + f" {q['mrr']:>7.3f}")
+    if report['chat'].get('quality'):
+        print("\n/chat top document accuracy")
+        for lang, q in report['chat']['quality'].items():
+            print(f"{lang:>6} {q['queries']:>7} {q['accuracy']:>9.3f}")
+    for name in ('search', 'chat'):
+        if not report[name]['levels']:
+            continue
+        print(f"\n{name} latency")
+        print(f"{'concurrency':>11} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+        for level in report[name]['levels']:
+            print(f"{level['concurrency']:>11} {level['req_per_sec']:>9} {level['p50_ms']:>9} "
+                  f"{level['p95_ms']:>9} {level['p99_ms']:>9}")
+
+
+def compare(report, baseline):
+    """Print the change in each quality and latency number against a saved run."""
+    print(f"\nCompared with baseline from {baseline.get('started', '?')}")
+    for name in ('search', 'chat'):
+        for lang, q in report[name].get('quality', {}).items():
+            old = baseline.get(name, {}).get('quality', {}).get(lang, {})
+            for metric, value in q.items():
+                if metric != 'queries' and metric in old and value != old[metric]:
+                    print(f"  {name} {lang} {metric}: {old[metric]:.3f} -> {value:.3f} ({value - old[metric]:+.3f})")
+        old_levels = {level['concurrency']: level for level in baseline.get(name, {}).get('levels', [])}
+        for level in report[name]['levels']:
+            old = old_levels.get(level['concurrency'])
+            if not old:
+                continue
+            for metric in ('req_per_sec', 'p50_ms', 'p95_ms', 'p99_ms'):
+                if old.get(metric):
+                    change = (level[metric] - old[metric]) / old[metric] * 100
+                    print(f"  {name} c={level['concurrency']} {metric}: {old[metric]} -> {level[metric]} ({change:+.1f}%)")
+
+
+def int_list(value):
+    return [int(v) for v in value.split(',') if v]
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description='Replay labelled queries for retrieval quality and latency.')
+    parser.add_argument('--queries', default=QUERIES_PATH, help='labelled query file (JSON lines)')
+    parser.add_argument('--embedder', choices=['hash', 'model'], default='hash',
+                        help="'hash' (offline) or the configured SentenceTransformer")
+    parser.add_argument('--vector', choices=['local', 'configured'], default='local',
+                        help="'local' builds an in-memory index from data/; 'configured' uses VECTOR_BACKEND")
+    parser.add_argument('--gemini', choices=['stub', 'live'], default='stub')
+    parser.add_argument('--embed-latency', type=float, default=0.0, help='seconds added per hash embedding call')
+    parser.add_argument('--search-latency', type=float, default=0.0, help='seconds added per vector query')
+    parser.add_argument('--gemini-latency', type=float, default=0.2, help='seconds per stub Gemini answer')
+    parser.add_argument('--concurrency', type=int_list, default=CONCURRENCY_LEVELS, help='e.g. 1,4,16')
+    parser.add_argument('--k', type=int_list, default=K_VALUES, help='recall cut-offs, e.g. 1,3,5,10')
+    parser.add_argument('--repeat', type=int, default=1, help='passes over the query file per level')
+    parser.add_argument('--warm', action='store_true', help='let repeated queries hit the embedding and answer caches')
+    parser.add_argument('--search-only', action='store_true', help='skip the /chat replay')
+    parser.add_argument('--output', help='write the results as JSON')
+    parser.add_argument('--compare', help='baseline JSON from an earlier --output')
+    args = parser.parse_args(argv)
+    if args.embedder == 'hash' and args.vector == 'configured':
+        parser.error('the configured vector store was built with the real model; use --embedder model')
+    return args
+
+
+if __name__ == "__main__":
+    args = parse_args(sys.argv[1:])
+    report = asyncio.run(run(args))
+    print_report(report)
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            compare(report, json.load(f))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\nSaved results to {args.output}")
@@ -0,0 +1,36 @@
+import sys
+import time
+import subprocess
+
+# Import-time and warm-up cost of the server modules, each measured in a fresh interpreter.
+# Usage: python bench_startup.py [runs]
+
+MODULES = ['fetch_and_store', 'chatbot_server']
+WARM_UP = "import fetch_and_store, time; t = time.perf_counter(); fetch_and_store.get_model().encode('warm up'); print(time.perf_counter() - t)"
+
+
+def time_import(module):
+    code = f"import time; t = time.perf_counter(); import {module}; print(time.perf_counter() - t)"
+    out = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True)
+    if out.returncode != 0:
+        raise RuntimeError(out.stderr.strip().splitlines()[-1])
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+def time_warm_up():
+    out = subprocess.run([sys.executable, '-c', WARM_UP], capture_output=True, text=True)
+    if out.returncode != 0:
+        return None
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+if __name__ == "__main__":
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    for module in MODULES:
+        timings = sorted(time_import(module) for _ in range(runs))
+        print(f"import {module:<16} median {timings[len(timings) // 2] * 1000:8.1f} ms  (min {timings[0] * 1000:.1f} ms, {runs} runs)")
+    warm = time_warm_up()
+    if warm is None:
+        print("model warm-up: skipped (sentence-transformers not available)")
+    else:
+        print(f"model warm-up (lifespan hook) {warm * 1000:8.1f} ms")
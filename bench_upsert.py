@@ -0,0 +1,77 @@
+import os
+import sys
+import time
+import tempfile
+import threading
+import numpy as np
+from vector_store import LocalVectorStore
+from upsert_pipeline import UpsertPipeline
+
+# Pipelined upsert against an in-process fake vector store: a LocalVectorStore
+# behind simulated network latency and periodic 429 responses, fed by a fake
+# embedding stage. Checks every vector arrives and reports throughput per worker count.
+# Usage: python bench_upsert.py [n_vectors]
+
+DIM = 384
+CALL_LATENCY = 0.03      # seconds per upsert request
+EMBED_LATENCY = 0.004    # seconds per 64-text embedding batch
+FAIL_EVERY = 7           # every Nth request is rate limited
+
+
+class RateLimited(Exception):
+    status = 429
+    headers = {'Retry-After': '0.01'}
+
+
+class FakeRemoteStore(LocalVectorStore):
+    def __init__(self, latency=CALL_LATENCY, fail_every=FAIL_EVERY):
+        # Never flushed, so nothing is written under the temporary path
+        super().__init__(path=os.path.join(tempfile.mkdtemp(), 'index'), dim=DIM)
+        self.latency = latency
+        self.fail_every = fail_every
+        self.calls = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._calls_lock = threading.Lock()
+
+    def upsert(self, vectors):
+        with self._calls_lock:
+            self.calls += 1
+            call = self.calls
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            time.sleep(self.latency)
+            if self.fail_every and call % self.fail_every == 0:
+                raise RateLimited()
+            return super().upsert(vectors)
+        finally:
+            with self._calls_lock:
+                self.in_flight -= 1
+
+
+def fake_embedded_batches(n, batch_size=64):
+    rng = np.random.default_rng(0)
+    for start in range(0, n, batch_size):
+        time.sleep(EMBED_LATENCY)
+        count = min(batch_size, n - start)
+        values = rng.standard_normal((count, DIM)).astype(np.float32)
+        yield [(f"doc_{start + i}", values[i].tolist(), {'text': f"document {start + i}"}) for i in range(count)]
+
+
+def run(n, workers, max_vectors=100):
+    store = FakeRemoteStore()
+    pipeline = UpsertPipeline(store, workers=workers, max_vectors=max_vectors, progress_interval=0,
+                              backoff_base=0.01, label=f"{workers} workers")
+    stats = pipeline.run(fake_embedded_batches(n))
+    assert store.count() == n and stats.vectors == n, (store.count(), stats.vectors)
+    return stats.summary(), store
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    for workers in (1, 2, 4, 8):
+        s, store = run(n, workers)
+        print(f"workers={workers}: {s['vectors']} vectors in {s['wall_seconds']:.2f}s = {s['vectors_per_sec']:8.1f} vectors/sec, "
+              f"{s['batches']} batches, {s['retries']} retries, max {store.max_in_flight} in flight, "
+              f"producer blocked {s['producer_wait_seconds']:.2f}s")
@@ -0,0 +1,76 @@
+import sys
+import time
+import tempfile
+import os
+import numpy as np
+from vector_store import LocalVectorStore, LOCAL_INDEX_PATH
+
+# Recall and latency of the local backend's IVF index against exact brute force.
+# Usage: python bench_vector_store.py [n_vectors]
+# Uses the persisted local index (data/vector_index.npy) if present,
+# otherwise synthetic clustered 384-dim vectors.
+
+DIM = 384
+TOP_K = 10
+N_QUERIES = 200
+NPROBES = [1, 2, 4, 8, 16]
+
+
+def synthetic(n, dim=DIM, clusters=50, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim))
+    labels = rng.integers(0, clusters, size=n)
+    return (centers[labels] + 0.5 * rng.normal(size=(n, dim))).astype(np.float32)
+
+
+def timed(fn, queries):
+    latencies = []
+    results = []
+    for q in queries:
+        start = time.perf_counter()
+        results.append(fn(q))
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    return results, latencies
+
+
+def ms(latencies, pct):
+    return latencies[min(len(latencies) - 1, int(len(latencies) * pct))] * 1000
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    if os.path.exists(LOCAL_INDEX_PATH + '.npy') and len(sys.argv) == 1:
+        source = LocalVectorStore()
+        matrix = np.asarray(source.matrix)
+        print(f"Using {LOCAL_INDEX_PATH}.npy: {matrix.shape[0]} vectors")
+    else:
+        matrix = synthetic(n)
+        print(f"Using {n} synthetic vectors")
+    rng = np.random.default_rng(1)
+    queries = matrix[rng.choice(len(matrix), N_QUERIES)] + 0.1 * rng.normal(size=(N_QUERIES, matrix.shape[1]))
+    queries = queries.astype(np.float32)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = LocalVectorStore(path=os.path.join(tmp, 'bench'))
+        start = time.perf_counter()
+        store.upsert([(str(i), row, {}) for i, row in enumerate(matrix)])
+        store.flush()
+        build = time.perf_counter() - start
+        # Reload memory-mapped, as the server would
+        store = LocalVectorStore(path=os.path.join(tmp, 'bench'))
+        print(f"Built and saved in {build:.2f}s, {store.matrix.nbytes / 1e6:.1f} MB matrix")
+
+        exact, lat = timed(lambda q: [m['id'] for m in store.query(q, top_k=TOP_K)['matches']], queries)
+        print(f"{'method':>16} {'recall@10':>9} {'p50 ms':>8} {'p95 ms':>8}")
+        print(f"{'brute force':>16} {1.0:>9.3f} {ms(lat, 0.5):>8.3f} {ms(lat, 0.95):>8.3f}")
+
+        store.ann = 'ivf'
+        start = time.perf_counter()
+        ann = store.build_ann()
+        print(f"IVF built in {time.perf_counter() - start:.2f}s with {ann.n_lists} lists")
+        for nprobe in NPROBES:
+            store.nprobe = nprobe
+            approx, lat = timed(lambda q: [m['id'] for m in store.query(q, top_k=TOP_K)['matches']], queries)
+            recall = np.mean([len(set(a) & set(e)) / len(e) for a, e in zip(approx, exact)])
+            print(f"{'ivf nprobe=' + str(nprobe):>16} {recall:>9.3f} {ms(lat, 0.5):>8.3f} {ms(lat, 0.95):>8.3f}")
@@ -0,0 +1,196 @@
+import os
+import sys
+import time
+import signal
+import argparse
+import tempfile
+import itertools
+import subprocess
+from types import SimpleNamespace
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import requests
+from bench_replay import HashEmbedder, build_local_store, load_queries, latency_summary
+
+# Memory per worker and /chat throughput of serve.py as the worker count grows,
+# with the model and data preloaded before the fork and loaded in each worker.
+# Offline: the hash embedder carrying model-sized weights, a local vector index
+# built from data/ and a stub Gemini with fixed latency behind the Gemini limiter.
+# Usage: python bench_workers.py [--workers 1,2,4] [--requests 300] [--concurrency 16]
+
+# all-MiniLM-L6-v2 holds about this many MB of float32 weights
+MODEL_MB = 90
+PORT = 8765
+
+
+class ModelSizedEmbedder(HashEmbedder):
+    """HashEmbedder that also holds MODEL_MB of weights, so per-worker model memory shows up in RSS."""
+
+    def __init__(self, weight_mb=MODEL_MB):
+        super().__init__()
+        self.weights = np.random.default_rng(0).standard_normal(weight_mb * 1024 * 1024 // 4, dtype=np.float32)
+
+
+class StubGeminiModel:
+    """Stands in for GenerativeModel, so calls still pass through gemini_utils' limiter."""
+
+    def __init__(self, latency):
+        self.latency = latency
+
+    def generate_content(self, prompt, stream=False):
+        time.sleep(self.latency)
+        response = SimpleNamespace(text='Stub answer for: ' + prompt.split('\n', 1)[0][:200])
+        return [response] if stream else response
+
+
+def serve_offline(args):
+    """Server side of one measurement, run in its own process."""
+    import serve
+    serve.configure_env(args.serve)
+    import fetch_and_store
+    import gemini_utils
+    fetch_and_store.load_embedder = lambda *a, **kwargs: ModelSizedEmbedder()
+    gemini_utils._model = StubGeminiModel(args.gemini_latency)
+    serve.serve(args.serve, '127.0.0.1', args.port, preload_app=not args.no_preload, log_level='warning')
+
+
+# Memory
+
+def proc_kb(pid, name, path='status'):
+    try:
+        with open(f'/proc/{pid}/{path}') as f:
+            return sum(int(line.split()[1]) for line in f if line.split(':')[0] in name)
+    except OSError:
+        return 0
+
+
+def child_pids(pid):
+    found = []
+    for entry in os.listdir('/proc'):
+        if entry.isdigit():
+            try:
+                with open(f'/proc/{entry}/stat') as f:
+                    if int(f.read().rsplit(')', 1)[1].split()[1]) == pid:
+                        found.append(int(entry))
+            except (OSError, ValueError, IndexError):
+                pass
+    return found
+
+
+def memory(server_pid):
+    """Per-worker RSS and USS (private pages), and the PSS of the launcher plus workers, in MB."""
+    workers = child_pids(server_pid)
+    rss = [proc_kb(pid, ('VmRSS',)) for pid in workers]
+    uss = [proc_kb(pid, ('Private_Clean', 'Private_Dirty'), 'smaps_rollup') for pid in workers]
+    pss = sum(proc_kb(pid, ('Pss',), 'smaps_rollup') for pid in [server_pid] + workers)
+    return {
+        'worker_rss_mb': round(np.mean(rss) / 1024, 1) if rss else None,
+        'worker_uss_mb': round(np.mean(uss) / 1024, 1) if uss else None,
+        'total_pss_mb': round(pss / 1024, 1),
+    }
+
+
+# Load
+
+def wait_ready(url, timeout=120):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if requests.get(url + '/stats', timeout=2).ok:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"server at {url} did not start within {timeout}s")
+
+
+def load(url, queries, total, concurrency):
+    """POST `total` /chat requests from `concurrency` clients, each keeping its own session."""
+    counter = itertools.count()
+    latencies = []
+    errors = []
+
+    def client():
+        http = requests.Session()
+        session_id = None
+        while True:
+            i = next(counter)
+            if i >= total:
+                return
+            # A distinct query each time, so caches and coalescing don't hide the work
+            payload = {'query': f"{queries[i % len(queries)]} {i}"}
+            if session_id:
+                payload['session_id'] = session_id
+            else:
+                payload['session'] = True
+            start = time.perf_counter()
+            response = http.post(url + '/chat', json=payload, timeout=60)
+            latencies.append(time.perf_counter() - start)
+            if response.ok:
+                session_id = response.json().get('session_id')
+            else:
+                errors.append(response.status_code)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for future in [pool.submit(client) for _ in range(concurrency)]:
+            future.result()
+    summary = latency_summary(concurrency, latencies, time.perf_counter() - start)
+    summary['errors'] = len(errors)
+    return summary
+
+
+def measure(args, workers, preload, env):
+    command = [sys.executable, __file__, '--serve', str(workers), '--port', str(args.port),
+               '--gemini-latency', str(args.gemini_latency)] + ([] if preload else ['--no-preload'])
+    server = subprocess.Popen(command, env=env)
+    url = f"http://127.0.0.1:{args.port}"
+    try:
+        wait_ready(url)
+        load(url, args.queries, args.concurrency * 2, args.concurrency)  # warm every worker
+        result = load(url, args.queries, args.requests, args.concurrency)
+        result.update(memory(server.pid))
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait(timeout=30)
+    result.update({'workers': workers, 'preload': preload})
+    return result
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description='RSS per worker and throughput of serve.py by worker count.')
+    parser.add_argument('--workers', default='1,2,4', help='worker counts, e.g. 1,2,4')
+    parser.add_argument('--requests', type=int, default=300, help='/chat requests per measurement')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--gemini-latency', type=float, default=0.2, help='seconds per stub Gemini answer')
+    parser.add_argument('--gemini-limit', type=int, default=16, help='GEMINI_MAX_CONCURRENCY across workers')
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('--serve', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--no-preload', action='store_true', help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args(sys.argv[1:])
+    if args.serve:
+        serve_offline(args)
+        sys.exit(0)
+    scratch = tempfile.mkdtemp()
+    store = build_local_store(HashEmbedder())
+    store.flush()
+    env = dict(os.environ,
+               VECTOR_BACKEND='local', LOCAL_INDEX_PATH=store.base_path,
+               VECTOR_VERSION_PATH=os.path.join(scratch, 'vector_version.json'),
+               SESSION_BACKEND='file', SESSION_DIR=os.path.join(scratch, 'sessions'),
+               RESPONSE_CACHE_SIZE='0', GEMINI_MAX_CONCURRENCY=str(args.gemini_limit), LOG_LEVEL='WARNING')
+    args.queries = [q['query'] for q in load_queries()]
+    print(f"{os.cpu_count()} CPUs; {args.requests} requests from {args.concurrency} clients, "
+          f"stub Gemini {args.gemini_latency}s, at most {args.gemini_limit} Gemini calls in flight")
+    print(f"{'workers':>7} {'preload':>7} {'req/s':>7} {'p50 ms':>7} {'p95 ms':>7} {'errors':>6} "
+          f"{'RSS/worker':>10} {'USS/worker':>10} {'total PSS':>9}")
+    for workers in [int(w) for w in args.workers.split(',') if w]:
+        for preload in (True, False):
+            r = measure(args, workers, preload, env)
+            print(f"{workers:>7} {'yes' if preload else 'no':>7} {r['req_per_sec']:>7} {r['p50_ms']:>7} "
+                  f"{r['p95_ms']:>7} {r['errors']:>6} {r['worker_rss_mb']:>8} MB {r['worker_uss_mb']:>8} MB "
+                  f"{r['total_pss_mb']:>6} MB")
@@ -0,0 +1,363 @@
+import os
+import math
+import time
+import hashlib
+import sqlite3
+import threading
+from array import array
+from collections import OrderedDict
+
+# In-memory query embedding cache
+EMBED_CACHE_SIZE = int(os.getenv('EMBED_CACHE_SIZE', '1024'))
+EMBED_CACHE_TTL = float(os.getenv('EMBED_CACHE_TTL', '86400'))  # seconds, 0 = never expire
+# Optional SQLite file for a persistent tier that survives restarts (empty = disabled)
+EMBED_CACHE_PATH = os.getenv('EMBED_CACHE_PATH', '')
+
+
+class LRUCache:
+    """
+    Thread-safe LRU cache with an optional per-entry TTL and hit/miss counters.
+    `on_evict(key)` is called (outside the lock) whenever a key leaves the
+    cache: evicted for space, found expired, popped or cleared.
+    """
+
+    def __init__(self, maxsize=1024, ttl=0, on_evict=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.on_evict = on_evict
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _evicted(self, keys):
+        if self.on_evict is not None:
+            for key in keys:
+                self.on_evict(key)
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                value, expires = entry
+                if not expires or expires > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+        if entry is not None:
+            self._evicted([key])
+        return default
+
+    def set(self, key, value):
+        expires = time.monotonic() + self.ttl if self.ttl else 0
+        evicted = []
+        with self._lock:
+            self._data[key] = (value, expires)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                evicted.append(self._data.popitem(last=False)[0])
+        self._evicted(evicted)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            entry = self._data.pop(key, None)
+        if entry is not None:
+            self._evicted([key])
+        return entry[0] if entry is not None else default
+
+    def clear(self):
+        with self._lock:
+            keys = list(self._data)
+            self._data.clear()
+        self._evicted(keys)
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'size': len(self._data),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / total, 4) if total else 0.0,
+        }
+
+
+class SQLiteVectorTier:
+    """Persistent key -> float32 vector store backed by a single SQLite file."""
+
+    def __init__(self, path):
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._pid = None
+        self._conn = None
+        self._connection()
+
+    def _connection(self):
+        # A connection must not cross a fork (serve.py workers): each process opens its own
+        if self._pid != os.getpid():
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute('CREATE TABLE IF NOT EXISTS vectors (key TEXT PRIMARY KEY, vec BLOB, created REAL)')
+            self._conn.commit()
+            self._pid = os.getpid()
+        return self._conn
+
+    def get(self, key, ttl=0):
+        with self._lock:
+            row = self._connection().execute('SELECT vec, created FROM vectors WHERE key = ?', (key,)).fetchone()
+        if row is None or (ttl and row[1] + ttl < time.time()):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return array('f', row[0]).tolist()
+
+    def set(self, key, vector):
+        blob = array('f', vector).tobytes()
+        with self._lock:
+            conn = self._connection()
+            conn.execute('INSERT OR REPLACE INTO vectors (key, vec, created) VALUES (?, ?, ?)',
+                               (key, blob, time.time()))
+            conn.commit()
+
+    def stats(self):
+        with self._lock:
+            size = self._connection().execute('SELECT COUNT(*) FROM vectors').fetchone()[0]
+        return {'path': self.path, 'size': size, 'hits': self.hits, 'misses': self.misses}
+
+
+class QueryEmbeddingCache:
+    """
+    Memoizes embed_fn(query) for normalized queries.
+
+    Lookups go memory LRU -> optional SQLite tier -> embed_fn. Keys are
+    prefixed with `namespace` (the model name) so a model change never
+    serves vectors from another embedding space. get_many() embeds all its
+    misses in one embed_many_fn call when one is given.
+    """
+
+    def __init__(self, embed_fn, namespace='', maxsize=EMBED_CACHE_SIZE, ttl=EMBED_CACHE_TTL, path=EMBED_CACHE_PATH,
+                 embed_many_fn=None):
+        self.embed_fn = embed_fn
+        self.embed_many_fn = embed_many_fn
+        self.namespace = namespace
+        self.ttl = ttl
+        self.memory = LRUCache(maxsize=maxsize, ttl=ttl)
+        self.disk = SQLiteVectorTier(path) if path else None
+
+    def _key(self, query):
+        return f"{self.namespace}:{query}"
+
+    def get_cached(self, query):
+        """Memory-only lookup; cheap enough to call on the event loop."""
+        return self.memory.get(self._key(query))
+
+    def get(self, query, check_memory=True):
+        key = self._key(query)
+        if check_memory:
+            embedding = self.memory.get(key)
+            if embedding is not None:
+                return embedding
+        if self.disk is not None:
+            embedding = self.disk.get(key, ttl=self.ttl)
+            if embedding is not None:
+                self.memory.set(key, embedding)
+                return embedding
+        embedding = self.embed_fn(query)
+        self._store(key, embedding)
+        return embedding
+
+    __call__ = get
+
+    def _lookup(self, key):
+        embedding = self.memory.get(key)
+        if embedding is None and self.disk is not None:
+            embedding = self.disk.get(key, ttl=self.ttl)
+            if embedding is not None:
+                self.memory.set(key, embedding)
+        return embedding
+
+    def _store(self, key, embedding):
+        self.memory.set(key, embedding)
+        if self.disk is not None:
+            self.disk.set(key, embedding)
+
+    def get_many(self, queries):
+        """Embeddings for several queries, in order; the uncached ones are embedded together."""
+        found = {}
+        missing = []
+        for query in dict.fromkeys(queries):
+            embedding = self._lookup(self._key(query))
+            if embedding is None:
+                missing.append(query)
+            else:
+                found[query] = embedding
+        if missing:
+            if self.embed_many_fn is not None:
+                embeddings = self.embed_many_fn(missing)
+            else:
+                embeddings = [self.embed_fn(query) for query in missing]
+            for query, embedding in zip(missing, embeddings):
+                self._store(self._key(query), embedding)
+                found[query] = embedding
+        return [found[query] for query in queries]
+
+    def stats(self):
+        stats = {'memory': self.memory.stats()}
+        if self.disk is not None:
+            stats['disk'] = self.disk.stats()
+        return stats
+
+
+# Gemini answer cache
+RESPONSE_CACHE_SIZE = int(os.getenv('RESPONSE_CACHE_SIZE', '2048'))
+RESPONSE_CACHE_TTL = float(os.getenv('RESPONSE_CACHE_TTL', '21600'))  # seconds, 0 = never expire
+# Cosine similarity above which a cached answer for the same circular is reused (0 = exact hits only)
+RESPONSE_CACHE_SEMANTIC_THRESHOLD = float(os.getenv('RESPONSE_CACHE_SEMANTIC_THRESHOLD', '0'))
+# Cached query embeddings kept per (circular, language, history) for semantic hits;
+# an embedding is dropped with its answer, so all groups together never outgrow the cache
+RESPONSE_CACHE_SEMANTIC_PER_DOC = 32
+
+
+def history_hash(history, summary=''):
+    """
+    Stable hash of the compacted history and running summary, exactly as
+    pasted into the prompt: every turn counts, so two conversations only
+    share a key when their prompts match.
+    """
+    digest = hashlib.sha1()
+    if summary:
+        digest.update(summary.encode('utf-8'))
+        digest.update(b'\x02')
+    for turn in history or []:
+        if isinstance(turn, dict):
+            digest.update(str(turn.get('role', 'user')).encode('utf-8'))
+            digest.update(b'\x00')
+            digest.update(str(turn.get('content', '')).encode('utf-8'))
+            digest.update(b'\x01')
+    return digest.hexdigest()[:16]
+
+
+def _cosine(a, norm_a, b, norm_b):
+    if not norm_a or not norm_b:
+        return 0.0
+    return sum(x * y for x, y in zip(a, b)) / (norm_a * norm_b)
+
+
+def _norm(vector):
+    return math.sqrt(sum(x * x for x in vector))
+
+
+class ResponseCache:
+    """
+    Caches generated answers keyed by (normalized query, nid, language, history hash),
+    the hash covering the history summary too.
+
+    Each entry remembers the circular's `changed` timestamp and is dropped
+    when a lookup sees a different one. With a semantic threshold, a miss
+    may still reuse an answer for the same circular, language and history
+    whose query embedding is close enough.
+    """
+
+    def __init__(self, maxsize=RESPONSE_CACHE_SIZE, ttl=RESPONSE_CACHE_TTL,
+                 semantic_threshold=RESPONSE_CACHE_SEMANTIC_THRESHOLD):
+        self.entries = LRUCache(maxsize=maxsize, ttl=ttl, on_evict=self._forget)
+        self.semantic_threshold = semantic_threshold
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._semantic = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(normalized_query, nid, lang, history=None, history_summary=''):
+        return (normalized_query, str(nid), lang, history_hash(history, summary=history_summary))
+
+    def _forget(self, key):
+        """Drop the query embedding of an answer that has left the cache."""
+        with self._lock:
+            group = self._semantic.get(key[1:])
+            if group is not None:
+                group.pop(key, None)
+                if not group:
+                    del self._semantic[key[1:]]
+
+    def _fresh(self, key, entry, changed):
+        if entry is None:
+            return None
+        if entry['changed'] != changed:
+            self.entries.pop(key)
+            self.invalidations += 1
+            return None
+        return entry['answer']
+
+    def get(self, key, changed=None):
+        answer = self._fresh(key, self.entries.get(key), changed)
+        if answer is None:
+            self.misses += 1
+        else:
+            self.exact_hits += 1
+        return answer
+
+    def get_semantic(self, key, embedding, changed=None):
+        """Best cached answer for the same (nid, lang, history) within the cosine threshold."""
+        if not self.semantic_threshold or embedding is None:
+            return None
+        group = key[1:]
+        norm = _norm(embedding)
+        with self._lock:
+            candidates = list(self._semantic.get(group, {}).items())
+        scored = []
+        for cached_key, (cached_embedding, cached_norm) in candidates:
+            score = _cosine(embedding, norm, cached_embedding, cached_norm)
+            if score >= self.semantic_threshold:
+                scored.append((score, cached_key))
+        for score, cached_key in sorted(scored, reverse=True):
+            entry = self.entries.get(cached_key)
+            if entry is None:
+                # Expired or evicted since the scan; _forget has dropped or will drop it
+                self._forget(cached_key)
+                continue
+            answer = self._fresh(cached_key, entry, changed)
+            if answer is None:
+                # Invalidated by a newer `changed`; the next closest may still be current
+                continue
+            # The exact lookup already counted a miss for this request
+            self.misses -= 1
+            self.semantic_hits += 1
+            return answer
+        return None
+
+    def set(self, key, answer, changed=None, embedding=None):
+        self.entries.set(key, {'answer': answer, 'changed': changed})
+        if self.semantic_threshold and embedding is not None:
+            with self._lock:
+                if key not in self.entries:
+                    return  # already evicted again (tiny caches)
+                group = self._semantic.setdefault(key[1:], OrderedDict())
+                group[key] = (list(embedding), _norm(embedding))
+                group.move_to_end(key)
+                while len(group) > RESPONSE_CACHE_SEMANTIC_PER_DOC:
+                    group.popitem(last=False)
+
+    def stats(self):
+        total = self.exact_hits + self.semantic_hits + self.misses
+        return {
+            'size': len(self.entries),
+            'exact_hits': self.exact_hits,
+            'semantic_hits': self.semantic_hits,
+            'misses': self.misses,
+            'invalidations': self.invalidations,
+            'hit_rate': round((self.exact_hits + self.semantic_hits) / total, 4) if total else 0.0,
+            'semantic_threshold': self.semantic_threshold,
+            'semantic_embeddings': sum(len(group) for group in self._semantic.values()),
+        }
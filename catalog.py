@@ -0,0 +1,286 @@
+import os
+import re
+import json
+import logging
+import threading
+from datetime import datetime, timezone
+from doc_store import DocumentStore
+
+logger = logging.getLogger(__name__)
+
+DATA_DIR = 'data'
+
+# Content types kept in the catalog (one JSON file per type in DATA_DIR)
+CATALOG_CONTENT_TYPES = [
+    'circular',
+    'rti_act',
+    'mmc_act',
+]
+
+DISPLAY_DATE_FORMAT = '%d %B %Y'
+
+# Sync runs append changes to <content_type>.changes.jsonl next to the JSON
+# snapshot instead of rewriting it; the journal is folded back in by compact_records().
+JOURNAL_SUFFIX = '.changes.jsonl'
+
+# When DATA_DIR holds this SQLite file (created by `python doc_store.py import`)
+# it replaces the JSON snapshots and journals as the source of records.
+DOC_STORE_FILE = 'documents.sqlite3'
+
+
+def record_nid(item):
+    return str(item.get('nid', item.get('id', 'unknown')))
+
+
+def snapshot_path(data_dir, content_type):
+    return os.path.join(data_dir, f"{content_type}.json")
+
+
+def journal_path(data_dir, content_type):
+    return os.path.join(data_dir, f"{content_type}{JOURNAL_SUFFIX}")
+
+
+def apply_journal(records, journal_file):
+    """Replay journal ops ({'op': 'upsert', 'node': {...}} / {'op': 'delete', 'nid': ...}) over records."""
+    if not os.path.exists(journal_file):
+        return records
+    merged = {}
+    for item in records:
+        if isinstance(item, dict):
+            merged[record_nid(item)] = item
+    with open(journal_file, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                entry = json.loads(line)
+            except Exception:
+                # A torn last line from an interrupted sync; later lines cannot exist
+                break
+            if entry.get('op') == 'upsert' and isinstance(entry.get('node'), dict):
+                merged[record_nid(entry['node'])] = entry['node']
+            elif entry.get('op') == 'delete':
+                merged.pop(str(entry.get('nid')), None)
+    return list(merged.values())
+
+
+def doc_store_path(data_dir):
+    return os.path.join(data_dir, DOC_STORE_FILE)
+
+
+_doc_stores = {}
+_doc_stores_lock = threading.Lock()
+
+
+def get_doc_store(data_dir):
+    """Shared DocumentStore for data_dir, or None when the directory still uses JSON files."""
+    path = doc_store_path(data_dir)
+    if not os.path.exists(path):
+        return None
+    # Per process too: a SQLite connection must not cross a fork (serve.py workers)
+    key = (path, os.getpid())
+    with _doc_stores_lock:
+        if key not in _doc_stores:
+            _doc_stores[key] = DocumentStore(path)
+        return _doc_stores[key]
+
+
+def load_records(data_dir, content_type):
+    """Current records of a content type, from the SQLite store or the JSON files."""
+    store = get_doc_store(data_dir)
+    if store is not None:
+        return store.records(content_type)
+    return load_json_records(data_dir, content_type)
+
+
+def write_changes(data_dir, content_type, upserts=(), deletes=()):
+    """Record synced changes in the SQLite store, or append them to the JSON journal."""
+    store = get_doc_store(data_dir)
+    if store is None:
+        return append_journal(data_dir, content_type, upserts, deletes)
+    return store.upsert(content_type, upserts) + store.delete(content_type, deletes)
+
+
+def load_json_records(data_dir, content_type):
+    """Current records of a content type: the JSON snapshot plus its change journal."""
+    path = snapshot_path(data_dir, content_type)
+    records = []
+    if os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            try:
+                records = json.load(f)
+            except Exception:
+                records = []
+    return apply_journal(records, journal_path(data_dir, content_type))
+
+
+def append_journal(data_dir, content_type, upserts=(), deletes=()):
+    """Append upsert/delete ops; cost is proportional to the number of changes."""
+    lines = [json.dumps({'op': 'upsert', 'node': node}, ensure_ascii=False) for node in upserts]
+    lines += [json.dumps({'op': 'delete', 'nid': str(nid)}) for nid in deletes]
+    if not lines:
+        return 0
+    with open(journal_path(data_dir, content_type), 'a', encoding='utf-8') as f:
+        f.write('\n'.join(lines) + '\n')
+        f.flush()
+        os.fsync(f.fileno())
+    return len(lines)
+
+
+def journal_length(data_dir, content_type):
+    path = journal_path(data_dir, content_type)
+    if not os.path.exists(path):
+        return 0
+    with open(path, 'r', encoding='utf-8') as f:
+        return sum(1 for line in f if line.strip())
+
+
+def compact_records(data_dir, content_type):
+    """Fold the journal into the JSON snapshot and remove it."""
+    records = load_json_records(data_dir, content_type)
+    path = snapshot_path(data_dir, content_type)
+    tmp = path + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(records, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
+    journal = journal_path(data_dir, content_type)
+    if os.path.exists(journal):
+        os.remove(journal)
+    return len(records)
+
+
+def parse_display_date(date_str):
+    """Parse a Drupal display_date like '18 July 2025'; unknown dates sort last."""
+    try:
+        return datetime.strptime(date_str, DISPLAY_DATE_FORMAT) if date_str else datetime.min
+    except Exception:
+        return datetime.min
+
+
+def display_date_epoch(date_str):
+    """display_date as seconds since the epoch (midnight UTC), for range filters; None if unparseable."""
+    parsed = parse_display_date(date_str)
+    if parsed == datetime.min:
+        return None
+    return int(parsed.replace(tzinfo=timezone.utc).timestamp())
+
+
+def department_key(name):
+    """Normalised department key: 'Chief Accounts And Finance Office' -> 'chief_accounts_and_finance_office'."""
+    if not name:
+        return None
+    return re.sub(r'[^a-z0-9]+', '_', name.lower()).strip('_') or None
+
+
+class CatalogView:
+    """Read-only, pre-indexed view over the records of one content type."""
+
+    def __init__(self, content_type, records, mtime):
+        self.content_type = content_type
+        self.records = records
+        self.mtime = mtime
+        self.by_nid = {}
+        for item in records:
+            if isinstance(item, dict):
+                self.by_nid.setdefault(record_nid(item), item)
+        # Newest first; the parse happens once per load instead of once per request
+        self.by_date = sorted(
+            (item for item in records if isinstance(item, dict)),
+            key=lambda item: parse_display_date(item.get('display_date')),
+            reverse=True,
+        )
+        self.departments = sorted({item['department'] for item in records
+                                   if isinstance(item, dict) and item.get('department')})
+
+    def __len__(self):
+        return len(self.records)
+
+    def get(self, nid):
+        return self.by_nid.get(str(nid))
+
+    def latest(self, predicate=None):
+        for item in self.by_date:
+            if predicate is None or predicate(item):
+                return item
+        return None
+
+
+class DocumentCatalog:
+    """
+    Process-wide cache of the records in DATA_DIR.
+
+    Each content type is loaded on first use and reloaded whenever the
+    snapshot's or journal's mtime changes (or the SQLite store's, when
+    there is one), so ingest runs are picked up without a restart.
+    """
+
+    def __init__(self, data_dir=DATA_DIR, content_types=None):
+        self.data_dir = data_dir
+        self.content_types = list(content_types or CATALOG_CONTENT_TYPES)
+        self._views = {}
+        self._lock = threading.Lock()
+
+    def path_for(self, content_type):
+        return snapshot_path(self.data_dir, content_type)
+
+    def _mtime(self, content_type):
+        try:
+            # One file for every content type; a sync of any type reloads all of them
+            return (os.stat(doc_store_path(self.data_dir)).st_mtime_ns,)
+        except OSError:
+            pass
+        mtimes = []
+        for path in (self.path_for(content_type), journal_path(self.data_dir, content_type)):
+            try:
+                mtimes.append(os.stat(path).st_mtime_ns)
+            except OSError:
+                mtimes.append(None)
+        return None if mtimes == [None, None] else tuple(mtimes)
+
+    def view(self, content_type='circular'):
+        mtime = self._mtime(content_type)
+        if mtime is None:
+            return CatalogView(content_type, [], None)
+        current = self._views.get(content_type)
+        if current is not None and current.mtime == mtime:
+            return current
+        with self._lock:
+            current = self._views.get(content_type)
+            if current is None or current.mtime != mtime:
+                current = CatalogView(content_type, load_records(self.data_dir, content_type), mtime)
+                self._views[content_type] = current
+                logger.info("Catalog loaded %d %s records from %s", len(current), content_type, self.data_dir)
+            return current
+
+    def get(self, nid, content_type='circular'):
+        return self.view(content_type).get(nid)
+
+    def latest(self, content_type='circular', predicate=None):
+        return self.view(content_type).latest(predicate)
+
+    def items(self, content_type='circular'):
+        return self.view(content_type).records
+
+    def departments(self):
+        """Department names across all content types, for matching filter hints in queries."""
+        names = set()
+        for content_type in self.content_types:
+            names.update(self.view(content_type).departments)
+        return sorted(names)
+
+    def preload(self):
+        for content_type in self.content_types:
+            self.view(content_type)
+        return self
+
+
+_catalog = None
+
+
+def get_catalog():
+    """Return the shared catalog used by the chat server."""
+    global _catalog
+    if _catalog is None:
+        _catalog = DocumentCatalog()
+    return _catalog
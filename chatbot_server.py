@@ -2,19 +2,52 @@ import os
 from dotenv import load_dotenv
 load_dotenv()
 import re
-from fastapi import FastAPI, Request
+import json
+import time
+import asyncio
+import logging
+from fastapi import FastAPI, Request, HTTPException
+from fastapi.responses import StreamingResponse, PlainTextResponse
 from pydantic import BaseModel
-from fetch_and_store import get_embedding, search_vectors  # Updated import
-from gemini_utils import generate_gemini_response
+from fetch_and_store import get_embedding, get_embeddings, search_vectors, warm_up, EMBEDDING_NAMESPACE, PDF_CHUNKS  # Updated import
+from gemini_utils import generate_gemini_response, stream_gemini_response, get_model as get_gemini_model, gemini_stats, acquire_gemini_slot, get_gemini_slots
 from language_utils import detect_language
+from catalog import get_catalog
+from keyword_index import get_keyword_index, reciprocal_rank_fusion, doc_id, split_doc_id
+from cache_utils import QueryEmbeddingCache, ResponseCache
+from session_store import get_session_store, new_session, valid_session_id, compact_history, add_exchange
+from query_filters import SearchFilters, parse_filter_hints
+from metrics import span, record_stage, start_request, finish_request, set_current_timer, render_metrics
+from async_utils import (run_cpu, run_io, iterate_in_thread, get_io_executor, shutdown_executors, SingleFlight,
+                         EMBED_TIMEOUT, SEARCH_TIMEOUT, GEMINI_TIMEOUT)
 import multiprocessing
 from multiprocessing.pool import ApplyResult
-from typing import Optional
-import json
-from datetime import datetime
+from typing import Optional, List
+from contextlib import asynccontextmanager
 
 DATA_DIR = 'data'
 
+# DEBUG shows per-query retrieval details and the full Gemini prompt
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+logging.basicConfig(level=LOG_LEVEL, format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+logger = logging.getLogger('chatbot_server')
+# Fuse vector and BM25 rankings with reciprocal rank fusion (0 = vector ranking only)
+HYBRID_SEARCH = os.getenv('HYBRID_SEARCH', '1') == '1'
+# Narrow searches by content type, department and date phrases found in the query (0 = off)
+QUERY_FILTERS = os.getenv('QUERY_FILTERS', '1') == '1'
+# Candidates fetched per search, unfiltered and when a filter already narrows the set
+SEARCH_TOP_K = int(os.getenv('SEARCH_TOP_K', '10'))
+FILTERED_TOP_K = int(os.getenv('FILTERED_TOP_K', '5'))
+# With PDF chunks in the index, searches fetch this many times top_k matches
+# so that enough distinct documents remain after collapsing chunks
+CHUNK_OVERFETCH = int(os.getenv('CHUNK_OVERFETCH', '3')) if PDF_CHUNKS else 1
+# Concurrent identical searches and answer generations share one in-flight call (0 = off)
+COALESCE_REQUESTS = os.getenv('COALESCE_REQUESTS', '1') == '1'
+# Most queries accepted by one /chat/batch call
+BATCH_MAX_ITEMS = int(os.getenv('BATCH_MAX_ITEMS', '64'))
+# Gemini generations one /chat/batch call runs at once
+BATCH_GENERATION_CONCURRENCY = int(os.getenv('BATCH_GENERATION_CONCURRENCY', '8'))
+
 # Add a function to normalize user queries
 import re as _re
 
@@ -26,12 +59,44 @@ def normalize_query(query):
     query = _re.sub(r"\s+", " ", query).strip()
     return query
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app):
+    # Load the embedding model, connect the vector store and read the catalog
+    # before the first request instead of during it
+    try:
+        await run_cpu(warm_up, timeout=None)
+        await run_io(get_gemini_model)
+    except Exception as e:
+        logger.warning("Warm-up failed, resources will load on first use: %s", e)
+    get_catalog().preload()
+    get_keyword_index()
+    # A Gemini limit this platform can't enforce stops startup here, not every answer later
+    get_gemini_slots()
+    yield
+    shutdown_executors()
+
+app = FastAPI(lifespan=lifespan)
+
+# Query embeddings keyed on the normalized query and embedding backend (see cache_utils for env settings)
+embedding_cache = QueryEmbeddingCache(get_embedding, namespace=EMBEDDING_NAMESPACE, embed_many_fn=get_embeddings)
+# Generated answers keyed on (normalized query, nid, language, compacted history and summary)
+response_cache = ResponseCache()
+# In-flight searches keyed on (normalized query, top_k, filter), and answer
+# generations keyed on the response cache key plus the circular's `changed`
+search_flight = SingleFlight('search', enabled=COALESCE_REQUESTS)
+generation_flight = SingleFlight('generation', enabled=COALESCE_REQUESTS)
 
 class ChatRequest(BaseModel):
     query: str
+    session_id: Optional[str] = None  # Server-side history: an id returned by an earlier response
+    session: Optional[bool] = False  # Start a server-side session; the response carries its id
     last_circular_id: Optional[str] = None  # For session context
-    history: Optional[list] = None  # Add conversation history
+    history: Optional[list] = None  # Client-held history, used instead of a session when sent without session_id
+    timings: Optional[bool] = False  # Return the per-stage timing breakdown (ms)
+
+class ChatBatchRequest(BaseModel):
+    items: List[ChatRequest]
+    timings: Optional[bool] = False  # Per-stage breakdown (ms) summed over the batch
 
 # Add a helper to convert relative links to full URLs
 BASE_URL = "https://pmc.gov.in"  # Change to your actual base URL if different
@@ -45,17 +110,43 @@ def make_full_url(link):
         return BASE_URL + link
     return link
 
-def search_context(query, top_k=5):
-    embedding = get_embedding(query)
-    res = search_vectors(embedding, top_k=top_k)
+def search_context(query, top_k=5, filters=None):
+    embedding = embedding_cache.get(query)
+    res = search_vectors(embedding, top_k=top_k * CHUNK_OVERFETCH, filter=filters.to_vector_filter() if filters else None)
+    return collapse_chunks(format_matches(query, res), top_k)
+
+async def search_context_async(query, top_k=5, filters=None):
+    """
+    search_context with encoding on the CPU pool and the Pinecone query on the I/O pool.
+
+    Identical concurrent searches share one embedding and one vector query.
+    """
+    vector_filter = filters.to_vector_filter() if filters else None
+
+    async def search():
+        with span('embedding'):
+            embedding = embedding_cache.get_cached(query)
+            if embedding is None:
+                embedding = await run_cpu(embedding_cache.get, query, check_memory=False, timeout=EMBED_TIMEOUT)
+        with span('vector_search'):
+            res = await run_io(search_vectors, embedding, top_k=top_k * CHUNK_OVERFETCH, timeout=SEARCH_TIMEOUT,
+                               filter=vector_filter)
+        return collapse_chunks(format_matches(query, res), top_k)
+
+    return await search_flight.do((query, top_k, json.dumps(vector_filter, sort_keys=True)), search)
+
+def format_matches(query, res):
     if isinstance(res, ApplyResult):
         res = res.get()
     results = []
-    print("\nDEBUG: Top matches for query:", query)
+    debug = logger.isEnabledFor(logging.DEBUG)
+    if debug:
+        logger.debug("Top matches for query: %s", query)
     for match in res['matches']:
         meta = match['metadata']
         text = meta.get('text', '')
-        print("  -", text[:120].replace('\n', ' '))
+        if debug:
+            logger.debug("  - %s", text[:120].replace('\n', ' '))
         # Always prefer the 'file' field for PDF links
         file_link = meta.get('file')
         # Fallbacks if 'file' is not present
@@ -63,7 +154,8 @@ def search_context(query, top_k=5):
             file_link = meta.get('link') or meta.get('external_link') or meta.get('url')
         file_link = make_full_url(file_link)
         results.append({
-            'id': match['id'],
+            # A PDF chunk stands in for its parent document
+            'id': meta.get('parent_id') or match['id'],
             'score': match['score'],
             'text': text,
             'content_type': meta.get('content_type', ''),
@@ -75,6 +167,17 @@ def search_context(query, top_k=5):
         })
     return results
 
+def collapse_chunks(results, top_k):
+    """One result per document, at the rank of its best match (the node itself or one of its PDF chunks)."""
+    seen = set()
+    collapsed = []
+    for ctx in results:
+        key = context_doc_id(ctx)
+        if key not in seen:
+            seen.add(key)
+            collapsed.append(ctx)
+    return collapsed[:top_k]
+
 # Helper to find circular by nid in context results
 
 def find_circular_by_id(context_results, nid):
@@ -83,7 +186,63 @@ def find_circular_by_id(context_results, nid):
             return ctx
     return None
 
-# Removed: load_circular_by_nid and all references to it
+def circular_to_context(circ, content_type='circular'):
+    """Shape a catalog record like a search_context result."""
+    return {
+        'nid': circ.get('nid'),
+        'title': circ.get('title'),
+        'text': circ.get('body', ''),
+        'link': circ.get('file') or circ.get('url') or circ.get('link'),
+        'display_date': circ.get('display_date'),
+        'content_type': content_type,
+        'raw_metadata': circ
+    }
+
+def context_doc_id(ctx):
+    """Keyword-index id ('<content_type>:<nid>') of a search_context result."""
+    nid = ctx.get('nid') or str(ctx.get('id', '')).rsplit('_', 1)[-1]
+    return doc_id(ctx.get('content_type') or 'circular', nid)
+
+def filter_keyword_hits(keyword_hits, filters, catalog):
+    """Drop BM25 hits whose catalog record fails the department/date filters."""
+    kept = []
+    for key, score in keyword_hits:
+        content_type, nid = split_doc_id(key)
+        record = catalog.get(nid, content_type)
+        if record is not None and filters.matches(record, content_type):
+            kept.append((key, score))
+    return kept
+
+def keyword_hit_to_context(key, catalog):
+    content_type, nid = split_doc_id(key)
+    record = catalog.get(nid, content_type)
+    return circular_to_context(record, content_type) if record else None
+
+def select_top_document(user_query, context_results, keyword_hits, keyword_index, catalog):
+    """Pick the document to answer from, given vector results and BM25 keyword hits."""
+    # Every query term in a title: trust the keyword index outright
+    if keyword_hits and keyword_index.is_title_match(keyword_hits[0][0], user_query):
+        ctx = keyword_hit_to_context(keyword_hits[0][0], catalog)
+        if ctx:
+            logger.debug("Keyword title match: nid=%s, title=%s", ctx.get('nid'), ctx.get('title'))
+            return ctx
+    if HYBRID_SEARCH:
+        by_id = {}
+        for ctx in context_results:
+            by_id.setdefault(context_doc_id(ctx), ctx)
+        fused = reciprocal_rank_fusion([list(by_id), [key for key, _ in keyword_hits]])
+        for key, _ in fused:
+            ctx = by_id.get(key) or keyword_hit_to_context(key, catalog)
+            if ctx:
+                return ctx
+    return context_results[0] if context_results else None
+
+def circular_changed(top_circular, catalog):
+    """Drupal `changed` timestamp of the matched document, used to invalidate cached answers."""
+    record = catalog.get(top_circular.get('nid'), top_circular.get('content_type') or 'circular')
+    if record is not None:
+        return record.get('changed')
+    return (top_circular.get('raw_metadata') or {}).get('changed')
 
 def compose_prompt(user_query, context_results, lang, history=None):
     # Compose conversation history for Gemini prompt
@@ -119,17 +278,100 @@ def compose_prompt(user_query, context_results, lang, history=None):
             f"Context:\n{context_str}\n"
             f"Using the above context, answer the user's question in English. If the user asks for a specific circular, date, or PDF link, provide that information explicitly. Always include the PDF link in your answer if available."
         )
-    print("\nDEBUG: Prompt sent to Gemini:\n", prompt)
+    logger.debug("Prompt sent to Gemini:\n%s", prompt)
     return prompt
 
-@app.post('/chat')
-async def chat(request: ChatRequest):
+def rewrite_pdf_links(answer, pdf_link):
+    """Replace any [PDF](...) or raw links with one correct [PDF](pdf_link)."""
+    # Remove any malformed or double-encoded links
+    answer = re.sub(r"\[PDF\]\([^)]*\)", "", answer)  # Remove any existing [PDF](...)
+    answer = re.sub(r"https?://\S+", "[PDF](%s)" % pdf_link, answer)
+    # Ensure only one [PDF](...) in the answer
+    if f"[PDF]({pdf_link})" not in answer:
+        answer = answer.strip() + f" [PDF]({pdf_link})"
+    return answer
+
+class PdfLinkRewriter:
+    """
+    Incremental rewrite_pdf_links for streamed answers.
+
+    Text is released up to the last whitespace, so every URL in a released
+    segment is complete, and never past an unclosed '[PDF](' so a partial
+    Markdown link is not rewritten twice.
+    """
+
+    def __init__(self, pdf_link):
+        self.pdf_link = pdf_link
+        self.pending = ''
+        self.emitted = ''
+
+    def _rewrite(self, segment):
+        segment = re.sub(r"\[PDF\]\([^)]*\)", "", segment)
+        return re.sub(r"https?://\S+", "[PDF](%s)" % self.pdf_link, segment)
+
+    def feed(self, chunk):
+        self.pending += chunk
+        cut = max(self.pending.rfind(' '), self.pending.rfind('\n'), self.pending.rfind('\t')) + 1
+        unclosed = self.pending.rfind('[PDF](')
+        if unclosed != -1 and ')' not in self.pending[unclosed + 6:]:
+            cut = min(cut, unclosed)
+        if cut <= 0:
+            return ''
+        segment, self.pending = self._rewrite(self.pending[:cut]), self.pending[cut:]
+        self.emitted += segment
+        return segment
+
+    def finish(self):
+        segment = self._rewrite(self.pending)
+        self.pending = ''
+        if f"[PDF]({self.pdf_link})" not in self.emitted + segment:
+            segment = segment.rstrip() + f" [PDF]({self.pdf_link})"
+        self.emitted += segment
+        return segment
+
+def load_session(session_id):
+    """
+    The stored session for an id the server issued, or a new session under a
+    fresh server-generated id when it is unknown or expired. A client never
+    chooses its own id.
+    """
+    if valid_session_id(session_id):
+        session = get_session_store().get(session_id)
+        if session is not None:
+            return session
+    return new_session()
+
+async def save_exchange(turn, answer):
+    """Add the answered exchange to the turn's session and store it."""
+    session = turn.get('session')
+    if session is None:
+        return
+    try:
+        with span('session'):
+            add_exchange(session, turn['user_query'], answer, turn['top_circular'])
+            await run_io(get_session_store().save, session)
+    except Exception as e:
+        logger.warning("Could not save session %s: %s", session['id'], e)
+
+async def retrieve(request):
+    """Language detection, query normalization and document resolution for one chat request."""
     user_query = request.query.strip()
-    lang = detect_language(user_query)
-    history = request.history or []
-    normalized_query = normalize_query(user_query)
-    print(f"[DEBUG] Original query: {user_query}")
-    print(f"[DEBUG] Normalized query: {normalized_query}")
+    catalog = get_catalog()
+    with span('language_detection'):
+        lang = detect_language(user_query)
+    session = None
+    # Stateless unless the client asks for a session, so anonymous traffic
+    # neither writes a session per request nor evicts real conversations
+    if request.session_id or request.session:
+        with span('session'):
+            session = await run_io(load_session, request.session_id)
+        history, history_summary = session['history'], session['summary']
+    else:
+        history, history_summary = compact_history(request.history or [])
+    with span('normalize'):
+        normalized_query = normalize_query(user_query)
+    logger.debug("Original query: %s", user_query)
+    logger.debug("Normalized query: %s", normalized_query)
 
     # Detect if the query is for the latest/most recent circular
     is_latest_query = bool(re.search(r'(latest|most recent|newest|recently published|सर्वात अलीकडील|नवीन|नुकतेच प्रकाशित|नवीनतम|अलीकडेच)', user_query, re.I))
@@ -140,143 +382,380 @@ async def chat(request: ChatRequest):
     last_circular = None
     if request.last_circular_id:
         last_circular = request.last_circular_id
-    elif history:
-        for turn in reversed(history):
+    elif session is not None:
+        last_circular = session.get('last_circular_id')
+    elif request.history:
+        for turn in reversed(request.history):
             if isinstance(turn, dict) and turn.get('role') == 'assistant' and turn.get('circular_metadata'):
                 last_circular = turn['circular_metadata'].get('nid')
                 break
 
+    with span('filters'):
+        filters = parse_filter_hints(user_query, catalog.departments()) if QUERY_FILTERS else SearchFilters()
+    if not filters.is_empty():
+        logger.debug("Query filters: %s", filters.describe())
+
     if is_latest_query:
         try:
-            with open(os.path.join(DATA_DIR, 'circular.json'), 'r', encoding='utf-8') as f:
-                all_circulars = json.load(f)
-            def parse_date(item):
-                date_str = item.get('display_date')
-                try:
-                    return datetime.strptime(date_str, '%d %B %Y') if date_str else datetime.min
-                except Exception:
-                    return datetime.min
-            all_circulars = sorted(all_circulars, key=parse_date, reverse=True)
-            for circ in all_circulars:
-                if circ.get('file') or circ.get('url') or circ.get('link'):
-                    top_circular = {
-                        'nid': circ.get('nid'),
-                        'title': circ.get('title'),
-                        'text': circ.get('body', ''),
-                        'link': circ.get('file') or circ.get('url') or circ.get('link'),
-                        'display_date': circ.get('display_date'),
-                        'content_type': 'circular',
-                        'raw_metadata': circ
-                    }
-                    break
+            content_type = filters.content_type or 'circular'
+            with span('catalog_lookup'):
+                circ = catalog.latest(content_type, predicate=lambda c: (c.get('file') or c.get('url') or c.get('link'))
+                                      and filters.matches(c, content_type))
+            if circ:
+                top_circular = circular_to_context(circ, content_type)
         except Exception as e:
-            print(f"[DEBUG] Latest circular search failed: {e}")
+            logger.warning("Latest circular search failed: %s", e)
     elif is_followup and last_circular:
         try:
-            with open(os.path.join(DATA_DIR, 'circular.json'), 'r', encoding='utf-8') as f:
-                all_circulars = json.load(f)
-            for circ in all_circulars:
-                if str(circ.get('nid')) == str(last_circular):
-                    print(f"[DEBUG] Context-following: using last_circular nid={circ.get('nid')}, title={circ.get('title')}")
-                    top_circular = {
-                        'nid': circ.get('nid'),
-                        'title': circ.get('title'),
-                        'text': circ.get('body', ''),
-                        'link': circ.get('file') or circ.get('url') or circ.get('link'),
-                        'display_date': circ.get('display_date'),
-                        'content_type': 'circular',
-                        'raw_metadata': circ
-                    }
-                    break
+            with span('catalog_lookup'):
+                circ = catalog.get(last_circular, 'circular')
+            if circ:
+                logger.debug("Context-following: using last_circular nid=%s, title=%s", circ.get('nid'), circ.get('title'))
+                top_circular = circular_to_context(circ)
         except Exception as e:
-            print(f"[DEBUG] Context-following JSON search failed: {e}")
+            logger.warning("Context-following catalog lookup failed: %s", e)
     else:
-        context_results = search_context(normalized_query, top_k=10)
-        print(f"\n[DEBUG] Query: {normalized_query}")
-        for i, ctx in enumerate(context_results):
-            print(f"[DEBUG] Result {i+1}: nid={ctx.get('nid')}, title={ctx.get('title')}, link={ctx.get('link')}")
-        def find_best_match(context_results, user_query):
-            user_query_lower = user_query.lower()
-            for ctx in context_results:
-                title = ctx.get('title', '').lower()
-                text = ctx.get('text', '').lower()
-                if user_query_lower in title or user_query_lower in text:
-                    return ctx
-            return None
-        best_match = find_best_match(context_results, normalized_query)
-        if best_match:
-            top_circular = best_match
-        elif context_results:
-            top_circular = context_results[0]
-        if (not top_circular or not (normalized_query in (top_circular.get('title', '').lower() + ' ' + top_circular.get('text', '').lower()))):
-            try:
-                with open(os.path.join(DATA_DIR, 'circular.json'), 'r', encoding='utf-8') as f:
-                    all_circulars = json.load(f)
-                for circ in all_circulars:
-                    title = circ.get('title', '').lower()
-                    text = circ.get('body', '').lower() if circ.get('body') else ''
-                    if normalized_query in title or normalized_query in text:
-                        print(f"[DEBUG] Fallback JSON match: nid={circ.get('nid')}, title={circ.get('title')}, file={circ.get('file')}")
-                        top_circular = {
-                            'nid': circ.get('nid'),
-                            'title': circ.get('title'),
-                            'text': circ.get('body', ''),
-                            'link': circ.get('file') or circ.get('url') or circ.get('link'),
-                            'display_date': circ.get('display_date'),
-                            'content_type': 'circular',
-                            'raw_metadata': circ
-                        }
-                        break
-            except Exception as e:
-                print(f"[DEBUG] Fallback JSON search failed: {e}")
+        top_k = SEARCH_TOP_K if filters.is_empty() else FILTERED_TOP_K
+        context_results = await search_context_async(normalized_query, top_k=top_k, filters=filters)
+        if not context_results and not filters.is_empty():
+            # Nothing matches (or the index predates the filter fields): drop the
+            # narrowest hints first and keep the content type as long as possible
+            for looser in filters.relaxed():
+                logger.debug("No results with query filters %s, retrying with %s", filters.describe(), looser.describe())
+                filters = looser
+                top_k = SEARCH_TOP_K if filters.is_empty() else FILTERED_TOP_K
+                context_results = await search_context_async(normalized_query, top_k=top_k, filters=filters)
+                if context_results:
+                    break
+        if logger.isEnabledFor(logging.DEBUG):
+            for i, ctx in enumerate(context_results):
+                logger.debug("Result %d: nid=%s, title=%s, link=%s", i + 1, ctx.get('nid'), ctx.get('title'), ctx.get('link'))
+        with span('keyword_search'):
+            keyword_index = get_keyword_index()
+            keyword_hits = keyword_index.search(user_query, top_k=SEARCH_TOP_K, content_type=filters.content_type)
+            if filters.department or filters.date_from is not None or filters.date_to is not None:
+                keyword_hits = filter_keyword_hits(keyword_hits, filters, catalog)
+        with span('catalog_lookup'):
+            top_circular = select_top_document(user_query, context_results, keyword_hits, keyword_index, catalog)
+
+    return {
+        'user_query': user_query,
+        'normalized_query': normalized_query,
+        'lang': lang,
+        'history': history,
+        'history_summary': history_summary,
+        'session': session,
+        'is_latest_query': is_latest_query,
+        'filters': filters,
+        'top_circular': top_circular,
+        'context_results': context_results,
+        'catalog': catalog,
+    }
 
+async def lookup_cached_answer(turn):
+    """Check the response cache for a turn with a linked document; records the key for a later set()."""
+    top_circular = turn['top_circular']
+    normalized_query = turn['normalized_query']
+    turn['changed'] = circular_changed(top_circular, turn['catalog'])
+    turn['cache_key'] = response_cache.make_key(normalized_query, top_circular.get('nid'), turn['lang'], turn['history'],
+                                                turn.get('history_summary', ''))
+    turn['query_embedding'] = None
+    with span('response_cache'):
+        cached_answer = response_cache.get(turn['cache_key'], turn['changed'])
+    turn['response_cache'] = 'hit' if cached_answer is not None else 'miss'
+    if cached_answer is None and response_cache.semantic_threshold:
+        with span('embedding'):
+            query_embedding = embedding_cache.get_cached(normalized_query)
+            if query_embedding is None:
+                query_embedding = await run_cpu(embedding_cache.get, normalized_query, check_memory=False, timeout=EMBED_TIMEOUT)
+        turn['query_embedding'] = query_embedding
+        with span('response_cache'):
+            cached_answer = response_cache.get_semantic(turn['cache_key'], query_embedding, turn['changed'])
+        if cached_answer is not None:
+            turn['response_cache'] = 'semantic_hit'
+    if cached_answer is not None:
+        logger.debug("Response cache %s for nid=%s", turn['response_cache'], top_circular.get('nid'))
+    return cached_answer
+
+def store_answer(turn, answer):
+    response_cache.set(turn['cache_key'], answer, turn['changed'], turn['query_embedding'])
+
+def build_answer_prompt(turn):
+    # Compose a prompt for Gemini
+    top_circular = turn['top_circular']
+    history = turn['history']
+    prompt = f"User question: {turn['user_query']}\n\n"
+    prompt += f"Relevant circular:\nTitle: {top_circular.get('title', '')}\n"
+    if top_circular.get('display_date'):
+        prompt += f"Date: {top_circular.get('display_date')}\n"
+    prompt += f"PDF Link: {top_circular['link']}\n"
+    if top_circular.get('text'):
+        prompt += f"Text: {top_circular.get('text', '')[:500]}\n"
+    if history or turn.get('history_summary'):
+        prompt += "\nConversation history (for context):\n"
+        if turn.get('history_summary'):
+            prompt += f"Earlier: {turn['history_summary']}\n"
+        # Already cut to the HISTORY_TOKEN_BUDGET by session_store.compact_history
+        for past in history:
+            role = past.get('role', 'user')
+            content = past.get('content', '')
+            prompt += f"{role.capitalize()}: {content}\n"
+    prompt += "\nPlease answer the user's question in a natural, helpful, and concise way, using the circular information above. If the user asks for a link, provide it as [PDF](link)."
+    return prompt
+
+def fallback_answer(turn):
+    top_circular = turn['top_circular']
+    answer = f"Yes, there is a recent circular titled '{top_circular.get('title', 'the requested circular')}'. Here is the link: [PDF]({top_circular['link']})"
+    if turn['is_latest_query'] and top_circular.get('display_date'):
+        answer += f" It was published on {top_circular.get('display_date')}."
+    return answer
+
+def release_after(lease, fn):
+    """fn wrapped to release the Gemini slot lease when it returns in its thread."""
+    def call(*args):
+        try:
+            return fn(*args)
+        finally:
+            lease.release()
+    return call
+
+async def call_gemini(prompt):
+    """
+    generate_gemini_response under the cross-worker Gemini limit. The slot is
+    awaited on the event loop, so queued calls hold no pool thread, and it is
+    released when the call really ends: a call that times out here keeps its
+    slot until its thread finishes.
+    """
+    lease = await acquire_gemini_slot()
+    if lease is None:
+        return await run_io(generate_gemini_response, prompt, timeout=GEMINI_TIMEOUT)
+    future = get_io_executor().submit(release_after(lease, generate_gemini_response), prompt)
+    # Cancelled before a thread picked it up: nothing will run to release the slot
+    future.add_done_callback(lambda f: f.cancelled() and lease.release())
+    return await asyncio.wait_for(asyncio.wrap_future(future), GEMINI_TIMEOUT)
+
+def leased_stream(lease, gen_fn):
+    """gen_fn wrapped to release the lease once the stream ends or is closed."""
+    def stream(*args):
+        try:
+            yield from gen_fn(*args)
+        finally:
+            lease.release()
+    return stream
+
+async def generate_answer(turn):
+    """Gemini answer for a turn with a linked document, link-rewritten and stored in the response cache."""
+    top_circular = turn['top_circular']
+    with span('prompt_build'):
+        prompt = build_answer_prompt(turn)
+    with span('gemini'):
+        answer = await call_gemini(prompt)
+    # Post-process: replace raw link with [PDF](link) if present
+    if top_circular['link']:
+        answer = rewrite_pdf_links(answer, top_circular['link'])
+    store_answer(turn, answer)
+    return answer
+
+NO_LINK_ANSWER = "Sorry, a PDF link for the relevant circular is not available."
+
+def chat_response(turn, answer, direct_answer):
+    response = {
+        "answer": answer,
+        "language": turn['lang'],
+        "direct_answer": direct_answer,
+        "circular_metadata": turn['top_circular'],
+        "context_results": turn['context_results'][:3] if turn['context_results'] else [],
+        "filters": turn['filters'].describe() if turn.get('filters') else {},
+        "response_cache": turn.get('response_cache')
+    }
+    if turn.get('session') is not None:
+        response["session_id"] = turn['session']['id']
+    if turn.get('timer') is not None:
+        response["timings"] = turn['timer'].breakdown_ms()
+    return response
+
+async def answer_turn(turn, limiter=None):
+    """(answer, direct_answer) for a retrieved turn: cached, generated by Gemini, or a fallback."""
+    top_circular = turn['top_circular']
     # Use Gemini for dynamic, context-aware answer if a circular is found
-    if top_circular and top_circular.get('link'):
-        # Compose a prompt for Gemini
-        prompt = f"User question: {user_query}\n\n"
-        prompt += f"Relevant circular:\nTitle: {top_circular.get('title', '')}\n"
-        if top_circular.get('display_date'):
-            prompt += f"Date: {top_circular.get('display_date')}\n"
-        prompt += f"PDF Link: {top_circular['link']}\n"
-        if top_circular.get('text'):
-            prompt += f"Text: {top_circular.get('text', '')[:500]}\n"
-        if history:
-            prompt += "\nConversation history (for context):\n"
-            for turn in history[-6:]:
-                role = turn.get('role', 'user')
-                content = turn.get('content', '')
-                prompt += f"{role.capitalize()}: {content}\n"
-        prompt += "\nPlease answer the user's question in a natural, helpful, and concise way, using the circular information above. If the user asks for a link, provide it as [PDF](link)."
+    if not (top_circular and top_circular.get('link')):
+        return NO_LINK_ANSWER, NO_LINK_ANSWER
+    cached_answer = await lookup_cached_answer(turn)
+    if cached_answer is not None:
+        return cached_answer, cached_answer.strip()
+    try:
+        # Same normalized query, document, language and history: one Gemini call
+        key = (turn['cache_key'], turn['changed'])
+        if limiter is None:
+            answer = await generation_flight.do(key, lambda: generate_answer(turn))
+        else:
+            async with limiter:
+                answer = await generation_flight.do(key, lambda: generate_answer(turn))
+        return answer, answer.strip()
+    except Exception as e:
+        logger.warning("Gemini failed: %s", e)
+        answer = fallback_answer(turn)
+        return answer, answer
+
+@app.post('/chat')
+async def chat(request: ChatRequest):
+    timer = start_request('chat')
+    try:
+        turn = await retrieve(request)
+        answer, direct_answer = await answer_turn(turn)
+        await save_exchange(turn, answer)
+    finally:
+        finish_request(timer, logger)
+
+    if request.timings:
+        turn['timer'] = timer
+    return chat_response(turn, answer, direct_answer)
+
+@app.post('/chat/batch')
+async def chat_batch(request: ChatBatchRequest):
+    """
+    Answer up to BATCH_MAX_ITEMS queries in one call.
+
+    Query embeddings not already cached are computed in one batched encode,
+    retrieval (and its vector searches) runs for all items concurrently, and
+    at most BATCH_GENERATION_CONCURRENCY Gemini calls run at once. Results
+    come back in input order, each with its `index`; an item that fails
+    carries an `error` instead of the /chat fields.
+    """
+    if len(request.items) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"At most {BATCH_MAX_ITEMS} items per batch")
+    timer = start_request('chat_batch')
+    try:
+        queries = [normalize_query(item.query.strip()) for item in request.items]
         try:
-            answer = generate_gemini_response(prompt)
-            # Post-process: replace raw link with [PDF](link) if present
-            pdf_link = top_circular['link']
-            if pdf_link:
-                # Remove any malformed or double-encoded links
-                import re as _re
-                # Replace any [PDF](...) or (https...) or raw links with correct Markdown
-                answer = _re.sub(r"\[PDF\]\([^)]*\)", "", answer)  # Remove any existing [PDF](...)
-                answer = _re.sub(r"https?://\S+", "[PDF](%s)" % pdf_link, answer)
-                # Ensure only one [PDF](...) in the answer
-                if f"[PDF]({pdf_link})" not in answer:
-                    answer = answer.strip() + f" [PDF]({pdf_link})"
-            direct_answer = answer.strip()
+            with span('embedding'):
+                await run_cpu(embedding_cache.get_many, queries, timeout=EMBED_TIMEOUT)
         except Exception as e:
-            print(f"[DEBUG] Gemini failed: {e}")
-            answer = f"Yes, there is a recent circular titled '{top_circular.get('title', 'the requested circular')}'. Here is the link: [PDF]({top_circular['link']})"
-            if is_latest_query and top_circular.get('display_date'):
-                answer += f" It was published on {top_circular.get('display_date')}."
-            direct_answer = answer
-    else:
-        direct_answer = "Sorry, a PDF link for the relevant circular is not available."
-        answer = direct_answer
+            # Items fall back to encoding their own query during retrieval
+            logger.warning("Batched query encoding failed: %s", e)
+        limiter = asyncio.Semaphore(BATCH_GENERATION_CONCURRENCY)
+
+        async def answer_item(item):
+            turn = await retrieve(item)
+            answer, direct_answer = await answer_turn(turn, limiter)
+            await save_exchange(turn, answer)
+            return chat_response(turn, answer, direct_answer)
+
+        outcomes = await asyncio.gather(*(answer_item(item) for item in request.items), return_exceptions=True)
+    finally:
+        finish_request(timer, logger)
+
+    results = []
+    for index, outcome in enumerate(outcomes):
+        if isinstance(outcome, BaseException):
+            logger.warning("Batch item %d failed: %r", index, outcome)
+            results.append({"index": index, "error": str(outcome) or type(outcome).__name__})
+        else:
+            results.append({"index": index, **outcome})
+    response = {"results": results}
+    if request.timings:
+        response["timings"] = timer.breakdown_ms()
+    return response
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@app.post('/chat/stream')
+async def chat_stream(request: ChatRequest):
+    """
+    Server-Sent Events version of /chat.
 
+    Emits `meta` (language, circular_metadata, context_results, session_id) as soon as
+    retrieval finishes, then `token` events with link-rewritten answer text,
+    then `done` with the same fields /chat returns.
+    """
+    timer = start_request('chat_stream')
+    try:
+        turn = await retrieve(request)
+    except BaseException:
+        finish_request(timer, logger)
+        raise
+    if request.timings:
+        turn['timer'] = timer
+
+    async def events():
+        # The body is iterated outside the endpoint's context
+        set_current_timer(timer)
+        try:
+            async for event in answer_events(turn):
+                yield event
+        finally:
+            finish_request(timer, logger)
+
+    return StreamingResponse(events(), media_type='text/event-stream', headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+async def done_event(turn, answer, direct_answer):
+    await save_exchange(turn, answer)
+    return sse_event('done', chat_response(turn, answer, direct_answer))
+
+async def answer_events(turn):
+    top_circular = turn['top_circular']
+    meta = chat_response(turn, None, None)
+    yield sse_event('meta', {k: meta[k] for k in ('language', 'circular_metadata', 'context_results', 'session_id') if k in meta})
+    if not (top_circular and top_circular.get('link')):
+        yield sse_event('token', {'text': NO_LINK_ANSWER})
+        yield await done_event(turn, NO_LINK_ANSWER, NO_LINK_ANSWER)
+        return
+    cached_answer = await lookup_cached_answer(turn)
+    if cached_answer is not None:
+        yield sse_event('token', {'text': cached_answer})
+        yield await done_event(turn, cached_answer, cached_answer.strip())
+        return
+    rewriter = PdfLinkRewriter(top_circular['link'])
+    with span('prompt_build'):
+        prompt = build_answer_prompt(turn)
+    started = time.perf_counter()
+    first_token = True
+    try:
+        lease = await acquire_gemini_slot()
+        stream = stream_gemini_response if lease is None else leased_stream(lease, stream_gemini_response)
+        async for chunk in iterate_in_thread(stream, prompt, timeout=GEMINI_TIMEOUT):
+            if first_token:
+                record_stage('gemini_first_token', time.perf_counter() - started)
+                first_token = False
+            text = rewriter.feed(chunk)
+            if text:
+                yield sse_event('token', {'text': text})
+    except Exception as e:
+        record_stage('gemini', time.perf_counter() - started)
+        logger.warning("Gemini stream failed: %s", e)
+        if not rewriter.emitted:
+            answer = fallback_answer(turn)
+            yield sse_event('token', {'text': answer})
+            yield await done_event(turn, answer, answer)
+            return
+        # Keep what was streamed and still finish with the PDF link
+        tail = rewriter.finish()
+        yield sse_event('token', {'text': tail})
+        yield await done_event(turn, rewriter.emitted, rewriter.emitted.strip())
+        return
+    record_stage('gemini', time.perf_counter() - started)
+    tail = rewriter.finish()
+    if tail:
+        yield sse_event('token', {'text': tail})
+    answer = rewriter.emitted
+    store_answer(turn, answer)
+    yield await done_event(turn, answer, answer.strip())
+
+@app.get('/metrics')
+async def metrics():
+    """Prometheus text exposition of the stage and request latency histograms."""
+    return PlainTextResponse(render_metrics(), media_type='text/plain; version=0.0.4')
+
+@app.get('/stats')
+async def stats():
     return {
-        "answer": answer,
-        "language": lang,
-        "direct_answer": direct_answer,
-        "circular_metadata": top_circular,
-        "context_results": context_results[:3] if context_results else []
+        "pid": os.getpid(),  # the worker that answered, under serve.py
+        "embedding_cache": embedding_cache.stats(),
+        "response_cache": response_cache.stats(),
+        "coalescing": {"search": search_flight.stats(), "generation": generation_flight.stats()},
+        "sessions": get_session_store().stats(),
+        "gemini": gemini_stats(),
     }
 
 if __name__ == "__main__":
@@ -1,5 +1,6 @@
 import streamlit as st
 import requests
+import json
 
 st.set_page_config(page_title="PMC Chatbot", page_icon="🤖")
 st.title("PMC AI-Powered Chatbot")
@@ -8,11 +9,27 @@ Ask your questions about the PMC website in English or Marathi. The bot will ans
 """)
 
 API_URL = "http://localhost:8000/chat"
+STREAM_URL = "http://localhost:8000/chat/stream"
+
+def iter_sse(response):
+    """Yield (event, data) pairs from a text/event-stream response."""
+    event, data_lines = 'message', []
+    for line in response.iter_lines(decode_unicode=True):
+        if line is None:
+            continue
+        if line == '':
+            if data_lines:
+                yield event, json.loads('\n'.join(data_lines))
+            event, data_lines = 'message', []
+        elif line.startswith('event:'):
+            event = line[len('event:'):].strip()
+        elif line.startswith('data:'):
+            data_lines.append(line[len('data:'):].strip())
 
 if 'history' not in st.session_state:
     st.session_state['history'] = []
-if 'last_circular_id' not in st.session_state:
-    st.session_state['last_circular_id'] = None
+if 'session_id' not in st.session_state:
+    st.session_state['session_id'] = None
 if 'last_circular_metadata' not in st.session_state:
     st.session_state['last_circular_metadata'] = None
 
@@ -21,32 +38,43 @@ with st.form(key='chat_form'):
     submit = st.form_submit_button("Ask")
 
 if submit and user_query.strip():
-    with st.spinner("Thinking..."):
-        try:
-            # Prepare conversation history for backend (user/bot turns)
-            history_payload = []
-            for q, a, lang, direct_answer, circular_metadata in st.session_state['history']:
-                history_payload.append({"role": "user", "content": q})
-                history_payload.append({"role": "assistant", "content": a})
-            payload = {"query": user_query.strip(), "history": history_payload}
-            if st.session_state['last_circular_id']:
-                payload["last_circular_id"] = st.session_state['last_circular_id']
-            response = requests.post(API_URL, json=payload)
+    live = st.empty()
+    try:
+        # The server keeps the conversation history and last circular under the session id
+        payload = {"query": user_query.strip()}
+        if st.session_state['session_id']:
+            payload["session_id"] = st.session_state['session_id']
+        else:
+            payload["session"] = True
+        live.markdown("_Thinking..._")
+        # Stream the answer: render tokens as they arrive instead of waiting for the full text
+        with requests.post(STREAM_URL, json=payload, stream=True) as response:
             if response.status_code == 200:
-                data = response.json()
+                streamed = ''
+                data = None
+                for event, event_data in iter_sse(response):
+                    if event == 'token':
+                        streamed += event_data.get('text', '')
+                        live.markdown(f"**Bot:** {streamed}▌")
+                    elif event in ('meta', 'done'):
+                        if event_data.get('session_id'):
+                            st.session_state['session_id'] = event_data['session_id']
+                        if event == 'done':
+                            data = event_data
+                if data is None:
+                    data = {'answer': streamed}
                 answer = data.get('answer', '')
                 lang = data.get('language', 'en')
                 direct_answer = data.get('direct_answer', None)
                 circular_metadata = data.get('circular_metadata', None)
-                # Store last matched circular for follow-up context
                 if circular_metadata and circular_metadata.get('nid'):
-                    st.session_state['last_circular_id'] = circular_metadata['nid']
                     st.session_state['last_circular_metadata'] = circular_metadata
                 st.session_state['history'].append((user_query, answer, lang, direct_answer, circular_metadata))
             else:
                 st.error(f"Error: {response.status_code} - {response.text}")
-        except Exception as e:
-            st.error(f"Failed to connect to backend: {e}")
+    except Exception as e:
+        st.error(f"Failed to connect to backend: {e}")
+    live.empty()
 
 # Remove 'You', 'Direct Answer', and 'PDF' from conversation history, only show 'Bot' answer
 st.markdown("---")
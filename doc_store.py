@@ -0,0 +1,238 @@
+import os
+import sys
+import json
+import sqlite3
+import threading
+
+DATA_DIR = 'data'
+DOC_STORE_PATH = os.path.join(DATA_DIR, 'documents.sqlite3')
+
+# Columns every node gets regardless of the import; anything else is only
+# created if at least one imported record has a non-null value for it.
+CORE_COLUMNS = ['title', 'display_date', 'changed']
+
+
+class DocumentStore:
+    """
+    SQLite store for Drupal nodes with random access by (content_type, nid).
+
+    The importer looks at which fields are ever non-null and creates columns
+    only for those; fields that were null in every record are not stored but
+    remembered (with their order) in the `fields` table, so exported records
+    have the same keys as the original JSON. Fields first seen after the
+    import go into a JSON `extra` column.
+    """
+
+    def __init__(self, path=DOC_STORE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS fields (content_type TEXT, name TEXT, position INTEGER, '
+            'PRIMARY KEY (content_type, name))'
+        )
+        self._conn.commit()
+        self._load_schema()
+
+    def _load_schema(self):
+        info = self._conn.execute("PRAGMA table_info('documents')").fetchall()
+        self.columns = [row['name'] for row in info if row['name'] not in ('content_type', 'nid', 'seq', 'extra')]
+        self.fields = {}
+        for row in self._conn.execute('SELECT content_type, name FROM fields ORDER BY content_type, position'):
+            self.fields.setdefault(row['content_type'], []).append(row['name'])
+        self._layouts = {}
+
+    def _create_documents_table(self, columns):
+        cols = ''.join(f', "{c}" TEXT' for c in columns)
+        self._conn.execute(
+            f'CREATE TABLE documents (content_type TEXT NOT NULL, nid TEXT NOT NULL, seq INTEGER{cols}, '
+            f'extra TEXT, PRIMARY KEY (content_type, nid)) WITHOUT ROWID'
+        )
+
+    # Import / export
+
+    def import_records(self, records_by_type):
+        """Replace the whole store with {content_type: [records]} and derive the schema from them."""
+        non_null = []
+        for records in records_by_type.values():
+            for item in records:
+                for key, value in item.items():
+                    if value is not None and key not in non_null and key not in ('nid', 'id'):
+                        non_null.append(key)
+        columns = CORE_COLUMNS + [k for k in non_null if k not in CORE_COLUMNS]
+        with self._lock:
+            self._conn.execute('DROP TABLE IF EXISTS documents')
+            self._conn.execute('DELETE FROM fields')
+            self._create_documents_table(columns)
+            for content_type, records in records_by_type.items():
+                names = []
+                for item in records:
+                    for key in item:
+                        if key not in names:
+                            names.append(key)
+                self._conn.executemany(
+                    'INSERT INTO fields (content_type, name, position) VALUES (?, ?, ?)',
+                    [(content_type, name, i) for i, name in enumerate(names)],
+                )
+            self._conn.commit()
+            self._load_schema()
+        for content_type, records in records_by_type.items():
+            self.upsert(content_type, records)
+        with self._lock:
+            self._conn.execute('VACUUM')
+
+    def export_json(self, content_type, path):
+        records = self.records(content_type)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(records, f, ensure_ascii=False, indent=2)
+        return len(records)
+
+    # Writes
+
+    def upsert(self, content_type, records):
+        records = [r for r in records if isinstance(r, dict)]
+        if not records:
+            return 0
+        if not self.columns:
+            self._create_documents_table(CORE_COLUMNS)
+            self._load_schema()
+        names = ['content_type', 'nid', 'seq'] + self.columns + ['extra']
+        placeholders = ', '.join('?' for _ in names)
+        quoted = ', '.join(f'"{n}"' for n in names)
+        known = set(self.columns) | {'nid', 'id'}
+        with self._lock:
+            next_seq = self._conn.execute(
+                'SELECT COALESCE(MAX(seq), -1) + 1 FROM documents WHERE content_type = ?', (content_type,)
+            ).fetchone()[0]
+            rows = []
+            for item in records:
+                nid = str(item.get('nid', item.get('id', 'unknown')))
+                existing = self._conn.execute(
+                    'SELECT seq FROM documents WHERE content_type = ? AND nid = ?', (content_type, nid)
+                ).fetchone()
+                if existing is not None:
+                    seq = existing['seq']
+                else:
+                    seq, next_seq = next_seq, next_seq + 1
+                extra = {k: v for k, v in item.items() if k not in known and v is not None}
+                rows.append([content_type, nid, seq]
+                            + [_to_column(item.get(c)) for c in self.columns]
+                            + [json.dumps(extra, ensure_ascii=False) if extra else None])
+            self._conn.executemany(f'INSERT OR REPLACE INTO documents ({quoted}) VALUES ({placeholders})', rows)
+            self._conn.commit()
+        return len(rows)
+
+    def delete(self, content_type, nids):
+        nids = [str(n) for n in nids]
+        if not nids or not self.columns:
+            return 0
+        with self._lock:
+            self._conn.executemany('DELETE FROM documents WHERE content_type = ? AND nid = ?',
+                                   [(content_type, nid) for nid in nids])
+            self._conn.commit()
+        return len(nids)
+
+    # Reads
+
+    def _select(self):
+        return 'SELECT nid, extra' + ''.join(f', "{c}"' for c in self.columns) + ' FROM documents'
+
+    def _layout(self, content_type):
+        # Row positions of the record's keys, in order: the imported fields
+        # (None for ones without a column), then nid and any columns they lack
+        layout = self._layouts.get(content_type)
+        if layout is None:
+            positions = {'nid': 0}
+            positions.update((column, i + 2) for i, column in enumerate(self.columns))
+            fields = self.fields.get(content_type, [])
+            layout = ([(name, positions.get(name)) for name in fields],
+                      [(name, i) for name, i in positions.items() if name not in fields])
+            self._layouts[content_type] = layout
+        return layout
+
+    def _to_record(self, content_type, row):
+        # row is (nid, extra, *columns)
+        if not row[1]:
+            ordered, rest = self._layout(content_type)
+            record = {name: None if i is None or row[i] is None else _from_column(row[i]) for name, i in ordered}
+            for name, i in rest:
+                if row[i] is not None:
+                    record[name] = _from_column(row[i])
+            return record
+        values = {'nid': row[0]}
+        for column, value in zip(self.columns, row[2:]):
+            if value is not None:
+                values[column] = _from_column(value)
+        if row[1]:
+            values.update(json.loads(row[1]))
+        # Restore the original key order, with dropped fields back as nulls
+        ordered = {name: values.pop(name, None) for name in self.fields.get(content_type, [])}
+        ordered.update(values)
+        return ordered
+
+    def get(self, content_type, nid):
+        if not self.columns:
+            return None
+        with self._lock:
+            row = self._conn.execute(self._select() + ' WHERE content_type = ? AND nid = ?',
+                                     (content_type, str(nid))).fetchone()
+        return self._to_record(content_type, tuple(row)) if row is not None else None
+
+    def records(self, content_type):
+        if not self.columns:
+            return []
+        with self._lock:
+            cursor = self._conn.execute(self._select() + ' WHERE content_type = ? ORDER BY seq', (content_type,))
+            cursor.row_factory = None
+            rows = cursor.fetchall()
+        return [self._to_record(content_type, row) for row in rows]
+
+    def content_types(self):
+        if not self.columns:
+            return []
+        with self._lock:
+            return [row[0] for row in self._conn.execute('SELECT DISTINCT content_type FROM documents')]
+
+    def close(self):
+        self._conn.close()
+
+
+def _to_column(value):
+    # Nested values (lists/dicts) are kept as JSON text
+    if isinstance(value, (dict, list)):
+        return '\x00json:' + json.dumps(value, ensure_ascii=False)
+    return value
+
+
+def _from_column(value):
+    if isinstance(value, str) and value.startswith('\x00json:'):
+        return json.loads(value[len('\x00json:'):])
+    return value
+
+
+def import_from_json(data_dir=DATA_DIR, content_types=None, path=DOC_STORE_PATH):
+    """Load data/<type>.json (plus any change journal) into the SQLite store."""
+    from catalog import load_json_records, CATALOG_CONTENT_TYPES
+    content_types = content_types or CATALOG_CONTENT_TYPES
+    store = DocumentStore(path)
+    store.import_records({ct: load_json_records(data_dir, ct) for ct in content_types})
+    return store
+
+
+if __name__ == "__main__":
+    # python doc_store.py import   -> data/*.json into data/documents.sqlite3
+    # python doc_store.py export   -> data/documents.sqlite3 back into data/*.json
+    command = sys.argv[1] if len(sys.argv) > 1 else 'import'
+    if command == 'import':
+        store = import_from_json()
+        for ct in store.content_types():
+            print(f"Imported {len(store.records(ct))} {ct} records into {store.path}")
+        print(f"Stored columns: {', '.join(store.columns)}")
+    elif command == 'export':
+        store = DocumentStore()
+        for ct in store.content_types():
+            path = os.path.join(DATA_DIR, f"{ct}.json")
+            print(f"Exported {store.export_json(ct, path)} {ct} records to {path}")
+    else:
+        print(f"Unknown command: {command}")
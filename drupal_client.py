@@ -0,0 +1,222 @@
+import os
+import json
+import time
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
+
+# Listing API root; point it at stub_drupal_server.py for offline runs
+DRUPAL_API_BASE = os.getenv('DRUPAL_API_BASE', 'https://webadmin.pmc.gov.in/api/listing-api')
+PAGE_SIZE = int(os.getenv('DRUPAL_PAGE_SIZE', '1000'))
+# Cap on in-flight HTTP requests across all content types
+MAX_CONCURRENCY = int(os.getenv('DRUPAL_MAX_CONCURRENCY', '4'))
+MAX_RETRIES = int(os.getenv('DRUPAL_MAX_RETRIES', '5'))
+BACKOFF_BASE = float(os.getenv('DRUPAL_BACKOFF_BASE', '0.5'))  # seconds, doubled per retry
+BACKOFF_MAX = 30.0
+REQUEST_TIMEOUT = float(os.getenv('DRUPAL_TIMEOUT', '30'))
+# Safety stop for a listing that never returns a short page
+MAX_PAGES = 200
+RETRY_STATUS = {429, 500, 502, 503, 504}
+VALIDATORS_FILE = 'http_validators.json'
+
+
+def node_nid(node):
+    return str(node.get('nid', node.get('id', 'unknown')))
+
+
+def merge_pages(pages):
+    """
+    Nodes and 304-page nids of a listing walk, each nid once. Pages are
+    fetched concurrently while the listing can change, so a node pushed
+    across a page boundary may turn up twice; the last-seen copy wins, and
+    a nid with a fetched copy is not also reported as unchanged.
+    """
+    nodes = {}
+    others = []
+    for page in pages:
+        for node in page.nodes:
+            if isinstance(node, dict):
+                nodes[node_nid(node)] = node
+            else:
+                others.append(node)
+    unchanged = dict.fromkeys(str(nid) for page in pages for nid in page.unchanged_nids if str(nid) not in nodes)
+    return list(nodes.values()) + others, list(unchanged)
+
+
+class Page:
+    """One listing page. A 304 page has no nodes, only the nids it held last time."""
+
+    def __init__(self, nodes, unchanged_nids=None):
+        self.nodes = nodes
+        self.unchanged_nids = unchanged_nids or []
+        self.not_modified = unchanged_nids is not None
+
+    def __len__(self):
+        return len(self.unchanged_nids) if self.not_modified else len(self.nodes)
+
+
+class Listing:
+    """Result of walking every page of one content type."""
+
+    def __init__(self, content_type, nodes, unchanged_nids=(), complete=True, not_modified=False, pages=0):
+        self.content_type = content_type
+        self.nodes = nodes
+        self.unchanged_nids = list(unchanged_nids)
+        self.complete = complete
+        self.not_modified = not_modified
+        self.pages = pages
+
+
+class DrupalClient:
+    """
+    Pooled, rate-limited client for webadmin.pmc.gov.in/api/listing-api/{content_type}.
+
+    Pages are walked until a short or empty page, several at a time, with at
+    most `max_concurrency` requests in flight over one keep-alive session.
+    429/5xx responses and connection errors are retried with exponential
+    backoff (honouring Retry-After). Pages are requested conditionally with
+    the ETag/Last-Modified from the previous run; for a 304 page the nids it
+    held last time are reported so the caller can still detect deletions.
+    Call save_validators() only after the fetched data has been stored.
+    """
+
+    def __init__(self, base_url=DRUPAL_API_BASE, page_size=PAGE_SIZE, max_concurrency=MAX_CONCURRENCY,
+                 max_retries=MAX_RETRIES, backoff_base=BACKOFF_BASE, validators_path=None, verify=False):
+        self.base_url = base_url.rstrip('/')
+        self.page_size = page_size
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.verify = verify
+        self.validators_path = validators_path
+        self.validators = self._load_validators()
+        self.requests_made = 0
+        self.retries = 0
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._lock = threading.Lock()
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=max_concurrency, pool_maxsize=max_concurrency)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self._pages = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix='drupal-page')
+
+    # Conditional request validators
+
+    def _load_validators(self):
+        if not self.validators_path or not os.path.exists(self.validators_path):
+            return {}
+        with open(self.validators_path, 'r', encoding='utf-8') as f:
+            try:
+                return json.load(f)
+            except Exception:
+                return {}
+
+    def save_validators(self):
+        if not self.validators_path:
+            return
+        with self._lock:
+            validators = dict(self.validators)
+        with open(self.validators_path, 'w', encoding='utf-8') as f:
+            json.dump(validators, f, indent=2)
+
+    # HTTP
+
+    def url_for(self, content_type, page_no):
+        return (f"{self.base_url}/{content_type}?&page_no={page_no}&limit={self.page_size}"
+                f"&lang=en&vocabulary=department")
+
+    def _backoff(self, attempt, response=None):
+        retry_after = response.headers.get('Retry-After') if response is not None else None
+        if retry_after:
+            try:
+                return min(float(retry_after), BACKOFF_MAX)
+            except ValueError:
+                pass
+        delay = min(self.backoff_base * (2 ** attempt), BACKOFF_MAX)
+        return delay * (0.5 + random.random() / 2)
+
+    def get(self, url, headers=None):
+        """GET with retry on 429/5xx and connection errors; returns the final response."""
+        for attempt in range(self.max_retries + 1):
+            response = None
+            try:
+                with self._slots:
+                    with self._lock:
+                        self.requests_made += 1
+                    response = self.session.get(url, headers=headers, verify=self.verify, timeout=REQUEST_TIMEOUT)
+                if response.status_code not in RETRY_STATUS:
+                    response.raise_for_status()
+                    return response
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt == self.max_retries:
+                    raise
+            if attempt == self.max_retries:
+                response.raise_for_status()
+            with self._lock:
+                self.retries += 1
+            time.sleep(self._backoff(attempt, response))
+
+    def fetch_page(self, content_type, page_no, conditional=True):
+        url = self.url_for(content_type, page_no)
+        headers = {}
+        cached = self.validators.get(url, {}) if conditional else {}
+        if cached.get('etag'):
+            headers['If-None-Match'] = cached['etag']
+        if cached.get('last_modified'):
+            headers['If-Modified-Since'] = cached['last_modified']
+        response = self.get(url, headers=headers)
+        if response.status_code == 304:
+            return Page([], unchanged_nids=cached.get('nids', []))
+        nodes = response.json().get('data', {}).get('nodes', []) or []
+        validator = {}
+        if response.headers.get('ETag'):
+            validator['etag'] = response.headers['ETag']
+        if response.headers.get('Last-Modified'):
+            validator['last_modified'] = response.headers['Last-Modified']
+        with self._lock:
+            if validator:
+                validator['nids'] = [node_nid(n) for n in nodes if isinstance(n, dict)]
+                self.validators[url] = validator
+            else:
+                self.validators.pop(url, None)
+        return Page(nodes)
+
+    # Listings
+
+    def fetch_listing(self, content_type, conditional=True):
+        """Walk all pages of a content type, `max_concurrency` pages per wave."""
+        first = self.fetch_page(content_type, 1, conditional=conditional)
+        pages = [first]
+        done = len(first) < self.page_size
+        next_page = 2
+        while not done and next_page <= MAX_PAGES:
+            wave = list(range(next_page, min(next_page + self.max_concurrency, MAX_PAGES + 1)))
+            for page in self._pages.map(lambda page_no: self.fetch_page(content_type, page_no, conditional), wave):
+                pages.append(page)
+                if len(page) < self.page_size:
+                    done = True
+                    break
+            next_page = wave[-1] + 1
+        nodes, unchanged_nids = merge_pages(pages)
+        return Listing(
+            content_type,
+            nodes,
+            unchanged_nids=unchanged_nids,
+            complete=done,
+            not_modified=all(page.not_modified for page in pages),
+            pages=len(pages),
+        )
+
+    def fetch_many(self, content_types, conditional=True):
+        """Fetch several content types concurrently; returns {content_type: Listing}."""
+        with ThreadPoolExecutor(max_workers=max(1, len(content_types)), thread_name_prefix='drupal-type') as pool:
+            return dict(zip(content_types, pool.map(lambda ct: self.fetch_listing(ct, conditional), content_types)))
+
+    def stats(self):
+        return {'requests': self.requests_made, 'retries': self.retries}
+
+    def close(self):
+        self._pages.shutdown(wait=False)
+        self.session.close()
@@ -0,0 +1,183 @@
+import os
+import sys
+import inspect
+import numpy as np
+from embedding_utils import configure_threads, EMBED_BATCH_SIZE, EMBED_THREADS
+
+# Query/document embedder behind fetch_and_store.get_model():
+#   'torch'     SentenceTransformer in full-precision PyTorch (the reference)
+#   'onnx'      the same model exported to ONNX, run with ONNX Runtime
+#   'onnx-int8' the ONNX export with dynamically int8-quantized weights
+# The ONNX backends need only onnxruntime, tokenizers and numpy at serve time;
+# `python embedders.py export` (which needs torch, transformers and onnx) creates them.
+EMBEDDING_BACKEND = os.getenv('EMBEDDING_BACKEND', 'torch')
+# Directory holding the exported model.onnx, model.int8.onnx and tokenizer.json
+ONNX_MODEL_DIR = os.getenv('ONNX_MODEL_DIR', os.path.join('models', 'all-MiniLM-L6-v2-onnx'))
+ONNX_FILES = {'onnx': 'model.onnx', 'onnx-int8': 'model.int8.onnx'}
+# Tokens per text; SentenceTransformer truncates all-MiniLM-L6-v2 input at 256
+MAX_SEQ_LENGTH = 256
+# Lowest per-text cosine against the torch model that `parity` accepts, per backend
+PARITY_MIN_COSINE = {'onnx': 0.999, 'onnx-int8': 0.98}
+HF_ORG = 'sentence-transformers'
+
+
+class OnnxEmbedder:
+    """
+    all-MiniLM-L6-v2 on ONNX Runtime with SentenceTransformer's pipeline:
+    WordPiece tokenization truncated to MAX_SEQ_LENGTH, mean pooling over the
+    attention mask and L2 normalisation. encode() has the SentenceTransformer
+    signature, so it drops in wherever get_model() is used.
+    """
+
+    def __init__(self, model_dir=ONNX_MODEL_DIR, model_file='model.onnx', max_length=MAX_SEQ_LENGTH, threads=EMBED_THREADS):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, 'tokenizer.json'))
+        self.tokenizer.enable_truncation(max_length)
+        self.tokenizer.enable_padding(pad_id=0, pad_token='[PAD]')
+        options = ort.SessionOptions()
+        if threads:
+            options.intra_op_num_threads = int(threads)
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(os.path.join(model_dir, model_file), options,
+                                            providers=['CPUExecutionProvider'])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+    def _encode_batch(self, texts):
+        encodings = self.tokenizer.encode_batch(texts)
+        inputs = {
+            'input_ids': np.array([e.ids for e in encodings], dtype=np.int64),
+            'attention_mask': np.array([e.attention_mask for e in encodings], dtype=np.int64),
+            'token_type_ids': np.array([e.type_ids for e in encodings], dtype=np.int64),
+        }
+        hidden = self.session.run(None, {k: v for k, v in inputs.items() if k in self.input_names})[0]
+        mask = inputs['attention_mask'][:, :, None].astype(np.float32)
+        pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        return pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+
+    def encode(self, sentences, batch_size=32, convert_to_numpy=True, show_progress_bar=False, **kwargs):
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        if not texts:
+            return np.zeros((0, self.dimension()), dtype=np.float32)
+        # Batch texts of similar length, as SentenceTransformer does, so little of each batch is padding
+        order = np.argsort([-len(text) for text in texts], kind='stable')
+        ordered = [texts[i] for i in order]
+        batches = [self._encode_batch(ordered[i:i + batch_size]) for i in range(0, len(ordered), batch_size)]
+        embeddings = np.empty((len(texts), batches[0].shape[1]), dtype=np.float32)
+        embeddings[order] = np.concatenate(batches)
+        return embeddings[0] if single else embeddings
+
+    def dimension(self):
+        return self.session.get_outputs()[0].shape[-1]
+
+
+def load_embedder(model_name, backend=EMBEDDING_BACKEND, dim=None):
+    """Embedder for `backend`; with `dim`, a model producing other-sized vectors is rejected."""
+    if backend == 'torch':
+        from sentence_transformers import SentenceTransformer
+        configure_threads()
+        model = SentenceTransformer(model_name)
+    elif backend in ONNX_FILES:
+        model = OnnxEmbedder(model_file=ONNX_FILES[backend])
+    else:
+        raise ValueError(f"Unknown EMBEDDING_BACKEND {backend!r}: expected 'torch', 'onnx' or 'onnx-int8'")
+    if dim is not None:
+        produced = len(model.encode('dimension check'))
+        if produced != dim:
+            raise ValueError(f"{backend} embedder produces {produced}-dim vectors, the index expects {dim}")
+    return model
+
+
+def export_onnx(model_name, out_dir=ONNX_MODEL_DIR, quantize=True):
+    """Export the Hugging Face transformer under `model_name` to ONNX, plus an int8 copy."""
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+    os.makedirs(out_dir, exist_ok=True)
+    repo = model_name if '/' in model_name else f"{HF_ORG}/{model_name}"
+    tokenizer = AutoTokenizer.from_pretrained(repo)
+    model = AutoModel.from_pretrained(repo).eval()
+
+    class LastHiddenState(torch.nn.Module):
+        def __init__(self, inner):
+            super().__init__()
+            self.inner = inner
+
+        def forward(self, input_ids, attention_mask, token_type_ids):
+            return self.inner(input_ids=input_ids, attention_mask=attention_mask, token_type_ids=token_type_ids)[0]
+
+    sample = tokenizer(['an export sample', 'another one'], padding=True, return_tensors='pt')
+    names = ['input_ids', 'attention_mask', 'token_type_ids']
+    fp32_path = os.path.join(out_dir, ONNX_FILES['onnx'])
+    with torch.no_grad():
+        torch.onnx.export(
+            LastHiddenState(model), tuple(sample[name] for name in names), fp32_path,
+            input_names=names, output_names=['last_hidden_state'],
+            dynamic_axes={name: {0: 'batch', 1: 'sequence'} for name in names + ['last_hidden_state']},
+            opset_version=14,
+            # The TorchScript exporter, which takes dynamic_axes; torch >= 2.9 defaults to dynamo
+            **({'dynamo': False} if 'dynamo' in inspect.signature(torch.onnx.export).parameters else {}),
+        )
+    tokenizer.save_pretrained(out_dir)  # tokenizer.json is what OnnxEmbedder reads
+    print(f"Exported {repo} to {fp32_path}")
+    if quantize:
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+        int8_path = os.path.join(out_dir, ONNX_FILES['onnx-int8'])
+        quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8)
+        print(f"Quantized to {int8_path}")
+
+
+def corpus_texts(data_dir='data'):
+    """The texts reindex embeds, one per catalog record."""
+    from catalog import load_records, CATALOG_CONTENT_TYPES
+    from fetch_and_store import vector_record
+    return [vector_record(ct, item)[1] for ct in CATALOG_CONTENT_TYPES
+            for item in load_records(data_dir, ct) if isinstance(item, dict)]
+
+
+def parity(reference, candidate, texts, queries=(), top_k=10):
+    """
+    Agreement of `candidate` with `reference`: per-text cosine of the two
+    embeddings, and for each query the overlap of the top_k corpus neighbours
+    each model retrieves.
+    """
+    ref = np.asarray(reference.encode(texts, batch_size=EMBED_BATCH_SIZE, convert_to_numpy=True), dtype=np.float32)
+    cand = np.asarray(candidate.encode(texts, batch_size=EMBED_BATCH_SIZE, convert_to_numpy=True), dtype=np.float32)
+    cosines = (ref * cand).sum(axis=1) / (np.linalg.norm(ref, axis=1) * np.linalg.norm(cand, axis=1))
+    report = {
+        'texts': len(texts),
+        'mean_cosine': round(float(cosines.mean()), 5),
+        'p1_cosine': round(float(np.percentile(cosines, 1)), 5),
+        'min_cosine': round(float(cosines.min()), 5),
+    }
+    if queries:
+        ref_q = np.asarray(reference.encode(list(queries), convert_to_numpy=True), dtype=np.float32)
+        cand_q = np.asarray(candidate.encode(list(queries), convert_to_numpy=True), dtype=np.float32)
+        ref_top = np.argsort(-(ref_q @ ref.T), axis=1)[:, :top_k]
+        cand_top = np.argsort(-(cand_q @ cand.T), axis=1)[:, :top_k]
+        overlap = [len(set(a) & set(b)) / top_k for a, b in zip(ref_top, cand_top)]
+        report[f'top{top_k}_overlap'] = round(float(np.mean(overlap)), 4)
+    return report
+
+
+if __name__ == "__main__":
+    from fetch_and_store import EMBEDDING_MODEL_NAME, EMBEDDING_DIM
+    command = sys.argv[1] if len(sys.argv) > 1 else ''
+    if command == 'export':
+        export_onnx(EMBEDDING_MODEL_NAME, quantize='--no-int8' not in sys.argv[2:])
+    elif command == 'parity':
+        # python embedders.py parity [onnx|onnx-int8 ...]
+        from bench_replay import load_queries
+        backends = sys.argv[2:] or list(ONNX_FILES)
+        reference = load_embedder(EMBEDDING_MODEL_NAME, 'torch', dim=EMBEDDING_DIM)
+        texts = corpus_texts()
+        queries = [q['query'] for q in load_queries()]
+        failed = False
+        for backend in backends:
+            report = parity(reference, load_embedder(EMBEDDING_MODEL_NAME, backend, dim=EMBEDDING_DIM), texts, queries)
+            ok = report['min_cosine'] >= PARITY_MIN_COSINE.get(backend, 0.0)
+            failed = failed or not ok
+            print(f"{backend:<10} {'ok  ' if ok else 'FAIL'} {report}")
+        sys.exit(1 if failed else 0)
+    else:
+        print("Usage: python embedders.py export [--no-int8] | parity [onnx|onnx-int8 ...]")
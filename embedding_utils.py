@@ -0,0 +1,130 @@
+import os
+import time
+
+# Number of texts handed to model.encode() at once
+EMBED_BATCH_SIZE = int(os.getenv('EMBED_BATCH_SIZE', '64'))
+# How many batches worth of texts are length-sorted together before encoding
+EMBED_BUCKET_BATCHES = int(os.getenv('EMBED_BUCKET_BATCHES', '8'))
+# Torch intra-op threads for CPU encoding (unset = torch default)
+EMBED_THREADS = os.getenv('EMBED_THREADS')
+
+
+def configure_threads(num_threads=None):
+    """Apply EMBED_THREADS (or num_threads) to torch, if torch is available."""
+    num_threads = num_threads or EMBED_THREADS
+    if not num_threads:
+        return None
+    try:
+        import torch
+    except ImportError:
+        return None
+    torch.set_num_threads(int(num_threads))
+    return torch.get_num_threads()
+
+
+class ThroughputReport:
+    """Counts embedded items and reports items/sec for sizing batch and thread counts."""
+
+    def __init__(self, label='embed'):
+        self.label = label
+        self.items = 0
+        self.batches = 0
+        self.encode_seconds = 0.0
+        self.started = time.perf_counter()
+
+    def add(self, n_items, seconds):
+        self.items += n_items
+        self.batches += 1
+        self.encode_seconds += seconds
+
+    @property
+    def wall_seconds(self):
+        return time.perf_counter() - self.started
+
+    @property
+    def items_per_sec(self):
+        return self.items / self.encode_seconds if self.encode_seconds else 0.0
+
+    def summary(self):
+        return {
+            'label': self.label,
+            'items': self.items,
+            'batches': self.batches,
+            'encode_seconds': round(self.encode_seconds, 3),
+            'wall_seconds': round(self.wall_seconds, 3),
+            'items_per_sec': round(self.items_per_sec, 1),
+        }
+
+    def print_summary(self):
+        s = self.summary()
+        print(f"[{s['label']}] embedded {s['items']} items in {s['batches']} batches: "
+              f"{s['encode_seconds']}s encoding, {s['wall_seconds']}s wall, {s['items_per_sec']} items/sec")
+
+
+def _length_bucketed(records, text_of, batch_size, bucket_batches):
+    """Read a window of records, sort it by text length and cut it into batches."""
+    window = []
+    window_size = max(1, batch_size * bucket_batches)
+    for record in records:
+        window.append(record)
+        if len(window) >= window_size:
+            window.sort(key=lambda r: len(text_of(r)))
+            for i in range(0, len(window), batch_size):
+                yield window[i:i + batch_size]
+            window = []
+    if window:
+        window.sort(key=lambda r: len(text_of(r)))
+        for i in range(0, len(window), batch_size):
+            yield window[i:i + batch_size]
+
+
+def _in_order(records, batch_size):
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def embed_stream(model, records, text_of=lambda r: r, batch_size=None, sort_by_length=True,
+                 bucket_batches=None, report=None):
+    """
+    Stream (records, embeddings) pairs, encoding `batch_size` texts per model call.
+
+    `records` may be any iterable; `text_of` extracts the text to embed from a
+    record. With `sort_by_length`, records are length-sorted within a window of
+    `bucket_batches` batches so each batch pads to a similar length. Embeddings
+    are float32 numpy arrays of shape (len(records), dim).
+    """
+    batch_size = batch_size or EMBED_BATCH_SIZE
+    bucket_batches = bucket_batches or EMBED_BUCKET_BATCHES
+    if sort_by_length:
+        batches = _length_bucketed(records, text_of, batch_size, bucket_batches)
+    else:
+        batches = _in_order(records, batch_size)
+    for batch in batches:
+        start = time.perf_counter()
+        embeddings = model.encode(
+            [text_of(r) for r in batch],
+            batch_size=batch_size,
+            convert_to_numpy=True,
+            show_progress_bar=False,
+        )
+        if report is not None:
+            report.add(len(batch), time.perf_counter() - start)
+        yield batch, embeddings
+
+
+def embed_to_vectors(model, records, batch_size=None, sort_by_length=True, report=None):
+    """
+    Turn (id, text, metadata) records into Pinecone upsert batches.
+
+    Yields lists of (id, values, metadata) tuples, one list per encode batch.
+    """
+    for batch, embeddings in embed_stream(model, records, text_of=lambda r: r[1], batch_size=batch_size,
+                                          sort_by_length=sort_by_length, report=report):
+        values = embeddings.tolist()
+        yield [(record_id, vector, meta) for (record_id, _, meta), vector in zip(batch, values)]
@@ -1,14 +1,25 @@
-import requests
 import os
-from pinecone import Pinecone, ServerlessSpec
-from sentence_transformers import SentenceTransformer
 import json
+import time
+import logging
+import threading
 from dotenv import load_dotenv
 from datetime import datetime
-import certifi
+from vector_store import (VECTOR_BACKEND, VECTOR_VERSION_PATH, PineconeVectorStore, LocalVectorStore,
+                          new_version, is_version_name, read_active_version, write_active_version)
+from embedding_utils import embed_to_vectors, ThroughputReport, EMBED_BATCH_SIZE
+from embedders import load_embedder, EMBEDDING_BACKEND
+from catalog import (load_records, write_changes, journal_length, compact_records, get_doc_store,
+                     display_date_epoch, department_key)
+from sync_utils import load_sync_state, save_sync_state, plan_sync, record_sync
+from drupal_client import DrupalClient, VALIDATORS_FILE
+from keyword_index import KeywordIndex, KEYWORD_INDEX_PATH
+from upsert_pipeline import UpsertPipeline, UPSERT_WORKERS
+from pdf_ingest import extract_texts, chunk_text, PDF_MAX_CHUNKS
 
 load_dotenv()
-print(certifi.where())
+
+logger = logging.getLogger(__name__)
 
 # Set your Pinecone API key and environment here or use environment variables
 PINECONE_API_KEY = os.getenv('PINECONE_API_KEY', 'YOUR_PINECONE_API_KEY')
@@ -18,6 +29,10 @@ INDEX_NAME = 'pmcbot'
 # Embedding model and dimension
 EMBEDDING_MODEL_NAME = 'all-MiniLM-L6-v2'
 EMBEDDING_DIM = 384
+# Query embedding caches are keyed per model and backend, since quantized vectors differ slightly
+EMBEDDING_NAMESPACE = EMBEDDING_MODEL_NAME if EMBEDDING_BACKEND == 'torch' else f"{EMBEDDING_MODEL_NAME}:{EMBEDDING_BACKEND}"
+# Journal lines after which a sync folds data/<type>.changes.jsonl back into data/<type>.json
+COMPACT_THRESHOLD = 500
 
 # List of content types to fetch (add more as needed)
 CONTENT_TYPES = [
@@ -27,12 +42,109 @@ CONTENT_TYPES = [
 ]
 
 DATA_DIR = 'data'
-os.makedirs(DATA_DIR, exist_ok=True)
 
-pc = Pinecone(api_key=os.getenv('PINECONE_API_KEY', 'YOUR_PINECONE_API_KEY'))
+# Also embed the text of each record's linked PDF, in overlapping chunks tied to the parent nid
+PDF_CHUNKS = os.getenv('PDF_CHUNKS', '0') == '1'
+# Index versions kept besides the active one after a reindex (for rollback and in-flight readers)
+VECTOR_KEEP_VERSIONS = int(os.getenv('VECTOR_KEEP_VERSIONS', '1'))
+# How long reindex waits for the new version's vector count to match (Pinecone stats lag behind writes)
+REINDEX_VALIDATE_TIMEOUT = float(os.getenv('REINDEX_VALIDATE_TIMEOUT', '120'))
+
+# Heavy resources are created on first use (or injected), never at import time,
+# so importing this module costs no network calls and no model load.
+_model = None
+_pinecone = None
+_vector_store = None
+_vector_store_injected = False
+_active_store = None
+_active_pointer_mtime = None
+_init_lock = threading.Lock()
+
+def get_model():
+    """Shared embedder for EMBEDDING_BACKEND (see embedders.py), loaded on first use."""
+    global _model
+    if _model is None:
+        with _init_lock:
+            if _model is None:
+                _model = load_embedder(EMBEDDING_MODEL_NAME, EMBEDDING_BACKEND, dim=EMBEDDING_DIM)
+    return _model
+
+def set_model(model):
+    """Inject an embedder (anything with a SentenceTransformer-style encode())."""
+    global _model
+    _model = model
+
+def get_pinecone():
+    global _pinecone
+    if _pinecone is None:
+        from pinecone import Pinecone
+        _pinecone = Pinecone(api_key=PINECONE_API_KEY)
+    return _pinecone
+
+def get_vector_root():
+    """Vector store selected by VECTOR_BACKEND in its default namespace, connected on first use."""
+    global _vector_store
+    if _vector_store is None:
+        with _init_lock:
+            if _vector_store is None:
+                if VECTOR_BACKEND == 'local':
+                    # In-process index persisted under data/, no network round trip per query
+                    _vector_store = LocalVectorStore(dim=EMBEDDING_DIM)
+                else:
+                    # Connect to the index; creating it is an explicit admin step (create-index)
+                    # One handle for all callers; its connection pool serves the parallel upserts
+                    _vector_store = PineconeVectorStore(get_pinecone().Index(INDEX_NAME, pool_threads=UPSERT_WORKERS))
+    return _vector_store
+
+def get_vector_store():
+    """
+    Vector store scoped to the active index version.
+
+    The version pointer file is re-read whenever its mtime changes, so a
+    reindex switches a running server over without a restart. A local
+    index is also reopened when its data files change, since incremental
+    sync rewrites the active version in place.
+    """
+    global _active_store, _active_pointer_mtime
+    root = get_vector_root()
+    if _vector_store_injected:
+        return root
+    try:
+        mtime = os.stat(VECTOR_VERSION_PATH).st_mtime_ns
+    except OSError:
+        mtime = None
+    if _active_store is None or mtime != _active_pointer_mtime:
+        with _init_lock:
+            if _active_store is None or mtime != _active_pointer_mtime:
+                version = read_active_version()
+                _active_store = root.with_namespace(version)
+                _active_pointer_mtime = mtime
+                logger.info("Vector searches use index version %s", version or '(default namespace)')
+    elif _active_store.is_stale():
+        with _init_lock:
+            if _active_store.is_stale():
+                try:
+                    _active_store = _active_store.reopen()
+                    logger.info("Reloaded vector index version %s after it changed on disk", _active_store.namespace or '(default namespace)')
+                except (OSError, ValueError) as e:
+                    # Mid-write; the next search tries again
+                    logger.debug("Vector index reload deferred: %s", e)
+    return _active_store
+
+def set_vector_store(store):
+    """Inject a VectorStore (e.g. a LocalVectorStore or a test double); it is used as-is."""
+    global _vector_store, _vector_store_injected, _active_store
+    _vector_store = store
+    _vector_store_injected = store is not None
+    _active_store = None
 
-# Create index if it doesn't exist
-if INDEX_NAME not in [index.name for index in pc.list_indexes()]:
+def create_index():
+    """Admin command: create the Pinecone index if it doesn't exist."""
+    from pinecone import ServerlessSpec
+    pc = get_pinecone()
+    if INDEX_NAME in [index.name for index in pc.list_indexes()]:
+        print(f"Index {INDEX_NAME} already exists.")
+        return
     pc.create_index(
         name=INDEX_NAME,
         dimension=EMBEDDING_DIM,
@@ -41,141 +153,306 @@ if INDEX_NAME not in [index.name for index in pc.list_indexes()]:
             region="us-east-1"  # or your preferred region
         )
     )
+    print(f"Created index {INDEX_NAME}.")
+
+def warm_up():
+    """Load the model and connect the vector store ahead of the first request."""
+    get_model().encode('warm up')
+    get_vector_store()
+
+_drupal_client = None
 
-# Connect to the index
-index = pc.Index(INDEX_NAME)
-model = SentenceTransformer(EMBEDDING_MODEL_NAME)
+def get_drupal_client():
+    global _drupal_client
+    if _drupal_client is None:
+        _drupal_client = DrupalClient(validators_path=os.path.join(DATA_DIR, VALIDATORS_FILE))
+    return _drupal_client
 
 def fetch_content(content_type):
-    url = f'https://webadmin.pmc.gov.in/api/listing-api/{content_type}?&page_no=1&limit=1000&lang=en&vocabulary=department'
-    response = requests.get(url, verify=False)
-    response.raise_for_status()
-    data = response.json()
-    print(f"Fetched {content_type} data: count=", len(data.get('data', {}).get('nodes', [])))
-    return data.get('data', {}).get('nodes', [])
+    listing = get_drupal_client().fetch_listing(content_type, conditional=False)
+    print(f"Fetched {content_type} data: count=", len(listing.nodes))
+    return listing.nodes
 
 def get_embedding(text):
     """Get embedding for a single text input (for chatbot_server compatibility)."""
-    return model.encode(text).tolist()
+    return get_model().encode(text).tolist()
 
-def search_vectors(embedding, top_k=5):
-    """Search Pinecone index for similar vectors."""
-    return index.query(vector=embedding, top_k=top_k, include_metadata=True)
+def get_embeddings(texts):
+    """Embeddings for several texts in one batched encode call."""
+    texts = list(texts)
+    if not texts:
+        return []
+    return get_model().encode(texts, batch_size=EMBED_BATCH_SIZE, convert_to_numpy=True, show_progress_bar=False).tolist()
+
+def search_vectors(embedding, top_k=5, filter=None):
+    """Search the configured vector store (Pinecone by default), optionally with a metadata filter."""
+    return get_vector_store().query(embedding, top_k=top_k, include_metadata=True, filter=filter)
 
 def load_existing_ids(filepath):
-    if not os.path.exists(filepath):
-        return set()
-    with open(filepath, 'r', encoding='utf-8') as f:
-        try:
-            data = json.load(f)
-            return set(str(item.get('nid', item.get('id', 'unknown'))) for item in data)
-        except Exception:
-            return set()
+    data_dir, filename = os.path.split(filepath)
+    content_type = filename[:-len('.json')] if filename.endswith('.json') else filename
+    return set(str(item.get('nid', item.get('id', 'unknown'))) for item in load_records(data_dir, content_type))
 
 def save_content_to_file(content, filename):
     with open(filename, 'w', encoding='utf-8') as f:
         json.dump(content, f, ensure_ascii=False, indent=2)
 
-def store_in_pinecone(content, content_type):
-    vectors = []
-    for item in content:
-        if not isinstance(item, dict):
-            continue
-        item_id = str(item.get('nid', item.get('id', 'unknown')))
-        # Try to get a link if available
-        link = item.get('url', '') or item.get('link', '')
-        circ_text = item.get('title', '') + '\n' + item.get('body', '')
-        if link:
-            circ_text += f'\n{link}'
-        embedding = get_embedding(circ_text)
-        vectors.append((f"{content_type}_{item_id}", embedding, {'text': circ_text, 'content_type': content_type}))
-    if vectors:
-        index.upsert(vectors)
-    print(f"Upserted {len(vectors)} {content_type} items to Pinecone.")
+def upsert_batches(vector_batches, target=None, label='upsert', **options):
+    """Upload streamed (id, values, metadata) batches through the parallel upsert pipeline."""
+    pipeline = UpsertPipeline(target or get_vector_store(), label=label, **options)
+    pipeline.run(vector_batches)
+    pipeline.print_summary()
+    return pipeline.stats.vectors
+
+def vector_id(content_type, nid):
+    return f"{content_type}_{nid}"
+
+def chunk_vector_id(parent_id, index):
+    return f"{parent_id}#{index}"
 
 def clean_metadata(meta):
     # Remove keys with None/null values
     return {k: v for k, v in meta.items() if v is not None}
 
+def vector_record(content_type, item):
+    """(id, text, metadata) for one node; sync and reindex both use this, so their vectors agree."""
+    # Compose the text for embedding (use title + body/text if available)
+    text = item.get('title') or ''
+    for field in ('body', 'text', 'description'):
+        if item.get(field):
+            text += '\n' + item[field]
+            break
+    # Prepare metadata, excluding nulls
+    meta = clean_metadata({
+        'text': text,
+        'file': item.get('file'),
+        'title': item.get('title'),
+        'display_date': item.get('display_date'),
+        # Numeric date and normalised department, so searches can filter on them
+        'display_date_ts': display_date_epoch(item.get('display_date')),
+        'nid': item.get('nid'),
+        'content_type': content_type,
+        'department': item.get('department'),
+        'department_key': department_key(item.get('department')),
+        'url': item.get('url'),
+        'external_link': item.get('external_link'),
+        'link': item.get('link'),
+        # Add more fields as needed
+    })
+    nid = str(item.get('nid', item.get('id', 'unknown')))
+    return (vector_id(content_type, nid), text, meta)
+
+def chunk_records(content_type, item, text):
+    """(id, text, metadata) per chunk of a node's PDF text; metadata names the parent vector."""
+    parent_id, _, meta = vector_record(content_type, item)
+    title = item.get('title') or ''
+    records = []
+    for i, chunk in enumerate(chunk_text(text)):
+        chunk_meta = dict(meta, text=chunk, chunk=i, parent_id=parent_id)
+        records.append((chunk_vector_id(parent_id, i), f"{title}\n{chunk}", chunk_meta))
+    return records
+
+def document_records(content_type, items):
+    """Vector records for nodes: one per node, plus its PDF chunks when PDF_CHUNKS is on."""
+    items = [item for item in items if isinstance(item, dict)]
+    records = [vector_record(content_type, item) for item in items]
+    if PDF_CHUNKS:
+        texts, stats = extract_texts(items)
+        print(f"PDF text for {content_type}: {stats.summary()}")
+        for item in items:
+            text = texts.get(str(item.get('nid')))
+            if text:
+                records.extend(chunk_records(content_type, item, text))
+    return records
+
+def delete_vectors(store, ids, batch_size=1000):
+    """Delete ids in batches; Pinecone accepts at most 1000 per request."""
+    ids = list(ids)
+    for i in range(0, len(ids), batch_size):
+        store.delete(ids=ids[i:i + batch_size])
+
+def store_in_pinecone(content, content_type):
+    records = document_records(content_type, content)
+    report = ThroughputReport(f"store {content_type}")
+    upserted = upsert_batches(embed_to_vectors(get_model(), records, report=report), label=f"upsert {content_type}")
+    if PDF_CHUNKS:
+        # A re-extracted PDF may have fewer chunks than before
+        current = {r[0] for r in records}
+        stale = [vid for item in content if isinstance(item, dict)
+                 for vid in chunk_ids(content_type, item.get('nid', item.get('id', 'unknown'))) if vid not in current]
+        delete_vectors(get_vector_store(), stale)
+    get_vector_store().flush()
+    report.print_summary()
+    print(f"Upserted {upserted} {content_type} items to {VECTOR_BACKEND}.")
+
+def wait_for_count(store, expected, timeout=REINDEX_VALIDATE_TIMEOUT):
+    """Poll store.count() until it reaches `expected` or the timeout passes; returns the last count."""
+    deadline = time.monotonic() + timeout
+    count = store.count()
+    while count != expected and time.monotonic() < deadline:
+        time.sleep(2)
+        count = store.count()
+    return count
+
 def reindex_all_data():
-    import glob
-    import time
-    # Clear the index first
-    print("Deleting all vectors from Pinecone index...")
-    pc.Index(INDEX_NAME).delete(delete_all=True)
-    print("Index cleared. Re-indexing...")
-    
-    # For each content type, load the JSON and upsert with full metadata
-    for content_type in CONTENT_TYPES:
-        filepath = os.path.join(DATA_DIR, f"{content_type}.json")
-        if not os.path.exists(filepath):
-            print(f"File not found: {filepath}")
-            continue
-        with open(filepath, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        print(f"Indexing {len(data)} items from {filepath}...")
-        vectors = []
-        for item in data:
-            # Compose the text for embedding (use title + text if available)
-            text = item.get('title', '')
-            if 'text' in item:
-                text += '\n' + item['text']
-            elif 'description' in item:
-                text += '\n' + item['description']
-            # Generate embedding
-            embedding = model.encode(text).tolist()
-            # Prepare metadata, excluding nulls
-            meta = clean_metadata({
-                'text': text,
-                'file': item.get('file'),
-                'title': item.get('title'),
-                'display_date': item.get('display_date'),
-                'nid': item.get('nid'),
-                'content_type': content_type,
-                'department': item.get('department'),
-                'url': item.get('url'),
-                'external_link': item.get('external_link'),
-                'link': item.get('link'),
-                # Add more fields as needed
-            })
-            vectors.append((str(item.get('nid', item.get('id', 'unknown'))), embedding, meta))
-            # Upsert in batches of 100
-            if len(vectors) >= 100:
-                pc.Index(INDEX_NAME).upsert(vectors)
-                vectors = []
-        if vectors:
-            pc.Index(INDEX_NAME).upsert(vectors)
-        print(f"Finished indexing {filepath}.")
-        time.sleep(1)  # Avoid rate limits
+    """
+    Blue/green reindex: embed every local record into a fresh index version,
+    check its size against the local store, then atomically point searches
+    at it and garbage-collect old versions. The live version keeps serving
+    until the switch, and a failed build never becomes active.
+    """
+    root = get_vector_root()
+    previous = read_active_version()
+    version = new_version()
+    if version == previous:
+        # The failure path below drops `version`; it must never be the live index
+        raise RuntimeError(f"New index version {version} is the active one; not rebuilding over it")
+    target = root.with_namespace(version)
+    print(f"Building index version {version} in {VECTOR_BACKEND} (active: {previous or '(default namespace)'})...")
+    expected_ids = set()
+
+    def embedded_batches():
+        # Embedding of the next content type overlaps the upload of the previous one
+        for content_type in CONTENT_TYPES:
+            data = load_records(DATA_DIR, content_type)
+            if not data:
+                print(f"No {content_type} records in {DATA_DIR}")
+                continue
+            print(f"Indexing {len(data)} {content_type} items...")
+            records = document_records(content_type, data)
+            expected_ids.update(r[0] for r in records)
+            report = ThroughputReport(f"reindex {content_type}")
+            yield from embed_to_vectors(get_model(), records, report=report)
+            report.print_summary()
+
+    try:
+        # Rate limits are handled by the pipeline's retries instead of fixed sleeps
+        upsert_batches(embedded_batches(), target=target, label="reindex upsert")
+        target.flush()
+        count = wait_for_count(target, len(expected_ids))
+        if count != len(expected_ids):
+            raise RuntimeError(f"Index version {version} has {count} vectors, expected {len(expected_ids)}")
+    except BaseException:
+        print(f"Reindex failed; dropping {version}, searches stay on {previous or '(default namespace)'}.")
+        root.drop_namespace(version)
+        raise
+    write_active_version(version, previous=previous, vectors=count)
+    print(f"Searches switched to index version {version} ({count} vectors).")
+    build_keyword_index()
+    gc_versions()
     print("Re-indexing complete.")
 
-def main():
+def gc_versions(keep=VECTOR_KEEP_VERSIONS):
+    """Drop index versions other than the active one and the `keep` newest before it."""
+    root = get_vector_root()
+    active = read_active_version()
+    if not active:
+        # Nothing has been switched to a versioned namespace yet
+        return []
+    # Only touch namespaces reindex created: '' (pre-versioning) and 'v<timestamp>[-<suffix>]'
+    versions = sorted(ns for ns in root.namespaces()
+                      if ns != active and (ns == '' or is_version_name(ns)))
+    stale = versions[:max(0, len(versions) - keep)]
+    for namespace in stale:
+        root.drop_namespace(namespace)
+        print(f"Dropped index version {namespace or '(default namespace)'}.")
+    return stale
+
+def build_keyword_index():
+    """Rebuild data/keyword_index.json from the local records of every content type."""
+    index = KeywordIndex.build({ct: load_records(DATA_DIR, ct) for ct in CONTENT_TYPES})
+    index.save(KEYWORD_INDEX_PATH)
+    print(f"Keyword index built: {len(index)} documents.")
+    return index
+
+def update_keyword_index(content_type, upserts=(), deletes=()):
+    """Apply one sync's changes to the persisted keyword index."""
+    if not os.path.exists(KEYWORD_INDEX_PATH):
+        # The full build already reflects the records journaled by this sync
+        return build_keyword_index()
+    index = KeywordIndex.load(KEYWORD_INDEX_PATH)
+    index.add_many(content_type, upserts)
+    for nid in deletes:
+        index.remove(content_type, nid)
+    index.save(KEYWORD_INDEX_PATH)
+    return index
+
+def chunk_ids(content_type, nid):
+    return [chunk_vector_id(vector_id(content_type, nid), i) for i in range(PDF_MAX_CHUNKS)]
+
+def vector_ids_for(content_type, nid):
+    # Indexes built before ids were unified also hold a bare-nid copy from the old reindex
+    ids = [vector_id(content_type, nid), str(nid)]
+    if PDF_CHUNKS:
+        ids += chunk_ids(content_type, nid)
+    return ids
+
+def sync_content_type(content_type, state, listing=None, allow_mass_delete=False):
+    """Bring one content type up to date, embedding only new and edited nodes."""
+    local_records = load_records(DATA_DIR, content_type)
+    if listing is None:
+        listing = get_drupal_client().fetch_listing(content_type)
+    print(f"Fetched {content_type} listing: {len(listing.nodes)} nodes, "
+          f"{len(listing.unchanged_nids)} on unchanged pages, {listing.pages} pages")
+    plan = plan_sync(
+        content_type,
+        local_records,
+        listing.nodes,
+        high_water=state.get(content_type, {}).get('high_water'),
+        listing_complete=listing.complete,
+        unchanged_nids=listing.unchanged_nids,
+        allow_mass_delete=allow_mass_delete,
+    )
+    print(plan.summary())
+    # Vectors first: if we crash before the journal is written, the next run re-embeds
+    if plan.changed_nodes:
+        store_in_pinecone(plan.changed_nodes, content_type)
+    if plan.deleted:
+        delete_vectors(get_vector_store(), [vid for nid in plan.deleted for vid in vector_ids_for(content_type, nid)])
+        get_vector_store().flush()
+        print(f"Deleted vectors for {len(plan.deleted)} removed {content_type} items.")
+    write_changes(DATA_DIR, content_type, upserts=plan.changed_nodes, deletes=plan.deleted)
+    if not plan.is_empty() or not os.path.exists(KEYWORD_INDEX_PATH):
+        update_keyword_index(content_type, upserts=plan.changed_nodes, deletes=plan.deleted)
+    # The SQLite store is updated in place; only the JSON journal needs compacting
+    if get_doc_store(DATA_DIR) is None and journal_length(DATA_DIR, content_type) >= COMPACT_THRESHOLD:
+        print(f"Compacted {compact_records(DATA_DIR, content_type)} {content_type} items into {content_type}.json")
+    record_sync(state, plan)
+    return plan
+
+def main(allow_mass_delete=False):
+    os.makedirs(DATA_DIR, exist_ok=True)
+    state = load_sync_state(DATA_DIR)
+    client = get_drupal_client()
+    # All content types and pages are fetched concurrently over one pooled session
+    listings = client.fetch_many(CONTENT_TYPES)
     for content_type in CONTENT_TYPES:
         print(f"Processing content type: {content_type}")
-        filepath = os.path.join(DATA_DIR, f"{content_type}.json")
-        existing_ids = load_existing_ids(filepath)
-        new_content = fetch_content(content_type)
-        # Filter out already existing items
-        new_items = [item for item in new_content if str(item.get('nid', item.get('id', 'unknown'))) not in existing_ids]
-        if not new_items:
-            print(f"No new {content_type} items found.")
-            continue
-        # Save all (merged) items to file
-        if os.path.exists(filepath):
-            with open(filepath, 'r', encoding='utf-8') as f:
-                try:
-                    old_data = json.load(f)
-                except Exception:
-                    old_data = []
-            merged = old_data + new_items
-        else:
-            merged = new_items
-        save_content_to_file(merged, filepath)
-        store_in_pinecone(new_items, content_type)
+        sync_content_type(content_type, state, listings[content_type], allow_mass_delete=allow_mass_delete)
+        save_sync_state(DATA_DIR, state)
+    # Only remember ETags once everything they vouch for is stored
+    client.save_validators()
+    print(f"Drupal API: {client.stats()}")
+
+def compact_all():
+    if get_doc_store(DATA_DIR) is not None:
+        print("Records are in the SQLite document store; nothing to compact.")
+        return
+    for content_type in CONTENT_TYPES:
+        print(f"Compacted {compact_records(DATA_DIR, content_type)} {content_type} items into {content_type}.json")
 
 if __name__ == "__main__":
     import sys
     if len(sys.argv) > 1 and sys.argv[1] == "reindex":
         reindex_all_data()
+    elif len(sys.argv) > 1 and sys.argv[1] == "create-index":
+        create_index()
+    elif len(sys.argv) > 1 and sys.argv[1] == "build-keyword-index":
+        build_keyword_index()
+    elif len(sys.argv) > 1 and sys.argv[1] == "gc-versions":
+        gc_versions(int(sys.argv[2]) if len(sys.argv) > 2 else VECTOR_KEEP_VERSIONS)
+    elif len(sys.argv) > 1 and sys.argv[1] == "compact":
+        compact_all()
     else:
-        main() 
\ No newline at end of file
+        # --allow-mass-delete: apply deletions even when most (or all) local records are missing from the listing
+        main(allow_mass_delete='--allow-mass-delete' in sys.argv[1:]) 
\ No newline at end of file
@@ -0,0 +1,84 @@
+import os
+
+# Writes the small text PDFs in fixtures/pdfs used to exercise pdf_ingest offline.
+# Usage: python fixtures/make_pdfs.py
+
+OUT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'pdfs')
+LINES_PER_PAGE = 40
+
+SAP_TRAINING = """Pune Municipal Corporation
+General Administration Department
+Office Circular: SAP Sasa-40 Training Workshop
+A training workshop on the SAP Sasa-40 module will be held for clerks and accounts staff
+of all departments and ward offices. The workshop covers budget entries, purchase orders,
+vendor payments, salary processing and the monthly closing of accounts in SAP.
+Each head of department shall nominate two employees who handle SAP entries and send the
+names to the Training Cell by email before the last date mentioned below.
+Sessions will be held in the Standing Committee hall of the main building from 10.30 am to
+5.30 pm. Nominated employees must bring their SAP login details and a laptop where available.
+Attendance is compulsory and will be recorded through the biometric attendance system.
+Employees who complete the workshop will receive a certificate from the Training Cell.
+Departments that fail to send nominations in time will be reported to the Deputy Commissioner,
+General Administration Department, for necessary action.
+Contact: Training Cell, Pune Municipal Corporation, extension 2501."""
+
+HOLIDAYS = """Pune Municipal Corporation
+Office Circular: Holidays for workers in the year 2025
+The following public holidays are declared for workers of the Pune Municipal Corporation
+for the calendar year 2025 in accordance with the notification of the Government of Maharashtra.
+Republic Day 26 January 2025, Maharashtra Day 1 May 2025, Independence Day 15 August 2025,
+Ganesh Chaturthi 27 August 2025, Gandhi Jayanti 2 October 2025 and Diwali (Lakshmi Puja)
+21 October 2025, together with the other festivals listed in the annexure.
+Essential services such as water supply, fire brigade, health and sanitation shall continue
+to function on holidays as per the duty rosters approved by the heads of departments.
+Workers required to attend duty on a declared holiday shall be given a compensatory leave
+within three months."""
+
+PENSION = """Pune Municipal Corporation
+Office Circular: Submission of information on pending pension cases
+All departments shall submit information about pending pension cases, cases of absence for
+five years or more, indemnity bond cases and dirt allowance heir cases in the prescribed format.
+Pension cases pending for more than six months must be explained with reasons and the action
+taken so far. The information must reach the Chief Accounts and Finance Officer within seven days.
+Heads of departments are personally responsible for the accuracy of the information submitted."""
+
+
+def escape(text):
+    return text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+
+def write_pdf(path, text, repeat=1):
+    """Minimal PDF 1.4: Helvetica text, LINES_PER_PAGE lines per page, uncompressed streams."""
+    lines = text.splitlines() * repeat
+    pages = [lines[i:i + LINES_PER_PAGE] for i in range(0, len(lines), LINES_PER_PAGE)]
+    objects = ['<< /Type /Catalog /Pages 2 0 R >>', None, '<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>']
+    kids = []
+    for page_lines in pages:
+        body = 'BT /F1 10 Tf 50 800 Td 14 TL ' + ' '.join(f'({escape(line)}) Tj T*' for line in page_lines) + ' ET'
+        objects.append(f'<< /Length {len(body.encode("latin-1"))} >>\nstream\n{body}\nendstream')
+        objects.append(f'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] '
+                       f'/Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects)} 0 R >>')
+        kids.append(f'{len(objects)} 0 R')
+    objects[1] = f'<< /Type /Pages /Kids [{" ".join(kids)}] /Count {len(kids)} >>'
+    out = b'%PDF-1.4\n'
+    offsets = []
+    for number, obj in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += f'{number} 0 obj\n{obj}\nendobj\n'.encode('latin-1')
+    xref = len(out)
+    out += f'xref\n0 {len(objects) + 1}\n0000000000 65535 f \n'.encode('latin-1')
+    out += ''.join(f'{offset:010d} 00000 n \n' for offset in offsets).encode('latin-1')
+    out += f'trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n'.encode('latin-1')
+    with open(path, 'wb') as f:
+        f.write(out)
+
+
+if __name__ == "__main__":
+    os.makedirs(OUT_DIR, exist_ok=True)
+    # Repeated so the SAP circular spans two pages and several chunks
+    write_pdf(os.path.join(OUT_DIR, 'sap_training.pdf'), SAP_TRAINING, repeat=4)
+    write_pdf(os.path.join(OUT_DIR, 'holidays_2025.pdf'), HOLIDAYS)
+    write_pdf(os.path.join(OUT_DIR, 'pension_cases.pdf'), PENSION)
+    # Same bytes under another name: served from the content-hash cache
+    write_pdf(os.path.join(OUT_DIR, 'pension_cases_copy.pdf'), PENSION)
+    print(f"Wrote fixture PDFs to {OUT_DIR}")
@@ -1,19 +1,151 @@
 import os
-import google.generativeai as genai
-from google.generativeai.client import configure
-from google.generativeai.generative_models import GenerativeModel
+import atexit
+import random
+import shutil
+import asyncio
+import tempfile
+import threading
+try:
+    import fcntl
+except ImportError:
+    # Not on Windows; only the cross-process limit needs it
+    fcntl = None
 
 genai_api_key = os.getenv('GEMINI_API_KEY', 'YOUR_GEMINI_API_KEY')
+# Gemini calls in flight at once, across every worker forked by serve.py (0 = no limit)
+GEMINI_MAX_CONCURRENCY = int(os.getenv('GEMINI_MAX_CONCURRENCY', '0'))
+# Seconds a call waits for a free slot before giving up (chat then sends its fallback answer)
+GEMINI_QUEUE_TIMEOUT = float(os.getenv('GEMINI_QUEUE_TIMEOUT', '30'))
+# Directory of slot files; by default a fresh temporary one, removed at exit
+GEMINI_SLOT_DIR = os.getenv('GEMINI_SLOT_DIR', '')
 _model = None
+_slots = None
+_slots_lock = threading.Lock()
 
 def get_model():
     global _model
     if _model is None:
+        # Imported here: google.generativeai takes most of a second to import
+        from google.generativeai.client import configure
+        from google.generativeai.generative_models import GenerativeModel
         configure(api_key=genai_api_key)
         _model = GenerativeModel('gemini-2.5-pro')
     return _model
 
+class SlotLease:
+    def __init__(self, fd):
+        self.fd = fd
+        self._lock = threading.Lock()
+
+    def release(self):
+        with self._lock:
+            if self.fd is None:
+                return
+            fd, self.fd = self.fd, None
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        os.close(fd)
+
+class GeminiSlots:
+    """
+    Cross-process limit on Gemini calls in flight: `size` slot files, each
+    held with an exclusive flock() for the length of one call. The kernel
+    drops a process's locks when it exits, however it exits, so a worker
+    that crashes or is killed mid-call never takes capacity with it.
+    """
+
+    def __init__(self, size, path=None):
+        if fcntl is None:
+            raise RuntimeError("GEMINI_MAX_CONCURRENCY needs flock(), which this platform lacks; set it to 0")
+        self.size = size
+        self.path = path or tempfile.mkdtemp(prefix='pmcbot-gemini-')
+        os.makedirs(self.path, exist_ok=True)
+
+    def _open(self, slot):
+        return os.open(os.path.join(self.path, f'slot-{slot}'), os.O_RDWR | os.O_CREAT, 0o600)
+
+    def try_acquire(self):
+        """A lease on a free slot, or None when all are taken. Never blocks."""
+        first = random.randrange(self.size)
+        for i in range(self.size):
+            fd = self._open((first + i) % self.size)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return SlotLease(fd)
+            except BlockingIOError:
+                os.close(fd)
+        return None
+
+    def in_flight(self):
+        held = 0
+        for slot in range(self.size):
+            fd = self._open(slot)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                fcntl.flock(fd, fcntl.LOCK_UN)
+            except BlockingIOError:
+                held += 1
+            finally:
+                os.close(fd)
+        return held
+
+def _remove_slot_dir(path, owner):
+    if os.getpid() == owner:
+        shutil.rmtree(path, ignore_errors=True)
+
+def get_gemini_slots():
+    """
+    The Gemini slot limiter, or None without a limit. Created before
+    serve.py forks, every worker shares its slot files and so one limit.
+    """
+    global _slots
+    if _slots is None and GEMINI_MAX_CONCURRENCY > 0:
+        with _slots_lock:
+            if _slots is None:
+                _slots = GeminiSlots(GEMINI_MAX_CONCURRENCY, GEMINI_SLOT_DIR or None)
+                if not GEMINI_SLOT_DIR:
+                    atexit.register(_remove_slot_dir, _slots.path, os.getpid())
+    return _slots
+
+async def acquire_gemini_slot(timeout=GEMINI_QUEUE_TIMEOUT):
+    """
+    Wait on the event loop (not in a pool thread) for a Gemini slot. Returns
+    a lease to release when the call finishes, or None without a limit.
+    """
+    slots = get_gemini_slots()
+    if slots is None:
+        return None
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    delay = 0.005
+    while True:
+        lease = slots.try_acquire()
+        if lease is not None:
+            return lease
+        if loop.time() >= deadline:
+            raise TimeoutError(f"no Gemini slot free within {timeout}s ({GEMINI_MAX_CONCURRENCY} in flight)")
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, 0.1)
+
+def gemini_stats():
+    slots = get_gemini_slots()
+    stats = {'max_concurrency': GEMINI_MAX_CONCURRENCY}
+    if slots is not None:
+        stats['in_flight'] = slots.in_flight()
+    return stats
+
 def generate_gemini_response(prompt):
     model = get_model()
     response = model.generate_content(prompt)
-    return response.text.strip() 
\ No newline at end of file
+    return response.text.strip()
+
+def stream_gemini_response(prompt):
+    """Yield the answer text chunk by chunk as Gemini generates it."""
+    model = get_model()
+    for chunk in model.generate_content(prompt, stream=True):
+        try:
+            text = chunk.text
+        except ValueError:
+            # Chunks without text parts (e.g. safety metadata) raise on .text
+            continue
+        if text:
+            yield text
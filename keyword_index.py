@@ -0,0 +1,229 @@
+import os
+import re
+import json
+import math
+import logging
+import threading
+from collections import Counter
+from catalog import record_nid, get_catalog, CATALOG_CONTENT_TYPES
+
+logger = logging.getLogger(__name__)
+
+DATA_DIR = 'data'
+KEYWORD_INDEX_PATH = os.path.join(DATA_DIR, 'keyword_index.json')
+
+# BM25 parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Title terms are counted this many times, so title hits outweigh body hits
+TITLE_WEIGHT = 2
+# Reciprocal rank fusion constant
+RRF_K = 60
+
+# Latin letters and digits are split apart ('sasa-40' and 'sasa40' both give
+# 'sasa', '40'); Devanagari runs keep their vowel signs and viramas, but the
+# danda punctuation (U+0964/U+0965) ends a token.
+TOKEN_RE = re.compile(r'[a-z]+|[0-9]+|[\u0900-\u0963\u0966-\u097f]+')
+
+STOPWORDS = {
+    'a', 'an', 'the', 'of', 'and', 'or', 'to', 'in', 'on', 'for', 'by', 'with', 'at', 'from',
+    'is', 'are', 'was', 'be', 'as', 'it', 'this', 'that', 'any', 'there', 'me', 'give',
+    'show', 'tell', 'about', 'please', 'can', 'you', 'find', 'provide', 'what', 'regarding', 'subject',
+    'व', 'आणि', 'या', 'की', 'आहे', 'चा', 'ची', 'चे', 'ला', 'मध्ये', 'साठी', 'बाबत',
+}
+
+
+def tokenize(text):
+    return [t for t in TOKEN_RE.findall((text or '').lower()) if t not in STOPWORDS]
+
+
+def doc_id(content_type, nid):
+    return f"{content_type}:{nid}"
+
+
+def split_doc_id(value):
+    content_type, _, nid = value.partition(':')
+    return content_type, nid
+
+
+def doc_terms(record):
+    terms = Counter()
+    for term in tokenize(record.get('title')):
+        terms[term] += TITLE_WEIGHT
+    for term in tokenize(record.get('body')):
+        terms[term] += 1
+    return terms
+
+
+class KeywordIndex:
+    """
+    Inverted index over document titles and bodies, scored with BM25.
+
+    Documents are keyed '<content_type>:<nid>'. add()/remove() keep the
+    postings up to date incrementally, so ingest only touches changed nodes.
+    """
+
+    def __init__(self):
+        self.postings = {}      # term -> {doc_id: tf}
+        self.doc_len = {}       # doc_id -> weighted length
+        self.doc_terms = {}     # doc_id -> [terms], needed to remove a doc
+        self.title_terms = {}   # doc_id -> [title terms], for exact-title matches
+        self.total_len = 0
+        self.mtime = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.doc_len)
+
+    # Maintenance
+
+    def add(self, content_type, record):
+        key = doc_id(content_type, record_nid(record))
+        terms = doc_terms(record)
+        with self._lock:
+            self._remove(key)
+            for term, tf in terms.items():
+                self.postings.setdefault(term, {})[key] = tf
+            length = sum(terms.values())
+            self.doc_len[key] = length
+            self.doc_terms[key] = list(terms)
+            self.title_terms[key] = sorted(set(tokenize(record.get('title'))))
+            self.total_len += length
+
+    def remove(self, content_type, nid):
+        with self._lock:
+            self._remove(doc_id(content_type, nid))
+
+    def _remove(self, key):
+        if key not in self.doc_len:
+            return
+        for term in self.doc_terms.pop(key, []):
+            docs = self.postings.get(term)
+            if docs is not None:
+                docs.pop(key, None)
+                if not docs:
+                    del self.postings[term]
+        self.total_len -= self.doc_len.pop(key)
+        self.title_terms.pop(key, None)
+
+    def add_many(self, content_type, records):
+        for record in records:
+            if isinstance(record, dict):
+                self.add(content_type, record)
+
+    # Queries
+
+    def search(self, query, top_k=10, content_type=None):
+        """Return [(doc_id, score)] best first; optionally limited to one content type."""
+        terms = set(tokenize(query))
+        n_docs = len(self.doc_len)
+        if not terms or not n_docs:
+            return []
+        avg_len = self.total_len / n_docs
+        scores = {}
+        for term in terms:
+            docs = self.postings.get(term)
+            if not docs:
+                continue
+            idf = math.log(1 + (n_docs - len(docs) + 0.5) / (len(docs) + 0.5))
+            for key, tf in docs.items():
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self.doc_len[key] / avg_len)
+                scores[key] = scores.get(key, 0.0) + idf * tf * (BM25_K1 + 1) / (tf + norm)
+        if content_type:
+            prefix = content_type + ':'
+            scores = {k: v for k, v in scores.items() if k.startswith(prefix)}
+        return sorted(scores.items(), key=lambda kv: kv[1], reverse=True)[:top_k]
+
+    def is_title_match(self, key, query):
+        """True when every query term occurs in the document's title."""
+        terms = set(tokenize(query))
+        return bool(terms) and terms.issubset(self.title_terms.get(key, ()))
+
+    # Persistence
+
+    def to_dict(self):
+        return {
+            'postings': self.postings,
+            'doc_len': self.doc_len,
+            'title_terms': self.title_terms,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        index = cls()
+        index.postings = data.get('postings', {})
+        index.doc_len = data.get('doc_len', {})
+        index.title_terms = data.get('title_terms', {})
+        index.total_len = sum(index.doc_len.values())
+        doc_terms = {}
+        for term, docs in index.postings.items():
+            for key in docs:
+                doc_terms.setdefault(key, []).append(term)
+        index.doc_terms = doc_terms
+        return index
+
+    def save(self, path=KEYWORD_INDEX_PATH):
+        tmp = path + '.tmp'
+        with self._lock:
+            data = self.to_dict()
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path=KEYWORD_INDEX_PATH):
+        mtime = os.stat(path).st_mtime_ns
+        with open(path, 'r', encoding='utf-8') as f:
+            index = cls.from_dict(json.load(f))
+        index.mtime = mtime
+        return index
+
+    @classmethod
+    def build(cls, records_by_type):
+        index = cls()
+        for content_type, records in records_by_type.items():
+            index.add_many(content_type, records)
+        return index
+
+
+def reciprocal_rank_fusion(rankings, k=RRF_K):
+    """Fuse ranked id lists: score(id) = sum(1 / (k + rank)). Returns [(id, score)] best first."""
+    scores = {}
+    for ranking in rankings:
+        for rank, key in enumerate(ranking, start=1):
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda kv: kv[1], reverse=True)
+
+
+_keyword_index = None
+_keyword_lock = threading.Lock()
+
+
+def get_keyword_index(path=KEYWORD_INDEX_PATH):
+    """
+    Shared index for the chat server.
+
+    Loads the file written by ingest and reloads it when its mtime changes.
+    Without a file it is built in memory from the catalog and rebuilt
+    whenever the catalog reloads.
+    """
+    global _keyword_index
+    try:
+        version = os.stat(path).st_mtime_ns
+    except OSError:
+        catalog = get_catalog()
+        version = tuple(catalog.view(ct).mtime for ct in CATALOG_CONTENT_TYPES)
+    current = _keyword_index
+    if current is not None and current.mtime == version:
+        return current
+    with _keyword_lock:
+        if _keyword_index is None or _keyword_index.mtime != version:
+            if isinstance(version, int):
+                index = KeywordIndex.load(path)
+            else:
+                catalog = get_catalog()
+                index = KeywordIndex.build({ct: catalog.items(ct) for ct in CATALOG_CONTENT_TYPES})
+            index.mtime = version
+            _keyword_index = index
+            logger.info("Keyword index ready: %d documents", len(index))
+        return _keyword_index
@@ -0,0 +1,159 @@
+import os
+import time
+import bisect
+import threading
+import contextvars
+from contextlib import contextmanager
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# Requests slower than this are logged with their per-stage breakdown (0 = off)
+SLOW_REQUEST_SECONDS = float(os.getenv('SLOW_REQUEST_SECONDS', '5'))
+
+_registry = []
+
+
+def _label_str(labelnames, values, extra=None):
+    pairs = list(zip(labelnames, values)) + ([extra] if extra else [])
+    if not pairs:
+        return ''
+    return '{' + ','.join('%s="%s"' % (k, str(v).replace('\\', '\\\\').replace('"', '\\"')) for k, v in pairs) + '}'
+
+
+class Counter:
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(n, '') for n in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_label_str(self.labelnames, key)} {value}")
+        return lines
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus text format."""
+
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}  # label values -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(n, '') for n in self.labelnames)
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            series[i] += 1
+            series[-1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + ('+Inf',), series[:-1]):
+                    cumulative += count
+                    le = bound if bound == '+Inf' else repr(float(bound))
+                    lines.append(f"{self.name}_bucket{_label_str(self.labelnames, key, ('le', le))} {cumulative}")
+                lines.append(f"{self.name}_sum{_label_str(self.labelnames, key)} {series[-1]}")
+                lines.append(f"{self.name}_count{_label_str(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+def render_metrics():
+    """All registered metrics as Prometheus text exposition."""
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+STAGE_SECONDS = Histogram('pmcbot_stage_seconds', 'Time spent in each chat pipeline stage.', ['stage'])
+REQUEST_SECONDS = Histogram('pmcbot_request_seconds', 'End-to-end chat request latency.', ['endpoint'])
+REQUESTS_TOTAL = Counter('pmcbot_requests_total', 'Chat requests served.', ['endpoint'])
+COALESCED_TOTAL = Counter('pmcbot_coalesced_requests_total', 'Calls that joined an identical in-flight search or generation.', ['stage'])
+
+
+class RequestTimer:
+    """Per-request stage timings (seconds); a stage entered twice accumulates."""
+
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+        self.started = time.perf_counter()
+        self.stages = {}
+
+    def add(self, stage, seconds):
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def total(self):
+        return time.perf_counter() - self.started
+
+    def breakdown_ms(self):
+        data = {stage: round(seconds * 1000, 2) for stage, seconds in self.stages.items()}
+        data['total'] = round(self.total() * 1000, 2)
+        return data
+
+
+_current_timer = contextvars.ContextVar('request_timer', default=None)
+
+
+def start_request(endpoint):
+    """Begin timing a request; spans in this task (and its awaits) are attributed to it."""
+    timer = RequestTimer(endpoint)
+    _current_timer.set(timer)
+    return timer
+
+
+def current_timer():
+    return _current_timer.get()
+
+
+def set_current_timer(timer):
+    """Re-attach a request's timer, e.g. inside a streaming body iterated by another task."""
+    _current_timer.set(timer)
+
+
+def record_stage(stage, seconds):
+    """Add a measured stage duration to STAGE_SECONDS and the current request's breakdown."""
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    timer = _current_timer.get()
+    if timer is not None:
+        timer.add(stage, seconds)
+
+
+@contextmanager
+def span(stage):
+    """Time the enclosed block as one pipeline stage."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - start)
+
+
+def finish_request(timer, logger=None):
+    """Record the request's total latency; slow requests are logged with their breakdown."""
+    total = timer.total()
+    REQUEST_SECONDS.observe(total, endpoint=timer.endpoint)
+    REQUESTS_TOTAL.inc(endpoint=timer.endpoint)
+    if logger is not None and SLOW_REQUEST_SECONDS and total >= SLOW_REQUEST_SECONDS:
+        logger.warning("Slow %s request (%.2fs): %s", timer.endpoint, total, timer.breakdown_ms())
+    return total
@@ -0,0 +1,257 @@
+import os
+import io
+import sys
+import json
+import hashlib
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait, FIRST_COMPLETED
+from urllib.parse import urlparse, unquote
+import requests
+
+logger = logging.getLogger(__name__)
+
+DATA_DIR = 'data'
+# Extracted text, one <sha256>.txt per distinct PDF, plus manifest.json mapping
+# each PDF link to the record `changed` stamp and content hash it was read at
+PDF_CACHE_DIR = os.getenv('PDF_CACHE_DIR', os.path.join(DATA_DIR, 'pdf_text'))
+# Processes parsing PDFs (CPU-bound), and threads downloading them
+PDF_WORKERS = int(os.getenv('PDF_WORKERS', str(min(4, os.cpu_count() or 1))))
+PDF_DOWNLOAD_WORKERS = int(os.getenv('PDF_DOWNLOAD_WORKERS', '4'))
+# PDFs downloading or waiting to be parsed at once; each one's bytes stay in memory until then
+PDF_IN_FLIGHT = int(os.getenv('PDF_IN_FLIGHT', str(2 * (PDF_WORKERS + PDF_DOWNLOAD_WORKERS))))
+PDF_TIMEOUT = float(os.getenv('PDF_TIMEOUT', '30'))
+# PDFs larger than this are not downloaded or parsed
+PDF_MAX_BYTES = int(os.getenv('PDF_MAX_BYTES', str(20 * 1024 * 1024)))
+# Chunk length and overlap in characters; a document yields at most PDF_MAX_CHUNKS chunks
+CHUNK_CHARS = int(os.getenv('CHUNK_CHARS', '1200'))
+CHUNK_OVERLAP = int(os.getenv('CHUNK_OVERLAP', '200'))
+PDF_MAX_CHUNKS = int(os.getenv('PDF_MAX_CHUNKS', '40'))
+# How parser processes start. Reindex calls in after the upsert workers and
+# torch threads are running, and a forked copy of a threaded process can
+# deadlock on a lock some other thread held, so the default is never 'fork'
+PDF_START_METHOD = os.getenv('PDF_START_METHOD', 'forkserver' if os.name == 'posix' else 'spawn')
+
+
+def pdf_link(record):
+    """The record's PDF link, if its `file` (or link) points at one."""
+    for field in ('file', 'link', 'url'):
+        value = record.get(field)
+        if value and '.pdf' in value.lower():
+            return value
+    return None
+
+
+def read_pdf(link, session=None):
+    """Bytes of a PDF from an http(s) URL, a file:// URL or a local path."""
+    parsed = urlparse(link)
+    if parsed.scheme in ('http', 'https'):
+        response = (session or requests).get(link, timeout=PDF_TIMEOUT, stream=True)
+        response.raise_for_status()
+        blocks, size = [], 0
+        for block in response.iter_content(64 * 1024):
+            blocks.append(block)
+            size += len(block)
+            if size > PDF_MAX_BYTES:
+                raise ValueError(f"larger than {PDF_MAX_BYTES} bytes")
+        return b''.join(blocks)
+    path = unquote(parsed.path) if parsed.scheme == 'file' else link
+    if os.path.getsize(path) > PDF_MAX_BYTES:
+        raise ValueError(f"larger than {PDF_MAX_BYTES} bytes")
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def extract_pdf_text(data):
+    """Text of every page of a PDF, whitespace-collapsed. Runs in a worker process."""
+    from pypdf import PdfReader
+    reader = PdfReader(io.BytesIO(data))
+    pages = []
+    for page in reader.pages:
+        try:
+            pages.append(page.extract_text() or '')
+        except Exception:
+            # One unreadable page shouldn't lose the rest of the document
+            pages.append('')
+    return ' '.join(' '.join(pages).split())
+
+
+def chunk_text(text, size=CHUNK_CHARS, overlap=CHUNK_OVERLAP, max_chunks=PDF_MAX_CHUNKS):
+    """
+    Split text into windows of about `size` characters, each starting `overlap`
+    characters before the previous one ended. Cuts fall on spaces where possible.
+    """
+    text = text.strip()
+    chunks = []
+    start = 0
+    while start < len(text) and len(chunks) < max_chunks:
+        end = min(len(text), start + size)
+        if end < len(text):
+            cut = text.rfind(' ', start + size // 2, end)
+            if cut > start:
+                end = cut
+        chunks.append(text[start:end].strip())
+        if end >= len(text):
+            break
+        next_start = max(start + 1, end - overlap)
+        space = text.find(' ', next_start, end)
+        start = space + 1 if space != -1 else next_start
+    return [chunk for chunk in chunks if chunk]
+
+
+class PdfTextCache:
+    """Extracted text keyed by the PDF's SHA-256, so an unchanged file is never parsed twice."""
+
+    def __init__(self, path=PDF_CACHE_DIR):
+        self.path = path
+        self.manifest_path = os.path.join(path, 'manifest.json')
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                self.manifest = json.load(f)
+        except (OSError, ValueError):
+            self.manifest = {}
+
+    def _text_path(self, digest):
+        return os.path.join(self.path, f"{digest}.txt")
+
+    def get(self, digest):
+        try:
+            with open(self._text_path(digest), 'r', encoding='utf-8') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def set(self, digest, text):
+        os.makedirs(self.path, exist_ok=True)
+        tmp = self._text_path(digest) + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            f.write(text)
+        os.replace(tmp, self._text_path(digest))
+
+    def lookup(self, link, changed):
+        """Cached text for a link whose record hasn't changed since it was read, without fetching it."""
+        entry = self.manifest.get(link)
+        if entry and changed is not None and entry.get('changed') == changed:
+            return self.get(entry['sha256'])
+        return None
+
+    def remember(self, link, changed, digest):
+        self.manifest[link] = {'changed': changed, 'sha256': digest}
+
+    def save(self):
+        os.makedirs(self.path, exist_ok=True)
+        tmp = self.manifest_path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self.manifest, f, ensure_ascii=False)
+        os.replace(tmp, self.manifest_path)
+
+
+class ExtractStats:
+    def __init__(self):
+        self.documents = 0
+        self.unchanged = 0
+        self.fetched = 0
+        self.same_content = 0
+        self.parsed = 0
+        self.failed = 0
+
+    def summary(self):
+        return dict(vars(self))
+
+
+def extract_texts(records, cache=None, workers=PDF_WORKERS, download_workers=PDF_DOWNLOAD_WORKERS,
+                  in_flight=PDF_IN_FLIGHT):
+    """
+    PDF text per record nid, as {nid: text}.
+
+    A record whose link and `changed` stamp match the manifest is served
+    from the cache without a download. Other PDFs are fetched on a thread
+    pool; a fetched file whose hash is already cached is not parsed again,
+    and the rest are parsed on a process pool as their downloads finish.
+    At most `in_flight` PDFs are downloading or parsing at once, so memory
+    does not grow with the number of records. Failures are logged and the
+    record simply gets no text.
+    """
+    cache = cache or PdfTextCache()
+    stats = ExtractStats()
+    texts = {}
+    pending = []
+    for record in records:
+        link = pdf_link(record)
+        if not link:
+            continue
+        stats.documents += 1
+        nid = str(record.get('nid'))
+        text = cache.lookup(link, record.get('changed'))
+        if text is not None:
+            texts[nid] = text
+            stats.unchanged += 1
+        else:
+            pending.append((nid, link, record.get('changed')))
+    if pending:
+        session = requests.Session()
+        queued = iter(pending)
+        with ThreadPoolExecutor(max_workers=download_workers) as downloads, \
+                ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context(PDF_START_METHOD)) as parsers:
+            fetches = {}
+            parses = {}
+            owners = {}  # content hash -> records sharing that PDF
+            while True:
+                # Top up the window; a PDF leaves it once its text is parsed (or it failed)
+                while len(fetches) + len(parses) < max(1, in_flight):
+                    item = next(queued, None)
+                    if item is None:
+                        break
+                    fetches[downloads.submit(read_pdf, item[1], session)] = item
+                if not fetches and not parses:
+                    break
+                done, _ = wait(list(fetches) + list(parses), return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future in fetches:
+                        nid, link, changed = fetches.pop(future)
+                        try:
+                            data = future.result()
+                        except Exception as e:
+                            logger.warning("Could not fetch PDF for nid %s (%s): %s", nid, link, e)
+                            stats.failed += 1
+                            continue
+                        stats.fetched += 1
+                        digest = hashlib.sha256(data).hexdigest()
+                        text = cache.get(digest)
+                        if text is not None:
+                            stats.same_content += 1
+                            texts[nid] = text
+                            cache.remember(link, changed, digest)
+                        elif digest in owners:
+                            stats.same_content += 1
+                            owners[digest].append((nid, link, changed))
+                        else:
+                            owners[digest] = [(nid, link, changed)]
+                            parses[parsers.submit(extract_pdf_text, data)] = digest
+                        del data
+                        continue
+                    digest = parses.pop(future)
+                    try:
+                        text = future.result()
+                    except Exception as e:
+                        logger.warning("Could not extract text from PDF %s: %s", owners[digest][0][1], e)
+                        stats.failed += len(owners.pop(digest))
+                        continue
+                    stats.parsed += 1
+                    cache.set(digest, text)
+                    for nid, link, changed in owners.pop(digest):
+                        cache.remember(link, changed, digest)
+                        texts[nid] = text
+        cache.save()
+    return texts, stats
+
+
+if __name__ == "__main__":
+    # python pdf_ingest.py <pdf paths or URLs...>: extract, chunk and report cache use
+    logging.basicConfig(level='INFO')
+    records = [{'nid': str(i), 'file': path, 'changed': None} for i, path in enumerate(sys.argv[1:])]
+    texts, stats = extract_texts(records)
+    for record in records:
+        text = texts.get(record['nid'], '')
+        print(f"{record['file']}: {len(text)} chars, {len(chunk_text(text))} chunks")
+    print(f"PDFs: {stats.summary()}")
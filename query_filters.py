@@ -0,0 +1,199 @@
+import re
+import calendar
+from datetime import datetime, timedelta, timezone
+from catalog import department_key, display_date_epoch
+
+# Words in a query that name a content type. 'circular' only narrows the
+# search when no more specific type is mentioned.
+CONTENT_TYPE_HINTS = [
+    ('rti_act', re.compile(r'\brti\b|right to information|माहितीचा अधिकार|माहिती अधिकार', re.I)),
+    ('mmc_act', re.compile(r'\bmmc\b|municipal corporations? act|महानगरपालिका अधिनियम', re.I)),
+    ('circular', re.compile(r'\bcirculars?\b|परिपत्रक', re.I)),
+]
+
+# A department filter needs the full name, or its distinctive words plus one of these
+DEPARTMENT_MARKER = re.compile(r'\b(department|dept|office|cell)\b|विभाग|कार्यालय', re.I)
+GENERIC_DEPARTMENT_WORDS = {'department', 'dept', 'office', 'cell', 'and', 'the', 'of'}
+
+MONTHS = {name.lower(): i for i, name in enumerate(calendar.month_name) if name}
+MONTHS.update({name.lower(): i for i, name in enumerate(calendar.month_abbr) if name})
+MONTH_YEAR_RE = re.compile(r'\b(' + '|'.join(sorted(MONTHS, key=len, reverse=True)) + r')\.?,?\s+((?:19|20)\d\d)\b', re.I)
+YEAR_RE = re.compile(r'\b(?:in|of|during|from|for|since)\s+((?:19|20)\d\d)\b', re.I)
+LAST_DAYS_RE = re.compile(r'\b(?:last|past)\s+(\d{1,3})\s+days?\b', re.I)
+
+RELATIVE_DATES = [
+    ('today', re.compile(r'\btoday\b', re.I)),
+    ('yesterday', re.compile(r'\byesterday\b', re.I)),
+    ('last_week', re.compile(r'\b(last|past|this) week\b|गेल्या आठवड्यात|मागील आठवड्यात|या आठवड्यात', re.I)),
+    ('last_month', re.compile(r'\b(last|previous|past) month\b|गेल्या महिन्यात|मागील महिन्यात', re.I)),
+    ('this_month', re.compile(r'\bthis month\b|या महिन्यात', re.I)),
+    ('last_year', re.compile(r'\b(last|previous|past) year\b|गेल्या वर्षी|मागील वर्षी', re.I)),
+    ('this_year', re.compile(r'\bthis year\b|या वर्षी', re.I)),
+]
+
+
+def _epoch(day):
+    return int(datetime(day.year, day.month, day.day, tzinfo=timezone.utc).timestamp())
+
+
+def _month_range(year, month):
+    start = datetime(year, month, 1).date()
+    end = datetime(year + (month == 12), month % 12 + 1, 1).date()
+    return _epoch(start), _epoch(end)
+
+
+def _year_range(year):
+    return _epoch(datetime(year, 1, 1).date()), _epoch(datetime(year + 1, 1, 1).date())
+
+
+class SearchFilters:
+    """
+    Metadata predicates for one search: a content type, a department key and a
+    [date_from, date_to) range of display_date epochs. Unset fields don't filter.
+    """
+
+    def __init__(self, content_type=None, department=None, date_from=None, date_to=None):
+        self.content_type = content_type
+        self.department = department
+        self.date_from = date_from
+        self.date_to = date_to
+
+    def is_empty(self):
+        return not (self.content_type or self.department or self.date_from is not None or self.date_to is not None)
+
+    def to_vector_filter(self):
+        """Pinecone-style metadata filter, or None when nothing is set."""
+        flt = {}
+        if self.content_type:
+            flt['content_type'] = {'$eq': self.content_type}
+        if self.department:
+            flt['department_key'] = {'$eq': self.department}
+        dates = {}
+        if self.date_from is not None:
+            dates['$gte'] = self.date_from
+        if self.date_to is not None:
+            dates['$lt'] = self.date_to
+        if dates:
+            flt['display_date_ts'] = dates
+        return flt or None
+
+    def matches(self, record, content_type=None):
+        """Apply the same predicates to a catalog record."""
+        if self.content_type and content_type and content_type != self.content_type:
+            return False
+        if self.department and department_key(record.get('department')) != self.department:
+            return False
+        if self.date_from is not None or self.date_to is not None:
+            ts = display_date_epoch(record.get('display_date'))
+            if ts is None:
+                return False
+            if self.date_from is not None and ts < self.date_from:
+                return False
+            if self.date_to is not None and ts >= self.date_to:
+                return False
+        return True
+
+    def relaxed(self):
+        """
+        Looser filters to retry with when nothing matches, in order: without
+        the dates, then the content type alone, then no filter at all.
+        """
+        steps = [
+            SearchFilters(self.content_type, self.department),
+            SearchFilters(self.content_type),
+            SearchFilters(),
+        ]
+        seen = [self.describe()]
+        for step in steps:
+            if step.describe() not in seen:
+                seen.append(step.describe())
+                yield step
+
+    def describe(self):
+        info = {}
+        if self.content_type:
+            info['content_type'] = self.content_type
+        if self.department:
+            info['department'] = self.department
+        if self.date_from is not None:
+            info['date_from'] = datetime.fromtimestamp(self.date_from, timezone.utc).strftime('%Y-%m-%d')
+        if self.date_to is not None:
+            info['date_to'] = datetime.fromtimestamp(self.date_to, timezone.utc).strftime('%Y-%m-%d')
+        return info
+
+
+def content_type_hint(query):
+    found = [ct for ct, pattern in CONTENT_TYPE_HINTS if pattern.search(query)]
+    specific = [ct for ct in found if ct != 'circular']
+    if len(specific) == 1:
+        return specific[0]
+    if not specific and found:
+        return 'circular'
+    return None
+
+
+def department_hint(query, departments):
+    """Key of the department the query names, if exactly one fits best."""
+    query_words = re.findall(r'[a-z0-9]+', query.lower())
+    words = set(query_words)
+    padded = f" {' '.join(query_words)} "
+    has_marker = bool(DEPARTMENT_MARKER.search(query))
+    best, best_score, tie = None, 0, False
+    for name in departments:
+        name_words = re.findall(r'[a-z0-9]+', name.lower())
+        distinctive = [w for w in name_words if w not in GENERIC_DEPARTMENT_WORDS]
+        if name_words and f" {' '.join(name_words)} " in padded:
+            score = len(name_words) + 1
+        elif has_marker and distinctive and set(distinctive) <= words:
+            score = len(distinctive)
+        else:
+            continue
+        if score > best_score:
+            best, best_score, tie = name, score, False
+        elif score == best_score and department_key(name) != department_key(best):
+            tie = True
+    return department_key(best) if best and not tie else None
+
+
+def date_hint(query, today=None):
+    """(date_from, date_to) epochs for a date phrase in the query, or (None, None)."""
+    today = today or datetime.now(timezone.utc).date()
+    match = MONTH_YEAR_RE.search(query)
+    if match:
+        return _month_range(int(match.group(2)), MONTHS[match.group(1).lower()])
+    match = LAST_DAYS_RE.search(query)
+    if match:
+        return _epoch(today - timedelta(days=int(match.group(1)))), _epoch(today + timedelta(days=1))
+    for name, pattern in RELATIVE_DATES:
+        if not pattern.search(query):
+            continue
+        if name == 'today':
+            return _epoch(today), _epoch(today + timedelta(days=1))
+        if name == 'yesterday':
+            return _epoch(today - timedelta(days=1)), _epoch(today)
+        if name == 'last_week':
+            return _epoch(today - timedelta(days=7)), _epoch(today + timedelta(days=1))
+        if name == 'last_month':
+            first = today.replace(day=1) - timedelta(days=1)
+            return _month_range(first.year, first.month)
+        if name == 'this_month':
+            return _month_range(today.year, today.month)
+        if name == 'last_year':
+            return _year_range(today.year - 1)
+        if name == 'this_year':
+            return _year_range(today.year)
+    match = YEAR_RE.search(query)
+    if match:
+        return _year_range(int(match.group(1)))
+    return None, None
+
+
+def parse_filter_hints(query, departments=(), today=None):
+    """SearchFilters from phrases like 'RTI', 'last month' or a department name in the query."""
+    date_from, date_to = date_hint(query, today)
+    return SearchFilters(
+        content_type=content_type_hint(query),
+        department=department_hint(query, departments),
+        date_from=date_from,
+        date_to=date_to,
+    )
@@ -0,0 +1,153 @@
+import os
+import gc
+import sys
+import time
+import signal
+import socket
+import logging
+import argparse
+
+# Pre-fork launcher for the chat server. The launcher loads the embedding model,
+# catalog, keyword index and local vector index once, then forks the workers,
+# which share those pages copy-on-write instead of each loading its own.
+# Usage: python serve.py [--workers N] [--host H] [--port P] [--no-preload]
+# (`uvicorn chatbot_server:app --workers N` still works, with one full copy per worker.)
+
+logger = logging.getLogger('serve')
+
+# Worker processes forked by the launcher
+SERVER_WORKERS = int(os.getenv('SERVER_WORKERS', str(os.cpu_count() or 1)))
+SERVER_HOST = os.getenv('SERVER_HOST', '0.0.0.0')
+SERVER_PORT = int(os.getenv('SERVER_PORT', '8000'))
+# Gemini calls in flight across all workers, unless GEMINI_MAX_CONCURRENCY is set
+DEFAULT_GEMINI_CONCURRENCY = 16
+# Seconds to wait before restarting a worker that exited
+RESTART_DELAY = 1.0
+
+
+def configure_env(workers):
+    """
+    Defaults that matter once requests are spread over processes; anything
+    already set in the environment wins. Called before the server modules
+    are imported, since they read their settings at import time.
+    """
+    if workers > 1:
+        # In-memory sessions would be split between workers
+        os.environ.setdefault('SESSION_BACKEND', 'file')
+    # Share the cores between workers instead of each using all of them
+    os.environ.setdefault('EMBED_THREADS', str(max(1, (os.cpu_count() or 1) // workers)))
+    os.environ.setdefault('GEMINI_MAX_CONCURRENCY', str(DEFAULT_GEMINI_CONCURRENCY))
+
+
+def preload():
+    """
+    Load everything the workers only read, in the launcher, so it is
+    inherited by the fork instead of loaded per worker.
+
+    Left to the workers: network clients (Pinecone, Gemini) and ONNX
+    Runtime sessions, whose sockets and thread pools don't survive a fork.
+    """
+    import fetch_and_store
+    from catalog import get_catalog
+    from keyword_index import get_keyword_index
+    from embedding_utils import configure_threads
+    started = time.perf_counter()
+    if fetch_and_store.EMBEDDING_BACKEND == 'torch':
+        # Warm up on one thread: an intra-op pool started here would be unusable in the children
+        configure_threads(1)
+        fetch_and_store.get_model().encode('warm up')
+    if fetch_and_store.VECTOR_BACKEND == 'local':
+        # The matrix is memory-mapped, so workers share it through the page cache
+        fetch_and_store.get_vector_store().build_ann()
+    get_catalog().preload()
+    get_keyword_index()
+    # Keep the collector from writing to the preloaded objects' headers in every worker
+    gc.collect()
+    gc.freeze()
+    logger.info("Preloaded in %.1fs", time.perf_counter() - started)
+
+
+def run_worker(sock, log_level):
+    import uvicorn
+    from embedding_utils import configure_threads
+    from chatbot_server import app
+    configure_threads()
+    config = uvicorn.Config(app, lifespan='on', log_level=log_level, timeout_graceful_shutdown=10)
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def serve(workers=SERVER_WORKERS, host=SERVER_HOST, port=SERVER_PORT, preload_app=True, log_level='info'):
+    """Bind the socket, preload, fork `workers` uvicorn workers and restart any that exit."""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    import chatbot_server  # noqa: F401 (imported once, before the fork)
+    from gemini_utils import get_gemini_slots
+    # Created before the fork, so every worker locks the same slot files: one limit for all
+    get_gemini_slots()
+    if preload_app:
+        preload()
+    children = {}
+    stopping = False
+
+    def spawn(worker_id):
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            code = 0
+            try:
+                run_worker(sock, log_level)
+            except BaseException:
+                logger.exception("Worker %d failed", worker_id)
+                code = 1
+            finally:
+                os._exit(code)
+        children[pid] = worker_id
+        logger.info("Started worker %d (pid %d)", worker_id, pid)
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for worker_id in range(workers):
+        spawn(worker_id)
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        worker_id = children.pop(pid, None)
+        if worker_id is None or stopping:
+            continue
+        logger.warning("Worker %d (pid %d) exited with code %d, restarting", worker_id, pid, os.waitstatus_to_exitcode(status))
+        time.sleep(RESTART_DELAY)
+        if not stopping:
+            spawn(worker_id)
+    sock.close()
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description='Serve chatbot_server:app from pre-forked workers.')
+    parser.add_argument('--workers', type=int, default=SERVER_WORKERS)
+    parser.add_argument('--host', default=SERVER_HOST)
+    parser.add_argument('--port', type=int, default=SERVER_PORT)
+    parser.add_argument('--no-preload', action='store_true', help='load models and data in each worker instead')
+    parser.add_argument('--log-level', default='info')
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args(sys.argv[1:])
+    configure_env(args.workers)
+    logging.basicConfig(level=args.log_level.upper(), format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+    serve(args.workers, args.host, args.port, preload_app=not args.no_preload, log_level=args.log_level)
@@ -0,0 +1,246 @@
+import os
+import re
+import json
+import time
+import secrets
+import threading
+from cache_utils import LRUCache
+
+DATA_DIR = 'data'
+# Where sessions live: 'memory' (per process), 'file' (shared by workers on
+# one host) or 'redis' (shared across hosts; needs the redis package)
+SESSION_BACKEND = os.getenv('SESSION_BACKEND', 'memory')
+# Idle seconds after which a session is forgotten
+SESSION_TTL = float(os.getenv('SESSION_TTL', '3600'))
+# Sessions kept by the in-memory backend, least recently used evicted first
+SESSION_MAX = int(os.getenv('SESSION_MAX', '10000'))
+SESSION_DIR = os.getenv('SESSION_DIR', os.path.join(DATA_DIR, 'sessions'))
+REDIS_URL = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
+# Estimated prompt tokens for the recent turns kept verbatim, for any one of
+# those turns, and for the running summary of the turns before them
+HISTORY_TOKEN_BUDGET = int(os.getenv('HISTORY_TOKEN_BUDGET', '600'))
+HISTORY_TURN_TOKENS = int(os.getenv('HISTORY_TURN_TOKENS', '200'))
+HISTORY_SUMMARY_TOKENS = int(os.getenv('HISTORY_SUMMARY_TOKENS', '150'))
+
+SESSION_ID_RE = re.compile(r'^[A-Za-z0-9_-]{8,64}$')
+
+
+def new_session_id():
+    return secrets.token_urlsafe(16)
+
+
+def valid_session_id(session_id):
+    return bool(session_id) and bool(SESSION_ID_RE.match(session_id))
+
+
+def new_session():
+    return {'id': new_session_id(), 'history': [], 'summary': '', 'last_circular_id': None}
+
+
+# History budgeting
+
+def estimate_tokens(text):
+    """Rough Gemini token count: about 4 characters per token in Latin script, 2 in Devanagari."""
+    text = text or ''
+    ascii_chars = sum(1 for c in text if ord(c) < 128)
+    return ascii_chars // 4 + (len(text) - ascii_chars) // 2 + 1
+
+
+def truncate_tokens(text, max_tokens, keep='start'):
+    """Cut text to about max_tokens, keeping its start (or its end) and marking the cut."""
+    text = text or ''
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    size = max(1, int(len(text) * max_tokens / estimate_tokens(text)))
+    while size > 1 and estimate_tokens(text[:size] if keep == 'start' else text[-size:]) >= max_tokens:
+        size = int(size * 0.9)
+    return text[:size].rstrip() + '…' if keep == 'start' else '…' + text[-size:].lstrip()
+
+
+def summarize_turns(turns):
+    """Short extractive summary of old turns: each question, and the document each answer used."""
+    parts = []
+    for turn in turns:
+        content = (turn.get('content') or '').strip()
+        if turn.get('role') == 'user':
+            parts.append(f"User asked: {truncate_tokens(content.splitlines()[0] if content else '', 30)}")
+        elif turn.get('title'):
+            parts.append(f"Bot answered from '{truncate_tokens(turn['title'], 30)}' (nid {turn.get('nid')})")
+        elif content:
+            parts.append(f"Bot answered: {truncate_tokens(content, 20)}")
+    return '. '.join(parts)
+
+
+def compact_history(history, summary='', budget=HISTORY_TOKEN_BUDGET, turn_tokens=HISTORY_TURN_TOKENS,
+                    summary_tokens=HISTORY_SUMMARY_TOKENS):
+    """
+    Fit a conversation into a token budget. The newest turns are kept
+    verbatim (each cut to `turn_tokens`) while they fit in `budget`; older
+    turns are folded into the running summary, which keeps its most recent
+    `summary_tokens`. Returns (history, summary).
+    """
+    turns = [dict(turn, content=truncate_tokens(turn.get('content') or '', turn_tokens))
+             for turn in history if isinstance(turn, dict)]
+    used = 0
+    start = len(turns)
+    while start > 0:
+        cost = estimate_tokens(turns[start - 1]['content']) + 2  # role label and newline
+        if used + cost > budget:
+            break
+        used += cost
+        start -= 1
+    if start:
+        summary = '. '.join(part for part in (summary, summarize_turns(turns[:start])) if part)
+        summary = truncate_tokens(summary, summary_tokens, keep='end')
+    return turns[start:], summary
+
+
+def add_exchange(session, query, answer, top_circular=None):
+    """Append a user/assistant exchange, remember the document it used and re-apply the budget."""
+    reply = {'role': 'assistant', 'content': answer or ''}
+    if top_circular and top_circular.get('nid'):
+        reply['nid'] = top_circular.get('nid')
+        reply['title'] = top_circular.get('title')
+        session['last_circular_id'] = top_circular.get('nid')
+    history = session.get('history', []) + [{'role': 'user', 'content': query}, reply]
+    session['history'], session['summary'] = compact_history(history, session.get('summary', ''))
+    return session
+
+
+# Backends
+
+class MemorySessionStore:
+    """Sessions in this process: an LRU of SESSION_MAX entries with an idle TTL."""
+
+    def __init__(self, maxsize=SESSION_MAX, ttl=SESSION_TTL):
+        self.sessions = LRUCache(maxsize=maxsize, ttl=ttl)
+
+    def get(self, session_id):
+        session = self.sessions.get(session_id)
+        return json.loads(session) if session is not None else None
+
+    def save(self, session):
+        # Stored serialized, like the shared backends, so callers never share a mutable dict
+        self.sessions.set(session['id'], json.dumps(session, ensure_ascii=False))
+
+    def delete(self, session_id):
+        self.sessions.pop(session_id)
+
+    def stats(self):
+        return self.sessions.stats()
+
+
+class FileSessionStore:
+    """
+    One JSON file per session under `path`, shared by every worker on the
+    host. A session idle for longer than `ttl` (by file mtime) is expired
+    on read and swept periodically.
+    """
+
+    SWEEP_INTERVAL = 300
+
+    def __init__(self, path=SESSION_DIR, ttl=SESSION_TTL):
+        self.path = path
+        self.ttl = ttl
+        self._last_sweep = 0.0
+        self._lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+
+    def _file(self, session_id):
+        return os.path.join(self.path, f"{session_id}.json")
+
+    def get(self, session_id):
+        self._maybe_sweep()
+        path = self._file(session_id)
+        try:
+            if self.ttl and time.time() - os.path.getmtime(path) > self.ttl:
+                os.remove(path)
+                return None
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def save(self, session):
+        self._maybe_sweep()
+        path = self._file(session['id'])
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(session, f, ensure_ascii=False)
+        os.replace(tmp, path)
+
+    def delete(self, session_id):
+        try:
+            os.remove(self._file(session_id))
+        except OSError:
+            pass
+
+    def _maybe_sweep(self):
+        now = time.time()
+        if not self.ttl or now - self._last_sweep < self.SWEEP_INTERVAL:
+            return
+        with self._lock:
+            if now - self._last_sweep < self.SWEEP_INTERVAL:
+                return
+            self._last_sweep = now
+        for name in os.listdir(self.path):
+            path = os.path.join(self.path, name)
+            try:
+                if now - os.path.getmtime(path) > self.ttl:
+                    os.remove(path)
+            except OSError:
+                pass
+
+    def stats(self):
+        return {'path': self.path, 'size': sum(1 for name in os.listdir(self.path) if name.endswith('.json'))}
+
+
+class RedisSessionStore:
+    """Sessions as Redis strings with an expiry refreshed on every save."""
+
+    def __init__(self, url=REDIS_URL, ttl=SESSION_TTL, prefix='pmcbot:session:'):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def get(self, session_id):
+        value = self.client.get(self.prefix + session_id)
+        return json.loads(value) if value is not None else None
+
+    def save(self, session):
+        value = json.dumps(session, ensure_ascii=False)
+        if self.ttl:
+            self.client.setex(self.prefix + session['id'], int(self.ttl), value)
+        else:
+            self.client.set(self.prefix + session['id'], value)
+
+    def delete(self, session_id):
+        self.client.delete(self.prefix + session_id)
+
+    def stats(self):
+        return {'url': REDIS_URL}
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_session_store():
+    """Session store selected by SESSION_BACKEND, created on first use."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                if SESSION_BACKEND == 'file':
+                    _store = FileSessionStore()
+                elif SESSION_BACKEND == 'redis':
+                    _store = RedisSessionStore()
+                else:
+                    _store = MemorySessionStore()
+    return _store
+
+
+def set_session_store(store):
+    global _store
+    _store = store
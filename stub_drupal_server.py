@@ -0,0 +1,91 @@
+import os
+import sys
+import json
+import hashlib
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+# Local stand-in for webadmin.pmc.gov.in/api/listing-api/{content_type}, serving data/*.json.
+# Usage: python stub_drupal_server.py [port]
+# then:  DRUPAL_API_BASE=http://127.0.0.1:8081/api/listing-api python fetch_and_store.py
+# STUB_FAIL_EVERY=N answers every Nth request with 429 to exercise retry/backoff.
+
+DATA_DIR = 'data'
+API_PREFIX = '/api/listing-api/'
+FAIL_EVERY = int(os.getenv('STUB_FAIL_EVERY', '0'))
+
+
+class StubState:
+    def __init__(self, data_dir=DATA_DIR, fail_every=FAIL_EVERY):
+        self.data_dir = data_dir
+        self.fail_every = fail_every
+        self.requests = 0
+        self.not_modified = 0
+        self.nodes = {}
+        self.lock = threading.Lock()
+
+    def nodes_for(self, content_type):
+        if content_type not in self.nodes:
+            path = os.path.join(self.data_dir, f"{content_type}.json")
+            if not os.path.exists(path):
+                return None
+            with open(path, 'r', encoding='utf-8') as f:
+                self.nodes[content_type] = json.load(f)
+        return self.nodes[content_type]
+
+
+def make_handler(state):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def _send(self, status, body=b'', headers=None):
+            self.send_response(status)
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            if body:
+                self.wfile.write(body)
+
+        def do_GET(self):
+            with state.lock:
+                state.requests += 1
+                count = state.requests
+            if state.fail_every and count % state.fail_every == 0:
+                return self._send(429, b'{"error": "rate limited"}', {'Retry-After': '0'})
+            url = urlparse(self.path)
+            if not url.path.startswith(API_PREFIX):
+                return self._send(404)
+            nodes = state.nodes_for(url.path[len(API_PREFIX):])
+            if nodes is None:
+                return self._send(404)
+            query = parse_qs(url.query)
+            page_no = int(query.get('page_no', ['1'])[0])
+            limit = int(query.get('limit', ['1000'])[0])
+            page = nodes[(page_no - 1) * limit:page_no * limit]
+            body = json.dumps({'data': {'nodes': page}}, ensure_ascii=False).encode('utf-8')
+            etag = '"%s"' % hashlib.sha1(body).hexdigest()
+            if self.headers.get('If-None-Match') == etag:
+                with state.lock:
+                    state.not_modified += 1
+                return self._send(304, headers={'ETag': etag})
+            self._send(200, body, {'Content-Type': 'application/json', 'ETag': etag})
+
+    return Handler
+
+
+def serve(port=8081, state=None):
+    """Start the stub in a background thread; returns (server, state)."""
+    state = state or StubState()
+    server = ThreadingHTTPServer(('127.0.0.1', port), make_handler(state))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, state
+
+
+if __name__ == "__main__":
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8081
+    server = ThreadingHTTPServer(('127.0.0.1', port), make_handler(StubState()))
+    print(f"Stub listing API on http://127.0.0.1:{port}{API_PREFIX}<content_type>")
+    server.serve_forever()
@@ -0,0 +1,118 @@
+import os
+import json
+from datetime import datetime
+from catalog import record_nid
+
+SYNC_STATE_FILE = 'sync_state.json'
+# A sync refuses to delete more than this share of a content type's local
+# records (or anything, when the listing came back empty) unless
+# --allow-mass-delete is given; a 200 with missing data looks like a complete listing
+MAX_DELETE_FRACTION = float(os.getenv('SYNC_MAX_DELETE_FRACTION', '0.2'))
+# Deleting at most this many records is never treated as a mass deletion
+MASS_DELETE_MIN = int(os.getenv('SYNC_MASS_DELETE_MIN', '5'))
+
+
+class SyncPlan:
+    """What a sync run has to do for one content type."""
+
+    def __init__(self, content_type, new, updated, deleted, high_water, withheld=()):
+        self.content_type = content_type
+        self.new = new
+        self.updated = updated
+        self.deleted = deleted
+        self.high_water = high_water
+        # Deletions the mass-deletion guard refused to apply
+        self.withheld = list(withheld)
+
+    @property
+    def changed_nodes(self):
+        return self.new + self.updated
+
+    def is_empty(self):
+        return not (self.new or self.updated or self.deleted)
+
+    def summary(self):
+        summary = (f"{self.content_type}: {len(self.new)} new, {len(self.updated)} updated, "
+                   f"{len(self.deleted)} deleted (high-water mark {self.high_water})")
+        if self.withheld:
+            summary += (f"; refused to delete {len(self.withheld)} records missing from the listing "
+                        f"(rerun with --allow-mass-delete if they really were removed)")
+        return summary
+
+
+def load_sync_state(data_dir):
+    path = os.path.join(data_dir, SYNC_STATE_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        try:
+            return json.load(f)
+        except Exception:
+            return {}
+
+
+def save_sync_state(data_dir, state):
+    path = os.path.join(data_dir, SYNC_STATE_FILE)
+    tmp = path + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp, path)
+
+
+def is_mass_deletion(deleted, local_count, remote_count, max_fraction=MAX_DELETE_FRACTION):
+    """Whether deleting `deleted` of `local_count` records looks like a broken listing rather than real removals."""
+    if not deleted:
+        return False
+    if remote_count == 0:
+        return True
+    return len(deleted) > MASS_DELETE_MIN and len(deleted) > max_fraction * local_count
+
+
+def plan_sync(content_type, local_records, remote_nodes, high_water=None, listing_complete=True, unchanged_nids=(),
+              allow_mass_delete=False):
+    """
+    Compare a fresh listing against the local records using Drupal's `changed` field.
+
+    Nodes at or below the high-water mark that we already hold are skipped
+    without further checks. Deletions are only reported when the listing is
+    complete; a truncated listing cannot tell a removed node from an unlisted one.
+    Unless `allow_mass_delete`, deletions that look like a broken listing (see
+    is_mass_deletion) are withheld instead.
+    `unchanged_nids` are nodes on pages the server answered with 304.
+    `changed` values ('2025-07-18 12:58:56') compare correctly as strings.
+    """
+    local_changed = {record_nid(item): item.get('changed') for item in local_records if isinstance(item, dict)}
+    new, updated = [], []
+    remote_nids = set(str(nid) for nid in unchanged_nids)
+    max_changed = high_water
+    for node in remote_nodes:
+        if not isinstance(node, dict):
+            continue
+        nid = record_nid(node)
+        remote_nids.add(nid)
+        changed = node.get('changed')
+        if changed and (max_changed is None or changed > max_changed):
+            max_changed = changed
+        if nid not in local_changed:
+            new.append(node)
+        elif high_water and changed and changed <= high_water:
+            continue
+        elif changed != local_changed[nid]:
+            updated.append(node)
+    deleted = sorted(set(local_changed) - remote_nids) if listing_complete else []
+    withheld = []
+    if not allow_mass_delete and is_mass_deletion(deleted, len(local_changed), len(remote_nids)):
+        deleted, withheld = [], deleted
+    return SyncPlan(content_type, new, updated, deleted, max_changed, withheld)
+
+
+def record_sync(state, plan):
+    state[plan.content_type] = {
+        'high_water': plan.high_water,
+        'last_run': datetime.now().isoformat(timespec='seconds'),
+        'new': len(plan.new),
+        'updated': len(plan.updated),
+        'deleted': len(plan.deleted),
+        'withheld': len(plan.withheld),
+    }
+    return state
@@ -0,0 +1,48 @@
+from cache_utils import ResponseCache
+
+
+def key(query, nid='1', lang='en'):
+    return ResponseCache.make_key(query, nid, lang)
+
+
+def test_response_cache_hits_only_while_changed_matches():
+    cache = ResponseCache()
+    cache.set(key('water tax'), 'answer', changed='2025-01-01')
+    assert cache.get(key('water tax'), changed='2025-01-01') == 'answer'
+    assert cache.get(key('water tax'), changed='2025-02-01') is None
+    # The stale entry is gone, not just skipped
+    assert cache.get(key('water tax'), changed='2025-01-01') is None
+    assert cache.stats()['invalidations'] == 1
+
+
+def test_response_cache_semantic_hit_needs_the_threshold():
+    cache = ResponseCache(semantic_threshold=0.9)
+    cache.set(key('water tax due date'), 'answer', changed=1, embedding=[1.0, 0.0])
+    assert cache.get_semantic(key('when is water tax due'), [0.99, 0.1], changed=1) == 'answer'
+    assert cache.get_semantic(key('property tax'), [0.5, 0.8], changed=1) is None
+    # Same query embedding, other circular
+    assert cache.get_semantic(key('when is water tax due', nid='2'), [0.99, 0.1], changed=1) is None
+
+
+def test_response_cache_semantic_skips_a_stale_closest_candidate():
+    cache = ResponseCache(semantic_threshold=0.5)
+    cache.set(key('a'), 'old', changed=1, embedding=[1.0, 0.0])
+    cache.set(key('b'), 'new', changed=2, embedding=[0.9, 0.1])
+    assert cache.get_semantic(key('q'), [1.0, 0.0], changed=2) == 'new'
+
+
+def test_response_cache_eviction_drops_embeddings():
+    cache = ResponseCache(maxsize=10, semantic_threshold=0.9)
+    for i in range(100):
+        cache.set(key(f'query {i}', nid=str(i % 3)), 'answer', embedding=[1.0, float(i)])
+    stats = cache.stats()
+    assert stats['size'] == 10
+    assert stats['semantic_embeddings'] == 10
+    cache.entries.clear()
+    assert cache.stats()['semantic_embeddings'] == 0
+
+
+def test_response_cache_key_covers_the_history_summary():
+    history = [{'role': 'user', 'content': 'hello'}]
+    assert (ResponseCache.make_key('q', '1', 'en', history, 'asked about water tax')
+            != ResponseCache.make_key('q', '1', 'en', history, 'asked about property tax'))
@@ -0,0 +1,28 @@
+from drupal_client import DrupalClient, Page, merge_pages
+
+
+def nodes(*nids, version=1):
+    return [{'nid': str(nid), 'version': version} for nid in nids]
+
+
+def test_merge_pages_keeps_the_last_copy_of_a_node():
+    merged, unchanged = merge_pages([Page(nodes(1, 2)), Page(nodes(2, 3, version=2))])
+    assert [(node['nid'], node['version']) for node in merged] == [('1', 1), ('2', 2), ('3', 2)]
+    assert unchanged == []
+
+
+def test_merge_pages_reports_each_unchanged_nid_once():
+    merged, unchanged = merge_pages([Page(nodes(1, 2)), Page([], unchanged_nids=['2', '3']),
+                                     Page([], unchanged_nids=['3', '4'])])
+    assert [node['nid'] for node in merged] == ['1', '2']
+    assert unchanged == ['3', '4']
+
+
+def test_fetch_listing_dedupes_a_node_shifted_across_pages():
+    client = DrupalClient(base_url='http://drupal.invalid', page_size=2, max_concurrency=2)
+    # Node 2 was inserted above the page 1 boundary while page 2 was fetched
+    pages = {1: nodes(1, 2), 2: nodes(2, 3), 3: nodes(4)}
+    client.fetch_page = lambda content_type, page_no, conditional=True: Page(pages.get(page_no, []))
+    listing = client.fetch_listing('circular')
+    assert [node['nid'] for node in listing.nodes] == ['1', '2', '3', '4']
+    assert listing.complete and listing.pages == 3
@@ -0,0 +1,106 @@
+import os
+import time
+from cache_utils import ResponseCache
+from session_store import (compact_history, add_exchange, new_session, estimate_tokens, valid_session_id,
+                           MemorySessionStore, FileSessionStore)
+
+
+def turns(n, prefix='turn'):
+    return [{'role': 'user' if i % 2 == 0 else 'assistant', 'content': f'{prefix} {i}'} for i in range(n)]
+
+
+def test_compact_history_keeps_short_conversations_verbatim():
+    history = turns(4)
+    kept, summary = compact_history(history)
+    assert kept == history
+    assert summary == ''
+
+
+def test_compact_history_folds_old_turns_into_the_summary():
+    history = [{'role': 'user', 'content': f'question number {i} ' + 'word ' * 40} for i in range(20)]
+    kept, summary = compact_history(history, budget=200)
+    assert 0 < len(kept) < 20
+    assert kept == [dict(turn) for turn in history[-len(kept):]]
+    assert sum(estimate_tokens(turn['content']) + 2 for turn in kept) <= 200
+    # The summary keeps its newest end: the last folded question
+    assert f'User asked: question number {19 - len(kept)} ' in summary
+
+
+def test_compact_history_cuts_long_turns_and_the_summary():
+    kept, _ = compact_history([{'role': 'user', 'content': 'x' * 10000}], turn_tokens=50)
+    assert estimate_tokens(kept[0]['content']) <= 50
+    kept, summary = compact_history(turns(200), budget=10, summary_tokens=30)
+    assert estimate_tokens(summary) <= 30
+    # Cut from the start, so the turns just before the verbatim ones survive
+    assert summary.startswith('…')
+    assert summary.endswith(f"turn {200 - len(kept) - 1}")
+
+
+def test_add_exchange_records_the_answer_document():
+    session = new_session()
+    add_exchange(session, 'water tax due date?', 'It is due in June.', {'nid': '42', 'title': 'Water tax'})
+    assert [turn['role'] for turn in session['history']] == ['user', 'assistant']
+    assert session['history'][1]['nid'] == '42'
+    assert session['last_circular_id'] == '42'
+
+
+def test_add_exchange_stays_within_the_budget():
+    session = new_session()
+    for i in range(50):
+        add_exchange(session, f'question {i} ' + 'word ' * 30, f'answer {i} ' + 'word ' * 30)
+    assert sum(estimate_tokens(turn['content']) + 2 for turn in session['history']) <= 600
+    assert session['history'][-1]['content'].startswith('answer 49')
+    assert session['summary']
+
+
+def test_cache_key_covers_every_turn_the_prompt_keeps():
+    # More than six short turns fit the budget, and the prompt includes all of them
+    older_a, older_b = turns(4, 'water'), turns(4, 'property')
+    recent = turns(6, 'shared')
+    history_a, summary_a = compact_history(older_a + recent)
+    history_b, summary_b = compact_history(older_b + recent)
+    assert len(history_a) == len(history_b) == 10
+    assert (ResponseCache.make_key('q', '1', 'en', history_a, summary_a)
+            != ResponseCache.make_key('q', '1', 'en', history_b, summary_b))
+
+
+def test_new_session_ids_are_valid_and_distinct():
+    ids = {new_session()['id'] for _ in range(100)}
+    assert len(ids) == 100
+    assert all(valid_session_id(session_id) for session_id in ids)
+    assert not valid_session_id('../../etc/passwd')
+    assert not valid_session_id('short')
+
+
+def test_memory_store_returns_copies():
+    store = MemorySessionStore()
+    session = add_exchange(new_session(), 'hello', 'hi')
+    store.save(session)
+    loaded = store.get(session['id'])
+    assert loaded == session
+    loaded['history'].append({'role': 'user', 'content': 'not saved'})
+    assert store.get(session['id']) == session
+    store.delete(session['id'])
+    assert store.get(session['id']) is None
+
+
+def test_memory_store_evicts_least_recently_used():
+    store = MemorySessionStore(maxsize=2)
+    sessions = [new_session() for _ in range(3)]
+    for session in sessions:
+        store.save(session)
+    assert store.get(sessions[0]['id']) is None
+    assert store.get(sessions[2]['id']) == sessions[2]
+
+
+def test_file_store_round_trip_and_expiry(tmp_path):
+    store = FileSessionStore(path=str(tmp_path), ttl=60)
+    session = add_exchange(new_session(), 'hello', 'hi')
+    store.save(session)
+    assert store.get(session['id']) == session
+    assert FileSessionStore(path=str(tmp_path), ttl=60).get(session['id']) == session
+    stale = time.time() - 120
+    os.utime(tmp_path / f"{session['id']}.json", (stale, stale))
+    assert store.get(session['id']) is None
+    assert not (tmp_path / f"{session['id']}.json").exists()
+    assert store.get(new_session()['id']) is None
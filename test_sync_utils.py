@@ -0,0 +1,48 @@
+from sync_utils import plan_sync, is_mass_deletion
+
+
+def records(n, changed='2025-01-01 00:00:00'):
+    return [{'nid': str(i), 'changed': changed} for i in range(n)]
+
+
+def test_plan_sync_deletes_nodes_missing_from_a_complete_listing():
+    plan = plan_sync('circular', records(20), records(18))
+    assert plan.deleted == ['18', '19']
+    assert plan.withheld == []
+
+
+def test_plan_sync_withholds_deletions_when_the_listing_is_empty():
+    plan = plan_sync('circular', records(20), [])
+    assert plan.deleted == []
+    assert len(plan.withheld) == 20
+    assert 'allow-mass-delete' in plan.summary()
+
+
+def test_plan_sync_withholds_deletions_from_a_truncated_listing():
+    plan = plan_sync('circular', records(100), records(10))
+    assert plan.deleted == []
+    assert len(plan.withheld) == 90
+
+
+def test_plan_sync_allow_mass_delete_applies_them():
+    plan = plan_sync('circular', records(100), [], allow_mass_delete=True)
+    assert len(plan.deleted) == 100
+    assert plan.withheld == []
+
+
+def test_plan_sync_still_applies_new_and_updated_nodes_when_withholding():
+    remote = records(2, changed='2025-02-01 00:00:00') + [{'nid': '500', 'changed': '2025-02-01 00:00:00'}]
+    plan = plan_sync('circular', records(50), remote)
+    assert [node['nid'] for node in plan.updated] == ['0', '1']
+    assert [node['nid'] for node in plan.new] == ['500']
+    assert plan.deleted == [] and len(plan.withheld) == 48
+
+
+def test_plan_sync_incomplete_listing_never_deletes():
+    plan = plan_sync('circular', records(20), records(18), listing_complete=False)
+    assert plan.deleted == [] and plan.withheld == []
+
+
+def test_is_mass_deletion_allows_a_few_deletions_from_small_types():
+    assert not is_mass_deletion(['1', '2'], local_count=3, remote_count=1)
+    assert is_mass_deletion(['1'], local_count=3, remote_count=0)
@@ -0,0 +1,210 @@
+import os
+import json
+import time
+import queue
+import random
+import threading
+
+# Concurrent upsert calls against the shared vector store client
+UPSERT_WORKERS = int(os.getenv('UPSERT_WORKERS', '4'))
+# Batches waiting for a worker; when full the embedding stage blocks (backpressure)
+UPSERT_QUEUE_SIZE = int(os.getenv('UPSERT_QUEUE_SIZE', '8'))
+# A batch is cut at whichever limit is reached first. Pinecone caps a request
+# at 2 MB and 1000 vectors; the byte limit leaves room for request overhead.
+UPSERT_MAX_VECTORS = int(os.getenv('UPSERT_MAX_VECTORS', '200'))
+UPSERT_MAX_BYTES = int(os.getenv('UPSERT_MAX_BYTES', str(1536 * 1024)))
+UPSERT_MAX_RETRIES = int(os.getenv('UPSERT_MAX_RETRIES', '6'))
+UPSERT_BACKOFF_BASE = float(os.getenv('UPSERT_BACKOFF_BASE', '0.5'))
+BACKOFF_MAX = 30.0
+# Seconds between progress lines
+PROGRESS_INTERVAL = float(os.getenv('UPSERT_PROGRESS_INTERVAL', '5'))
+
+RETRY_STATUS = {429, 500, 502, 503, 504}
+TOO_LARGE_STATUS = {413}
+
+# Rough JSON size of one float in an upsert request body
+BYTES_PER_VALUE = 12
+
+
+def payload_bytes(vector):
+    """Estimated request bytes for one (id, values, metadata) tuple."""
+    vid, values, meta = vector
+    return len(str(vid)) + len(values) * BYTES_PER_VALUE + len(json.dumps(meta or {}, ensure_ascii=False)) + 32
+
+
+def error_status(error):
+    """HTTP status of a vector store error, if the client exposes one."""
+    for attr in ('status', 'status_code', 'code'):
+        value = getattr(error, attr, None)
+        if isinstance(value, int):
+            return value
+    response = getattr(error, 'response', None)
+    return getattr(response, 'status_code', None)
+
+
+def retry_after(error):
+    headers = getattr(error, 'headers', None) or getattr(getattr(error, 'response', None), 'headers', None) or {}
+    try:
+        return float(headers.get('Retry-After'))
+    except (TypeError, ValueError):
+        return None
+
+
+class UpsertStats:
+    def __init__(self):
+        self.vectors = 0
+        self.batches = 0
+        self.bytes = 0
+        self.retries = 0
+        self.splits = 0
+        self.producer_wait = 0.0
+        self.started = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def add(self, n_vectors, n_bytes):
+        with self._lock:
+            self.vectors += n_vectors
+            self.batches += 1
+            self.bytes += n_bytes
+
+    @property
+    def wall_seconds(self):
+        return time.perf_counter() - self.started
+
+    def summary(self):
+        wall = self.wall_seconds
+        return {
+            'vectors': self.vectors,
+            'batches': self.batches,
+            'megabytes': round(self.bytes / 1e6, 2),
+            'retries': self.retries,
+            'splits': self.splits,
+            'producer_wait_seconds': round(self.producer_wait, 3),
+            'wall_seconds': round(wall, 3),
+            'vectors_per_sec': round(self.vectors / wall, 1) if wall else 0.0,
+        }
+
+
+class UpsertPipeline:
+    """
+    Overlaps embedding with upload.
+
+    run() consumes the (already lazy) stream of embedded vector batches on
+    the calling thread, regroups it into request-sized batches and hands them
+    to `workers` threads through a bounded queue. The workers share one
+    client (the VectorStore) and retry rate-limited or failed calls with
+    exponential backoff; a batch rejected as too large is split in half.
+    """
+
+    def __init__(self, target, workers=UPSERT_WORKERS, queue_size=UPSERT_QUEUE_SIZE,
+                 max_vectors=UPSERT_MAX_VECTORS, max_bytes=UPSERT_MAX_BYTES,
+                 max_retries=UPSERT_MAX_RETRIES, backoff_base=UPSERT_BACKOFF_BASE,
+                 progress_interval=PROGRESS_INTERVAL, label='upsert'):
+        self.target = target
+        self.workers = max(1, workers)
+        self.queue_size = max(1, queue_size)
+        self.max_vectors = max(1, max_vectors)
+        self.max_bytes = max_bytes
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.progress_interval = progress_interval
+        self.label = label
+        self.stats = UpsertStats()
+        self._error = None
+        self._last_progress = 0.0
+
+    # Producer side
+
+    def batches(self, vector_batches):
+        """Regroup streamed vectors into batches bounded by count and estimated bytes."""
+        pending, pending_bytes = [], 0
+        for vectors in vector_batches:
+            for vector in vectors:
+                size = payload_bytes(vector)
+                if pending and (len(pending) >= self.max_vectors or pending_bytes + size > self.max_bytes):
+                    yield pending, pending_bytes
+                    pending, pending_bytes = [], 0
+                pending.append(vector)
+                pending_bytes += size
+        if pending:
+            yield pending, pending_bytes
+
+    def run(self, vector_batches):
+        work = queue.Queue(maxsize=self.queue_size)
+        self._last_progress = time.perf_counter()
+        threads = [threading.Thread(target=self._worker, args=(work,), name=f'upsert-{i}', daemon=True)
+                   for i in range(self.workers)]
+        for thread in threads:
+            thread.start()
+        try:
+            for batch in self.batches(vector_batches):
+                if self._error is not None:
+                    break
+                t = time.perf_counter()
+                work.put(batch)
+                self.stats.producer_wait += time.perf_counter() - t
+                self._progress(work)
+        finally:
+            for _ in threads:
+                work.put(None)
+            for thread in threads:
+                thread.join()
+        if self._error is not None:
+            raise self._error
+        return self.stats
+
+    def _progress(self, work):
+        now = time.perf_counter()
+        if self.progress_interval and now - self._last_progress >= self.progress_interval:
+            self._last_progress = now
+            s = self.stats.summary()
+            print(f"[{self.label}] {s['vectors']} vectors upserted, {s['vectors_per_sec']} vectors/sec, "
+                  f"{work.qsize()}/{self.queue_size} batches queued, {s['retries']} retries")
+
+    # Worker side
+
+    def _worker(self, work):
+        while True:
+            item = work.get()
+            if item is None:
+                return
+            if self._error is not None:
+                continue
+            try:
+                self._upsert(*item)
+            except Exception as e:
+                self._error = e
+
+    def _backoff(self, attempt, error):
+        delay = retry_after(error)
+        if delay is None:
+            delay = self.backoff_base * (2 ** attempt) * (0.5 + random.random() / 2)
+        return min(delay, BACKOFF_MAX)
+
+    def _upsert(self, vectors, n_bytes):
+        for attempt in range(self.max_retries + 1):
+            try:
+                self.target.upsert(vectors)
+                self.stats.add(len(vectors), n_bytes)
+                return
+            except Exception as e:
+                status = error_status(e)
+                if status in TOO_LARGE_STATUS and len(vectors) > 1:
+                    with self.stats._lock:
+                        self.stats.splits += 1
+                    half = len(vectors) // 2
+                    self._upsert(vectors[:half], sum(payload_bytes(v) for v in vectors[:half]))
+                    self._upsert(vectors[half:], sum(payload_bytes(v) for v in vectors[half:]))
+                    return
+                retryable = status in RETRY_STATUS or (status is None and isinstance(e, (ConnectionError, TimeoutError)))
+                if not retryable or attempt == self.max_retries:
+                    raise
+                with self.stats._lock:
+                    self.stats.retries += 1
+                time.sleep(self._backoff(attempt, e))
+
+    def print_summary(self):
+        s = self.stats.summary()
+        print(f"[{self.label}] upserted {s['vectors']} vectors in {s['batches']} batches ({s['megabytes']} MB) "
+              f"with {self.workers} workers: {s['wall_seconds']}s wall, {s['vectors_per_sec']} vectors/sec, "
+              f"{s['retries']} retries, {s['splits']} splits, producer blocked {s['producer_wait_seconds']}s")
@@ -0,0 +1,394 @@
+import os
+import glob
+import json
+import secrets
+import threading
+from datetime import datetime, timezone
+import numpy as np
+
+DATA_DIR = 'data'
+# Which backend fetch_and_store uses for search and ingest: 'pinecone' or 'local'
+VECTOR_BACKEND = os.getenv('VECTOR_BACKEND', 'pinecone')
+# Base path of the local index files (<path>.npy matrix + <path>.json ids/metadata)
+LOCAL_INDEX_PATH = os.getenv('LOCAL_INDEX_PATH', os.path.join(DATA_DIR, 'vector_index'))
+# Optional ANN for the local backend: '' (exact brute force) or 'ivf'
+LOCAL_ANN = os.getenv('LOCAL_ANN', '')
+IVF_NPROBE = int(os.getenv('IVF_NPROBE', '8'))
+# Pointer to the index version (namespace) searches read from; written by reindex
+VECTOR_VERSION_PATH = os.getenv('VECTOR_VERSION_PATH', os.path.join(DATA_DIR, f'vector_version_{VECTOR_BACKEND}.json'))
+
+
+class VectorStore:
+    """
+    Minimal interface shared by the vector backends.
+
+    Vectors are (id, values, metadata) tuples as accepted by Pinecone's
+    upsert, and query() returns a dict with a 'matches' list of
+    {'id', 'score', 'metadata'} just like a Pinecone query response.
+    query() also takes a Pinecone-style metadata filter, e.g.
+    {'content_type': {'$eq': 'rti_act'}, 'display_date_ts': {'$gte': 1719792000}}.
+
+    A store is scoped to one namespace ('' is the default one); reindex
+    builds each index version in its own namespace.
+    """
+
+    namespace = ''
+
+    def upsert(self, vectors):
+        raise NotImplementedError
+
+    def query(self, vector, top_k=5, include_metadata=True, filter=None):
+        raise NotImplementedError
+
+    def delete(self, ids=None, delete_all=False):
+        raise NotImplementedError
+
+    def count(self):
+        raise NotImplementedError
+
+    def flush(self):
+        """Persist pending writes (no-op for remote backends)."""
+
+    def with_namespace(self, namespace):
+        """The same backend scoped to another namespace."""
+        if namespace == self.namespace:
+            return self
+        raise NotImplementedError
+
+    def namespaces(self):
+        return [self.namespace]
+
+    def drop_namespace(self, namespace):
+        raise NotImplementedError
+
+    def is_stale(self):
+        """Whether another process has rewritten this store's data since it was loaded."""
+        return False
+
+    def reopen(self):
+        """A fresh handle on the store's current data."""
+        return self
+
+
+class PineconeVectorStore(VectorStore):
+    """VectorStore over a Pinecone Index handle."""
+
+    def __init__(self, index, namespace=''):
+        self.index = index
+        self.namespace = namespace
+
+    def upsert(self, vectors):
+        return self.index.upsert(vectors, namespace=self.namespace)
+
+    def query(self, vector, top_k=5, include_metadata=True, filter=None):
+        return self.index.query(vector=vector, top_k=top_k, include_metadata=include_metadata,
+                                namespace=self.namespace, filter=filter or None)
+
+    def delete(self, ids=None, delete_all=False):
+        if delete_all:
+            return self.index.delete(delete_all=True, namespace=self.namespace)
+        return self.index.delete(ids=list(ids or []), namespace=self.namespace)
+
+    def _namespace_stats(self):
+        return self.index.describe_index_stats().get('namespaces') or {}
+
+    def count(self):
+        summary = self._namespace_stats().get(self.namespace)
+        if summary is None:
+            return 0
+        return summary['vector_count']
+
+    def with_namespace(self, namespace):
+        # Shares the Index handle (and its connection pool)
+        return PineconeVectorStore(self.index, namespace)
+
+    def namespaces(self):
+        return list(self._namespace_stats())
+
+    def drop_namespace(self, namespace):
+        return self.index.delete(delete_all=True, namespace=namespace)
+
+
+def local_namespace_path(path, namespace):
+    return f"{path}@{namespace}" if namespace else path
+
+
+def new_version():
+    """
+    Namespace name for a fresh index build, e.g. 'v20250718125856-3fa9c1'.
+    The random suffix keeps two builds started in the same second apart.
+    """
+    return datetime.now(timezone.utc).strftime('v%Y%m%d%H%M%S-') + secrets.token_hex(3)
+
+
+def is_version_name(namespace):
+    """True for names made by new_version(), with or without the suffix older builds lacked."""
+    stamp, dash, suffix = namespace[1:].partition('-')
+    return namespace[:1] == 'v' and stamp.isdigit() and (not dash or suffix.isalnum())
+
+
+def read_active_version(path=VECTOR_VERSION_PATH):
+    """Namespace searches should use ('' = default namespace, before any versioned reindex)."""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f).get('version', '')
+    except (OSError, ValueError):
+        return ''
+
+
+def write_active_version(version, path=VECTOR_VERSION_PATH, **info):
+    """Point searches at `version`; the rename makes the switch atomic for readers."""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    data = dict(info, version=version, switched_at=datetime.now(timezone.utc).isoformat())
+    tmp = path + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp, path)
+
+
+_FILTER_OPS = {
+    '$eq': lambda value, arg: value == arg,
+    '$ne': lambda value, arg: value != arg,
+    '$in': lambda value, arg: value in arg,
+    '$nin': lambda value, arg: value not in arg,
+    '$gt': lambda value, arg: value is not None and value > arg,
+    '$gte': lambda value, arg: value is not None and value >= arg,
+    '$lt': lambda value, arg: value is not None and value < arg,
+    '$lte': lambda value, arg: value is not None and value <= arg,
+}
+
+
+def matches_filter(meta, filter):
+    """Evaluate a Pinecone metadata filter against one metadata dict."""
+    for key, condition in filter.items():
+        if key == '$and':
+            if not all(matches_filter(meta, f) for f in condition):
+                return False
+        elif key == '$or':
+            if not any(matches_filter(meta, f) for f in condition):
+                return False
+        elif isinstance(condition, dict):
+            value = meta.get(key)
+            try:
+                if not all(_FILTER_OPS[op](value, arg) for op, arg in condition.items()):
+                    return False
+            except TypeError:
+                return False
+        elif meta.get(key) != condition:
+            return False
+    return True
+
+
+def _normalize(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+class IVFIndex:
+    """Small inverted-file ANN index: k-means centroids, search the `nprobe` nearest lists."""
+
+    def __init__(self, matrix, n_lists=None, iterations=10, seed=0):
+        n = len(matrix)
+        self.n_lists = max(1, min(n, n_lists or int(np.sqrt(n)) or 1))
+        rng = np.random.default_rng(seed)
+        centroids = matrix[rng.choice(n, self.n_lists, replace=False)].copy()
+        for _ in range(iterations):
+            assign = np.argmax(matrix @ centroids.T, axis=1)
+            for c in range(self.n_lists):
+                members = matrix[assign == c]
+                if len(members):
+                    centroids[c] = members.mean(axis=0)
+            centroids = _normalize(centroids)
+        self.centroids = centroids
+        assign = np.argmax(matrix @ centroids.T, axis=1)
+        self.lists = [np.flatnonzero(assign == c) for c in range(self.n_lists)]
+
+    def candidates(self, query, nprobe=IVF_NPROBE):
+        nearest = np.argsort(-(self.centroids @ query))[:nprobe]
+        return np.concatenate([self.lists[c] for c in nearest])
+
+
+class LocalVectorStore(VectorStore):
+    """
+    In-process cosine-similarity index persisted next to data/*.json.
+
+    The float32 matrix is saved as <path>.npy and memory-mapped on load;
+    ids and metadata live in <path>.json. Rows are L2-normalised so a
+    dot product equals Pinecone's cosine score. A namespace is a separate
+    pair of files, <path>@<namespace>.npy/.json.
+    """
+
+    def __init__(self, path=LOCAL_INDEX_PATH, dim=None, ann=LOCAL_ANN, nprobe=IVF_NPROBE, mmap=True, namespace=''):
+        self.base_path = path
+        self.namespace = namespace
+        self.path = local_namespace_path(path, namespace)
+        self.dim = dim
+        self.ann = ann
+        self.nprobe = nprobe
+        self.ids = []
+        self.metadata = []
+        self.matrix = np.zeros((0, dim or 0), dtype=np.float32)
+        self._row = {}
+        self._ann_index = None
+        self._lock = threading.Lock()
+        self._signature = None
+        if os.path.exists(self.path + '.npy'):
+            self.load(mmap=mmap)
+
+    # Persistence
+
+    def file_signature(self):
+        """(mtime, size) of the .npy and .json files, or None while they don't exist."""
+        try:
+            return tuple((st.st_mtime_ns, st.st_size) for st in
+                         (os.stat(self.path + '.npy'), os.stat(self.path + '.json')))
+        except OSError:
+            return None
+
+    def load(self, mmap=True):
+        signature = self.file_signature()
+        matrix = np.load(self.path + '.npy', mmap_mode='r' if mmap else None)
+        with open(self.path + '.json', 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        if len(matrix) != len(meta['ids']):
+            # Caught between flush()'s two renames; the caller retries later
+            raise ValueError(f"{self.path}: {len(matrix)} vectors but {len(meta['ids'])} ids")
+        with self._lock:
+            self._signature = signature
+            self.matrix = matrix
+            self.ids = meta['ids']
+            self.metadata = meta['metadata']
+            self.dim = matrix.shape[1] if matrix.ndim == 2 else self.dim
+            self._row = {vid: i for i, vid in enumerate(self.ids)}
+            self._ann_index = None
+
+    def flush(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with self._lock:
+            matrix = np.ascontiguousarray(self.matrix, dtype=np.float32)
+            ids, metadata = list(self.ids), list(self.metadata)
+        # Write to temp files and rename so a reader never sees a half-written index
+        np.save(self.path + '.tmp.npy', matrix)
+        with open(self.path + '.tmp.json', 'w', encoding='utf-8') as f:
+            json.dump({'ids': ids, 'metadata': metadata}, f, ensure_ascii=False)
+        os.replace(self.path + '.tmp.npy', self.path + '.npy')
+        os.replace(self.path + '.tmp.json', self.path + '.json')
+        # What's on disk now matches memory, so this handle isn't stale
+        self._signature = self.file_signature()
+
+    # Writes
+
+    def upsert(self, vectors):
+        vectors = list(vectors)
+        if not vectors:
+            return {'upserted_count': 0}
+        values = _normalize(np.asarray([v[1] for v in vectors], dtype=np.float32))
+        with self._lock:
+            if not isinstance(self.matrix, np.ndarray) or isinstance(self.matrix, np.memmap) or not self.matrix.flags.writeable:
+                self.matrix = np.array(self.matrix, dtype=np.float32)
+            if self.matrix.shape[0] == 0:
+                self.matrix = np.zeros((0, values.shape[1]), dtype=np.float32)
+                self.dim = values.shape[1]
+            new_rows = []
+            for (vid, _, meta), row in zip(vectors, values):
+                vid = str(vid)
+                if vid in self._row:
+                    i = self._row[vid]
+                    self.matrix[i] = row
+                    self.metadata[i] = meta or {}
+                else:
+                    self._row[vid] = len(self.ids) + len(new_rows)
+                    self.ids.append(vid)
+                    self.metadata.append(meta or {})
+                    new_rows.append(row)
+            if new_rows:
+                self.matrix = np.vstack([self.matrix, np.asarray(new_rows, dtype=np.float32)])
+            self._ann_index = None
+        return {'upserted_count': len(vectors)}
+
+    def delete(self, ids=None, delete_all=False):
+        with self._lock:
+            if delete_all:
+                self.ids, self.metadata, self._row = [], [], {}
+                self.matrix = np.zeros((0, self.dim or 0), dtype=np.float32)
+            else:
+                drop = {str(i) for i in (ids or [])}
+                keep = [i for i, vid in enumerate(self.ids) if vid not in drop]
+                self.matrix = np.asarray(self.matrix)[keep]
+                self.ids = [self.ids[i] for i in keep]
+                self.metadata = [self.metadata[i] for i in keep]
+                self._row = {vid: i for i, vid in enumerate(self.ids)}
+            self._ann_index = None
+        return {}
+
+    def is_stale(self):
+        return self.file_signature() != self._signature
+
+    def reopen(self):
+        return LocalVectorStore(self.base_path, dim=self.dim, ann=self.ann, nprobe=self.nprobe, namespace=self.namespace)
+
+    # Namespaces
+
+    def with_namespace(self, namespace):
+        if namespace == self.namespace:
+            return self
+        return LocalVectorStore(self.base_path, dim=self.dim, ann=self.ann, nprobe=self.nprobe, namespace=namespace)
+
+    def namespaces(self):
+        found = [''] if os.path.exists(self.base_path + '.npy') else []
+        for path in glob.glob(glob.escape(self.base_path) + '@*.npy'):
+            found.append(path[len(self.base_path) + 1:-len('.npy')])
+        return found
+
+    def drop_namespace(self, namespace):
+        path = local_namespace_path(self.base_path, namespace)
+        for suffix in ('.npy', '.json'):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+
+    # Reads
+
+    def count(self):
+        return len(self.ids)
+
+    def build_ann(self):
+        """Build the ANN index now instead of on the first query."""
+        if self._ann_index is None and self.ann == 'ivf' and len(self.ids):
+            self._ann_index = IVFIndex(np.asarray(self.matrix))
+        return self._ann_index
+
+    def query(self, vector, top_k=5, include_metadata=True, filter=None):
+        matrix = self.matrix
+        if not len(self.ids):
+            return {'matches': []}
+        q = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(q)
+        if norm:
+            q = q / norm
+        ann = None if filter else self.build_ann()
+        if filter:
+            # Exact search over the rows the filter admits
+            rows = np.array([i for i, meta in enumerate(self.metadata) if matches_filter(meta, filter)], dtype=np.int64)
+            if not len(rows):
+                return {'matches': []}
+            scores = matrix[rows] @ q
+        elif ann is not None:
+            rows = ann.candidates(q, self.nprobe)
+            scores = matrix[rows] @ q
+        else:
+            rows = None
+            scores = matrix @ q
+        k = min(top_k, len(scores))
+        if k <= 0:
+            return {'matches': []}
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        matches = []
+        for i in top:
+            row = int(rows[i]) if rows is not None else int(i)
+            match = {'id': self.ids[row], 'score': float(scores[i])}
+            if include_metadata:
+                match['metadata'] = self.metadata[row]
+            matches.append(match)
+        return {'matches': matches}